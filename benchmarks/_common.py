@@ -0,0 +1,72 @@
+"""Shared helpers for the benchmark scripts.
+
+Benchmarks run against a throwaway copy of the sample database so they never
+touch a developer's traffic.db.
+"""
+import contextlib
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@contextlib.contextmanager
+def temp_workdir():
+    """Run the body inside a temp directory holding a freshly initialised traffic.db."""
+    from init_db import init_db
+
+    previous = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="traffic-bench-")
+    shutil.copy(os.path.join(ROOT, "traffic_sys.sql"), workdir)
+    os.chdir(workdir)
+    try:
+        init_db()
+        yield workdir
+    finally:
+        from traffic_system.db import close_pools
+        close_pools()
+        os.chdir(previous)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+@contextlib.contextmanager
+def synthetic_workdir(intersections, readings_per_road=1, seed=42):
+    """Like temp_workdir, but traffic.db holds a synthetic grid network of the given size."""
+    previous = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="traffic-bench-")
+    os.chdir(workdir)
+    try:
+        build_synthetic_network("traffic.db", intersections, readings_per_road, seed)
+        yield workdir
+    finally:
+        from traffic_system.db import close_pools
+        close_pools()
+        os.chdir(previous)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def build_synthetic_network(path, intersections, readings_per_road=1, seed=42):
+    """Write a synthetic grid city with `readings_per_road` readings per approach to `path`."""
+    from traffic_system.simulator import build_network
+    build_network(path, intersections, readings_per_road, seed)
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers (0 for an empty list)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def print_table(headers, rows):
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    print("  ".join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    print("  ".join("-" * w for w in widths))
+    for row in rows:
+        print("  ".join(str(c).ljust(w) for c, w in zip(row, widths)))
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Connection micro-benchmark: connect/query/close per call vs the pooled manager.
+
+    python benchmarks/bench_db.py --iterations 5000 --threads 8
+"""
+import argparse
+import sqlite3
+import threading
+import time
+
+from _common import print_table, temp_workdir
+
+from traffic_system.db import connection
+
+QUERY = "SELECT signal_color, green_time FROM signal_status WHERE intersection_id=? AND road_id=?"
+
+
+def fresh_cycle(i):
+    """What every caller used to do: open, query, close."""
+    conn = sqlite3.connect('traffic.db')
+    conn.row_factory = sqlite3.Row
+    conn.execute(QUERY, (i % 5 + 1, i % 8 + 1)).fetchall()
+    conn.close()
+
+
+def pooled_cycle(i):
+    with connection() as conn:
+        conn.execute(QUERY, (i % 5 + 1, i % 8 + 1)).fetchall()
+
+
+def run(cycle, iterations, threads):
+    per_thread = iterations // threads
+
+    def worker(offset):
+        for i in range(offset, offset + per_thread):
+            cycle(i)
+
+    workers = [threading.Thread(target=worker, args=(n * per_thread,)) for n in range(threads)]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+    total = per_thread * threads
+    return [f"{total / elapsed:.0f}", f"{elapsed / total * 1e6:.1f}"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    rows = []
+    with temp_workdir():
+        pooled_cycle(0)  # switch the file to WAL before timing either path
+        for threads in (1, args.threads):
+            for name, cycle in (("connect/query/close", fresh_cycle), ("pooled", pooled_cycle)):
+                rows.append([name, threads] + run(cycle, args.iterations, threads))
+    print_table(["cycle", "threads", "ops/s", "us/op"], rows)
+
+
+if __name__ == "__main__":
+    main()
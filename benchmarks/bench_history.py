@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+History-growth benchmark: signal cycle time as traffic_data grows.
+
+Appends readings in steps and, at each size, times the full signal cycle
+reading traffic_latest against the old query that joins the whole history.
+
+    python benchmarks/bench_history.py --intersections 1000 --history 1000000
+"""
+import argparse
+import random
+import time
+
+from _common import print_table, synthetic_workdir
+
+from traffic_system.db import connection
+from traffic_system.traffic_controller import TrafficController
+
+LEGACY_CYCLE_QUERY = """
+    WITH readings AS (
+        SELECT ir.intersection_id, ir.road_id, ir.direction,
+               COALESCE(MAX(td.vehicle_count), 0) AS vehicle_count
+        FROM intersection_roads ir
+        LEFT JOIN traffic_data td ON ir.intersection_id = td.intersection_id
+            AND ir.road_id = td.road_id
+        GROUP BY ir.intersection_id, ir.road_id, ir.direction
+    )
+    SELECT intersection_id, road_id, vehicle_count,
+           ROW_NUMBER() OVER (PARTITION BY intersection_id ORDER BY vehicle_count DESC, direction)
+    FROM readings
+"""
+
+
+def append_history(rows, approaches, rng):
+    with connection() as conn:
+        conn.executemany("INSERT INTO traffic_data (intersection_id, road_id, vehicle_count) VALUES (?, ?, ?)",
+                         ((iid, rid, rng.randint(0, 30))
+                          for iid, rid in (approaches[rng.randrange(len(approaches))] for _ in range(rows))))
+
+
+def timed(fn):
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def legacy_cycle():
+    with connection() as conn:
+        conn.execute(LEGACY_CYCLE_QUERY).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--intersections", type=int, default=1000)
+    parser.add_argument("--history", type=int, default=1000000, help="final traffic_data row count")
+    parser.add_argument("--steps", type=int, default=4)
+    parser.add_argument("--skip-legacy-above", type=int, default=300000,
+                        help="stop timing the legacy query past this many rows")
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    controller = TrafficController()
+    rows = []
+    with synthetic_workdir(args.intersections):
+        with connection() as conn:
+            approaches = [tuple(r) for r in conn.execute("SELECT intersection_id, road_id FROM intersection_roads")]
+        size = len(approaches)
+        targets = sorted({max(size, int(args.history * (10 ** (step - args.steps + 1))))
+                          for step in range(args.steps)})
+        for target in targets:
+            append_history(target - size, approaches, rng)
+            size = target
+            latest = min(timed(controller.update_signal_logic) for _ in range(3))
+            legacy = f"{min(timed(legacy_cycle) for _ in range(3)):.3f}" if size <= args.skip_legacy_above else "-"
+            rows.append([size, f"{latest:.3f}", legacy])
+
+    print(f"{args.intersections} intersections ({len(approaches)} approaches)")
+    print_table(["traffic_data rows", "cycle via traffic_latest (s)", "cycle over full history (s)"], rows)
+
+
+if __name__ == "__main__":
+    main()
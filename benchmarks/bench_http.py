@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+HTTP load benchmark: single-threaded TCPServer vs the pooled keep-alive server.
+
+Each client thread issues a mix of dashboard reads (GET /api/signal/status)
+and sensor writes (POST /api/traffic/update) for a fixed duration; a few
+"slow" clients hold a request open to show head-of-line blocking.
+
+    python benchmarks/bench_http.py --clients 32 --duration 5
+"""
+import argparse
+import http.client
+import json
+import socketserver
+import threading
+import time
+
+from _common import percentile, print_table, temp_workdir
+
+import server
+
+
+class LegacyRequestHandler(server.TrafficRequestHandler):
+    """The pre-pool behaviour: HTTP/1.0, one connection per request."""
+    protocol_version = 'HTTP/1.0'
+
+    def do_GET(self):
+        if self.path == '/api/slow':
+            time.sleep(self.server.slow_seconds)
+            return self.send_json({"status": "slow"})
+        return super().do_GET()
+
+
+class PooledRequestHandler(server.TrafficRequestHandler):
+    def do_GET(self):
+        if self.path == '/api/slow':
+            time.sleep(self.server.slow_seconds)
+            return self.send_json({"status": "slow"})
+        return super().do_GET()
+
+
+def start(mode, workers, slow_seconds):
+    if mode == "single":
+        httpd = socketserver.TCPServer(("127.0.0.1", 0), LegacyRequestHandler)
+    else:
+        httpd = server.TrafficHTTPServer(("127.0.0.1", 0), PooledRequestHandler, workers=workers)
+    httpd.slow_seconds = slow_seconds
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    return httpd
+
+
+def client_loop(port, deadline, latencies, errors, index):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    body = json.dumps({"intersection_id": 1, "road_id": 1, "vehicle_count": 7})
+    n = index
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            if n % 5 == 0:
+                conn.request("POST", "/api/traffic/update", body, {"Content-Type": "application/json"})
+            else:
+                conn.request("GET", "/api/signal/status")
+            conn.getresponse().read()
+            latencies.append(time.perf_counter() - started)
+        except OSError:
+            # A full listen backlog shows up as resets; count them and reconnect
+            errors.append(1)
+            conn.close()
+        n += 1
+    conn.close()
+
+
+def slow_loop(port, deadline):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    while time.monotonic() < deadline:
+        conn.request("GET", "/api/slow")
+        conn.getresponse().read()
+    conn.close()
+
+
+def run(mode, clients, duration, workers, slow_clients, slow_seconds):
+    httpd = start(mode, workers, slow_seconds)
+    port = httpd.server_address[1]
+    deadline = time.monotonic() + duration
+    latencies, errors = [], []
+    threads = [threading.Thread(target=client_loop, args=(port, deadline, latencies, errors, i))
+               for i in range(clients)]
+    threads += [threading.Thread(target=slow_loop, args=(port, deadline)) for _ in range(slow_clients)]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+    httpd.shutdown()
+    httpd.server_close()
+    return [mode, len(latencies), len(errors), f"{len(latencies) / elapsed:.0f}",
+            f"{percentile(latencies, 50) * 1000:.1f}", f"{percentile(latencies, 99) * 1000:.1f}"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--slow-clients", type=int, default=1)
+    parser.add_argument("--slow-seconds", type=float, default=0.5)
+    args = parser.parse_args()
+
+    rows = []
+    with temp_workdir():
+        for mode in ("single", "threaded"):
+            rows.append(run(mode, args.clients, args.duration, args.workers,
+                            args.slow_clients, args.slow_seconds))
+    print_table(["mode", "requests", "errors", "req/s", "p50 ms", "p99 ms"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Ingestion benchmark: one reading per POST vs batched uploads with group commits.
+
+    python benchmarks/bench_ingest.py --clients 4 --batch 1000 --duration 5
+"""
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+
+from _common import print_table, synthetic_workdir
+
+import server
+from traffic_system.ingest import ingest_queue
+
+
+def single_loop(port, deadline, counts):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    rng = random.Random()
+    while time.monotonic() < deadline:
+        body = json.dumps({"intersection_id": rng.randint(1, 1000), "road_id": 1,
+                           "vehicle_count": rng.randint(0, 30)})
+        conn.request("POST", "/api/traffic/update", body, {"Content-Type": "application/json"})
+        response = conn.getresponse()
+        response.read()
+        counts["accepted" if response.status == 200 else "rejected"] += 1
+    conn.close()
+
+
+def bulk_loop(port, deadline, counts, batch, fmt):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    rng = random.Random()
+    while time.monotonic() < deadline:
+        rows = [(rng.randint(1, 1000), rng.randint(1, 8), rng.randint(0, 30)) for _ in range(batch)]
+        if fmt == "csv":
+            body = "\n".join(f"{i},{r},{c}" for i, r, c in rows)
+            content_type = "text/csv"
+        else:
+            body = "\n".join(json.dumps({"intersection_id": i, "road_id": r, "vehicle_count": c})
+                             for i, r, c in rows)
+            content_type = "application/x-ndjson"
+        conn.request("POST", "/api/traffic/bulk", body, {"Content-Type": content_type})
+        response = conn.getresponse()
+        response.read()
+        if response.status == 202:
+            counts["accepted"] += batch
+        else:
+            counts["rejected"] += batch
+            time.sleep(0.05)
+    conn.close()
+
+
+def run(port, target, args, *extra):
+    counts = {"accepted": 0, "rejected": 0}
+    deadline = time.monotonic() + args.duration
+    started = time.monotonic()
+    threads = [threading.Thread(target=target, args=(port, deadline, counts) + extra) for _ in range(args.clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    ingest_queue.flush(timeout=60)
+    elapsed = time.monotonic() - started
+    return counts, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    rows = []
+    with synthetic_workdir(1000):
+        httpd = server.create_server(0, workers=args.clients + 2, host="127.0.0.1")
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        port = httpd.server_address[1]
+        try:
+            counts, elapsed = run(port, single_loop, args)
+            rows.append(["POST /api/traffic/update", counts["accepted"], counts["rejected"],
+                         f"{counts['accepted'] / elapsed:.0f}"])
+            for fmt in ("ndjson", "csv"):
+                counts, elapsed = run(port, bulk_loop, args, args.batch, fmt)
+                rows.append([f"POST /api/traffic/bulk ({fmt}, {args.batch}/batch)", counts["accepted"],
+                             counts["rejected"], f"{counts['accepted'] / elapsed:.0f}"])
+            stats = ingest_queue.stats()
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+
+    print_table(["path", "rows accepted", "rows rejected (429)", "rows/s committed"], rows)
+    print(f"queue: {stats['commits']} group commits, {stats['ingested']} rows")
+
+
+if __name__ == "__main__":
+    main()
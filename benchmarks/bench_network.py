@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Network model benchmark: memory and per-cycle allocations on a large network.
+
+Compares the old per-call dict/Row representations with the shared
+array-backed RoadNetwork: resident size of the topology, and the peak
+memory allocated while planning one signal cycle (old: one sorted join
+returning a Row per approach; new: plan_signals over network slots). The
+timings are taken under tracemalloc and only comparable to each other.
+
+    python benchmarks/bench_network.py --intersections 10000
+"""
+import argparse
+import time
+import tracemalloc
+
+from _common import print_table, synthetic_workdir
+
+from traffic_system.db import connection
+from traffic_system.network import RoadNetwork
+from traffic_system.phase_split import split_cycle
+from traffic_system.traffic_controller import TrafficController
+
+
+def legacy_intersections():
+    with connection() as conn:
+        intersections = [dict(row) for row in conn.execute("""
+            SELECT i.*, GROUP_CONCAT(ir.road_id) as road_ids, GROUP_CONCAT(r.road_name) as road_names,
+                   GROUP_CONCAT(ir.direction) as directions
+            FROM intersections i
+            JOIN intersection_roads ir ON i.intersection_id = ir.intersection_id
+            JOIN roads r ON ir.road_id = r.road_id
+            GROUP BY i.intersection_id
+        """)]
+    for intersection in intersections:
+        for key in ("road_ids", "road_names", "directions"):
+            intersection[key] = intersection[key].split(",")
+    return intersections
+
+
+def legacy_plan(controller):
+    """plan_signals as it was before the network model: one sorted join, a Row per approach."""
+    with connection() as conn:
+        rows = conn.execute("""
+            SELECT ir.intersection_id, ir.road_id, MAX(COALESCE(tl.vehicle_count, 0), 0) AS vehicle_count
+            FROM intersection_roads ir
+            LEFT JOIN traffic_latest tl ON ir.intersection_id = tl.intersection_id AND ir.road_id = tl.road_id
+            ORDER BY ir.intersection_id, vehicle_count DESC, ir.direction
+        """).fetchall()
+    offsets = [0]
+    for i in range(1, len(rows)):
+        if rows[i][0] != rows[i - 1][0]:
+            offsets.append(i)
+    offsets.append(len(rows))
+    greens = split_cycle([row[2] for row in rows], offsets, controller.cycle_time,
+                         controller.min_green_time, controller.lost_time_per_phase)
+    first = set(offsets)
+    return [(row[0], row[1], 'GREEN' if i in first else 'RED', greens[i]) for i, row in enumerate(rows)]
+
+
+def measure(fn):
+    """(seconds, bytes still held by the result, peak bytes allocated) for one call."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - started
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return seconds, held, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--intersections", type=int, default=10000)
+    args = parser.parse_args()
+
+    controller = TrafficController()
+    with synthetic_workdir(args.intersections):
+        rows = [
+            ["topology: dicts from GROUP_CONCAT", *measure(legacy_intersections)],
+            ["topology: RoadNetwork.load()", *measure(RoadNetwork.load)],
+            ["cycle plan: sorted join, Row per approach", *measure(lambda: legacy_plan(controller))],
+        ]
+        controller.plan_signals()  # loads the shared network outside the measurement
+        rows.append(["cycle plan: plan_signals()", *measure(controller.plan_signals)])
+
+    print(f"{args.intersections} intersections")
+    print_table(["what", "seconds", "MiB held", "MiB peak"],
+                [[name, f"{seconds:.4f}", f"{held / 2**20:.1f}", f"{peak / 2**20:.1f}"]
+                 for name, seconds, held, peak in rows])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Phase-split benchmark: demand-proportional green times for a whole network.
+
+Times split_cycle on its own and the full update_signal_logic cycle (read
+latest counts, split, apply, flush) and compares both to the controller's
+cycle_time budget.
+
+    python benchmarks/bench_phase_split.py --intersections 10000
+"""
+import argparse
+import random
+import time
+
+from _common import print_table, synthetic_workdir
+
+from traffic_system.phase_split import split_cycle
+from traffic_system.traffic_controller import TrafficController
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--intersections", type=int, default=10000)
+    parser.add_argument("--approaches", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    controller = TrafficController()
+    rng = random.Random(7)
+    demand = [rng.randint(0, 40) for _ in range(args.intersections * args.approaches)]
+    offsets = list(range(0, len(demand) + 1, args.approaches))
+    split = best_of(lambda: split_cycle(demand, offsets, controller.cycle_time), args.repeat)
+
+    def cycle():
+        controller.update_signal_logic()
+        controller.signals.flush()
+
+    with synthetic_workdir(args.intersections):
+        first = best_of(cycle, 1)  # loads the store; every signal changes
+        full = best_of(cycle, args.repeat)
+
+    budget = controller.cycle_time
+    print(f"{args.intersections} intersections x {args.approaches} approaches, {budget} s cycle")
+    print_table(["step", "seconds", "share of cycle budget"], [
+        ["split_cycle only", f"{split:.4f}", f"{split / budget:.3%}"],
+        ["first cycle, every signal written", f"{first:.4f}", f"{first / budget:.3%}"],
+        ["steady-state cycle", f"{full:.4f}", f"{full / budget:.3%}"],
+    ])
+    assert first < budget, "signal cycle does not fit in one cycle"
+
+
+if __name__ == "__main__":
+    main()
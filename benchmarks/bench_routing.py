@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Emergency routing benchmark: table scan per dispatch vs the graph planner.
+
+    python benchmarks/bench_routing.py --intersections 10000 --queries 200
+"""
+import argparse
+import random
+import time
+
+from _common import print_table, synthetic_workdir
+
+from traffic_system.db import get_emergency_routes
+from traffic_system.routing import RoutePlanner
+
+
+def legacy_route(start, end):
+    """The old get_route_path: read and parse every route, scan, else [start, end]."""
+    for route in get_emergency_routes():
+        if route['start_intersection_id'] == start and route['end_intersection_id'] == end:
+            return route['path_order']
+    return [start, end]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--intersections", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--routes", type=int, default=500, help="predefined emergency routes to add")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    pairs = [(rng.randint(1, args.intersections), rng.randint(1, args.intersections))
+             for _ in range(args.queries)]
+    rows = []
+    with synthetic_workdir(args.intersections):
+        from traffic_system.db import connection
+        with connection() as conn:
+            conn.executemany("""
+                INSERT INTO emergency_routes (route_name, start_intersection_id, end_intersection_id, path_order)
+                VALUES (?, ?, ?, ?)
+            """, [(f"Route {n}", n, n + 1, f"[{n}, {n + 1}]") for n in range(1, args.routes + 1)])
+
+        started = time.perf_counter()
+        for start, end in pairs:
+            legacy_route(start, end)
+        rows.append(["legacy scan (no real path)", f"{(time.perf_counter() - started) / len(pairs) * 1000:.2f}"])
+
+        planner = RoutePlanner()
+        started = time.perf_counter()
+        planner.load()
+        rows.append(["planner graph build (once)", f"{(time.perf_counter() - started) * 1000:.2f}"])
+
+        started = time.perf_counter()
+        hops = [len(planner.route(start, end) or []) for start, end in pairs]
+        rows.append(["planner A*, cold", f"{(time.perf_counter() - started) / len(pairs) * 1000:.2f}"])
+
+        started = time.perf_counter()
+        for start, end in pairs:
+            planner.route(start, end)
+        rows.append(["planner, cached", f"{(time.perf_counter() - started) / len(pairs) * 1000:.3f}"])
+
+    print(f"{args.intersections} intersections, {args.routes} predefined routes, "
+          f"mean path length {sum(hops) / len(hops):.1f} intersections")
+    print_table(["lookup", "ms per dispatch"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Scheduler benchmark: cadence of the signal cycle under load.
+
+Runs a task that takes --work seconds every --cycle seconds for --runs
+cycles, once with the old "run, then sleep(cycle)" loop and once with the
+deadline-based CycleScheduler, while --load busy threads compete for the
+CPU. Reports the achieved period and how far the last run drifted from
+its ideal start time.
+
+    python benchmarks/bench_scheduler.py --cycle 0.2 --work 0.05 --load 2
+"""
+import argparse
+import threading
+import time
+
+from _common import percentile, print_table
+
+from traffic_system.scheduler import CycleScheduler
+
+
+def busy(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def sleep_loop(task, cycle, runs):
+    for _ in range(runs):
+        task(None, cycle)
+        time.sleep(cycle)
+
+
+def deadline_loop(task, cycle, runs, starts):
+    scheduler = CycleScheduler(task, workers=1)
+    scheduler.add_zone("city", None, cycle)
+    scheduler.start()
+    while len(starts) < runs:
+        time.sleep(cycle / 10)
+    scheduler.stop()
+    return scheduler.stats()[0]
+
+
+def summarize(name, starts, cycle):
+    periods = [b - a for a, b in zip(starts, starts[1:])]
+    drift = starts[-1] - starts[0] - cycle * (len(starts) - 1)
+    return [name, f"{sum(periods) / len(periods):.4f}", f"{percentile(periods, 99):.4f}", f"{drift:+.4f}"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cycle", type=float, default=0.2)
+    parser.add_argument("--work", type=float, default=0.05, help="seconds each cycle spends working")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--load", type=int, default=2, help="busy threads competing for the CPU")
+    args = parser.parse_args()
+
+    stop = threading.Event()
+    load = [threading.Thread(target=busy, args=(stop,), daemon=True) for _ in range(args.load)]
+    for thread in load:
+        thread.start()
+    try:
+        rows = []
+        starts = []
+
+        def task(intersection_ids, cycle_time):
+            starts.append(time.monotonic())
+            deadline = time.perf_counter() + args.work
+            while time.perf_counter() < deadline:
+                pass
+
+        sleep_loop(task, args.cycle, args.runs)
+        rows.append(summarize("run + sleep(cycle)", starts, args.cycle))
+
+        starts = []
+        stats = deadline_loop(task, args.cycle, args.runs, starts)
+        rows.append(summarize("CycleScheduler", starts[:args.runs], args.cycle))
+    finally:
+        stop.set()
+
+    print(f"{args.cycle} s cycle, {args.work} s of work, {args.load} busy threads, {args.runs} runs")
+    print_table(["loop", "mean period", "p99 period", "drift after last run"], rows)
+    print(f"CycleScheduler: {stats['skipped']} skipped, max lateness {stats['max_lateness']} s")
+    assert abs(float(rows[1][3])) < args.cycle, "deadline scheduler drifted by a whole cycle"
+
+
+if __name__ == "__main__":
+    main()
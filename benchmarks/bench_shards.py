@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Sharded controller benchmark: one zone worker per process.
+
+Starts the ShardPool with 1, 2, 4... shards on a synthetic network and
+reports how long each shard takes to plan its zone and how long until the
+whole city has been applied. Planning only scales with shards up to the
+number of cores available.
+
+    python benchmarks/bench_shards.py --intersections 10000 --shards 1 2 4
+"""
+import argparse
+import os
+import time
+
+from _common import print_table, synthetic_workdir
+
+from traffic_system.sharding import ShardPool
+from traffic_system.traffic_controller import TrafficController
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--intersections", type=int, default=10000)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    rows = []
+    with synthetic_workdir(args.intersections):
+        for shards in args.shards:
+            controller = TrafficController()
+            controller.cycle_time = 3600  # one cycle per run; we only time the first
+            controller.signals.ensure_loaded()
+            started = time.perf_counter()
+            pool = ShardPool(controller, shards).start()
+            while not all(s["plans"] for s in pool.stats):
+                time.sleep(0.005)
+            city = time.perf_counter() - started
+            plan_times = [s["last_plan_s"] for s in pool.stats]
+            pool.stop()
+            rows.append([len(pool.zones), f"{max(plan_times):.3f}", f"{sum(plan_times):.3f}", f"{city:.3f}"])
+
+    print(f"{args.intersections} intersections, {os.cpu_count()} CPU(s)")
+    print_table(["shards", "slowest zone plan (s)", "total plan CPU (s)",
+                 "start to whole city applied (s)"], rows)
+
+
+if __name__ == "__main__":
+    main()
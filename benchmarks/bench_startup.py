@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: how long a (re)started server takes to answer.
+
+Starts `server.py` as a fresh process against a database of the given size
+and polls until GET /api/signal/status answers, reporting the time from
+spawn to the first response, how long that first request took, and the
+warm-up phases the server logged. The first start creates (or migrates)
+the database; the restarts find it current, as in a rolling deploy.
+
+    python benchmarks/bench_startup.py --intersections 10000 --restarts 5
+"""
+import argparse
+import http.client
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+
+from _common import ROOT, percentile, print_table, synthetic_workdir, temp_workdir
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_once(workdir):
+    """(ms until the first response, ms that request took, warm-up log line)."""
+    port = free_port()
+    # signal/status for a large network outgrows the default 8 MB response cache
+    env = dict(os.environ, PORT=str(port), PYTHONPATH=ROOT)
+    env.setdefault("RESPONSE_CACHE_BYTES", str(64 * 1024 * 1024))
+    spawned = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-u", os.path.join(ROOT, "server.py")], cwd=workdir, env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    try:
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError(f"server exited early:\n{proc.stdout.read()}")
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+                requested = time.perf_counter()
+                conn.request("GET", "/api/signal/status")
+                response = conn.getresponse()
+                response.read()
+                answered = time.perf_counter()
+                conn.close()
+                if response.status == 200:
+                    break
+            except OSError:
+                time.sleep(0.002)
+    finally:
+        proc.terminate()
+        output, _ = proc.communicate(timeout=10)
+    warmed = re.search(r"Warmed up in .*", output)
+    return (answered - spawned) * 1000, (answered - requested) * 1000, warmed.group(0) if warmed else ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--intersections", type=int, default=0, help="synthetic network size (0: sample data)")
+    parser.add_argument("--restarts", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir_for = (lambda: synthetic_workdir(args.intersections)) if args.intersections else temp_workdir
+    with workdir_for() as workdir:
+        if not args.intersections:
+            os.remove(os.path.join(workdir, "traffic.db"))  # first start creates it
+        runs = [("first start", *start_once(workdir))]
+        restarts = [start_once(workdir) for _ in range(args.restarts)]
+
+    ready = [r[0] for r in restarts]
+    first = [r[1] for r in restarts]
+    print(f"{args.intersections or 'sample'} intersections, {args.restarts} restarts")
+    print_table(["run", "ready ms", "first request ms", "server log"],
+                [[name, f"{r:.1f}", f"{f:.2f}", log] for name, r, f, log in runs] +
+                [["restart p50", f"{percentile(ready, 50):.1f}", f"{percentile(first, 50):.2f}", restarts[0][2]],
+                 ["restart max", f"{max(ready):.1f}", f"{max(first):.2f}", ""]])
+
+
+if __name__ == "__main__":
+    main()
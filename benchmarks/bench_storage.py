@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Storage benchmark: repository bulk writes and whole-city reads on a backend.
+
+Runs against a throwaway synthetic SQLite database, or against a server
+database given with --url (a scratch one: readings are written to it).
+Writers call traffic_data.add_many concurrently; the reads are the ones the
+signal cycle and a restart make. Compare SQLite tunings by setting
+SQLITE_MMAP_BYTES / SQLITE_CACHE_KB for separate runs.
+
+    python benchmarks/bench_storage.py --intersections 2000 --writers 4 --batch 1000
+    python benchmarks/bench_storage.py --url postgresql://localhost/traffic_bench --writers 16
+"""
+import argparse
+import contextlib
+import random
+import threading
+import time
+
+from _common import percentile, print_table, synthetic_workdir
+
+from traffic_system.db import get_storage
+
+
+def write(storage, writers, batch, duration, intersections):
+    """Rows/s and per-batch latencies with `writers` threads adding batches for `duration` seconds."""
+    latencies, lock = [], threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def writer(seed):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            rows = [(rng.randint(1, intersections), rng.randint(1, 4), rng.randint(0, 30), 'LOW', 1.0, None)
+                    for _ in range(batch)]
+            started = time.perf_counter()
+            storage.traffic_data.add_many(rows)
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return len(latencies) * batch / (time.perf_counter() - started), latencies
+
+
+def timed_ms(fn, repeat=5):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return percentile(samples, 50)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="server database URL (default: a synthetic SQLite database)")
+    parser.add_argument("--intersections", type=int, default=2000, help="synthetic network size (SQLite only)")
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=3.0)
+    args = parser.parse_args()
+
+    workdir = contextlib.nullcontext() if args.url else synthetic_workdir(args.intersections)
+    with workdir:
+        storage = get_storage(args.url)
+        storage.migrate()
+        intersections = len(storage.intersections.ids())
+        rows_per_sec, latencies = write(storage, args.writers, args.batch, args.duration, intersections)
+        latest_ms = timed_ms(storage.latest.counts)
+        signals_ms = timed_ms(storage.signal_status.load)
+        storage.close()
+
+    print(f"{storage.dialect.name}, {intersections} intersections, {args.writers} writers x {args.batch} rows")
+    print_table(["metric", "value"], [
+        ["insert rows/s", f"{rows_per_sec:.0f}"],
+        ["batch p50 ms", f"{percentile(latencies, 50) * 1000:.1f}"],
+        ["batch p99 ms", f"{percentile(latencies, 99) * 1000:.1f}"],
+        ["latest.counts ms", f"{latest_ms:.1f}"],
+        ["signal_status.load ms", f"{signals_ms:.1f}"],
+    ])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,13 @@
-import sqlite3
+from traffic_system.db import get_storage
 
-def init_db():
-    # Connect to SQLite database (creates file if it doesn't exist)
-    conn = sqlite3.connect('traffic.db')
-    cur = conn.cursor()
-
-    # Read the SQL file
-    with open('traffic_sys.sql', 'r') as f:
-        sql_script = f.read()
-
-    # Execute the entire script at once
+def init_db(path=None):
+    # Creates the database (from traffic_sys.sql, or traffic_sys_postgres.sql for
+    # TRAFFIC_DB_URL) if it doesn't exist, or applies any pending migrations
     try:
-        cur.executescript(sql_script)
+        get_storage(path).migrate()
         print("Database initialized successfully.")
     except Exception as e:
         print(f"Error initializing database: {e}")
-    finally:
-        conn.commit()
-        conn.close()
 
 if __name__ == "__main__":
-    init_db()
\ No newline at end of file
+    init_db()
@@ -3,29 +3,130 @@
 Corrected Server for Render Deployment
 """
 import http.server
-import socketserver
 import json
 import os
+import selectors
+import socket
 import threading
-from traffic_system.db import get_connection, get_intersections, get_emergency_routes
-from traffic_system.traffic_controller import start_traffic_controller
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+from traffic_system.db import get_storage, get_intersections, get_emergency_routes
+from traffic_system.traffic_controller import controller, start_traffic_controller
 from traffic_system.emergency_handler import handle_emergency, clear_emergency, get_emergency_status
+from traffic_system.response_cache import response_cache
+from traffic_system.events import event_hub
+from traffic_system.network import road_network
+from traffic_system.ingest import ingest_queue, parse_reading, parse_readings
+from traffic_system.retention import retention, get_traffic_history
+from traffic_system import metrics
 
 # Global controller variable
 traffic_controller = None
 
+# GET endpoints served from the response cache: key -> (current version, body builder)
+CACHED_RESPONSES = {
+    'signal/status': (lambda: controller.signals.version, controller.signals.snapshot),
+    'intersections': (lambda: road_network.get().version, get_intersections),
+    'emergency/routes': (lambda: road_network.get().version, get_emergency_routes),
+}
+
+# Seconds each phase of the last warm_up() took
+startup_timings = {}
+
+def warm_up():
+    """Get what the first requests need ready before the socket accepts any.
+
+    Applies pending schema migrations (creating the database on first run),
+    loads the road network and the signal store, runs one signal cycle (so
+    the scheduler's first run finds nothing to change and the cached
+    signal/status survives it), and pre-encodes every cached GET response.
+    Returns the seconds each phase took.
+    """
+    phases = (
+        ("migrate", lambda: get_storage().migrate()),
+        ("network", road_network.get),
+        ("signals", controller.signals.ensure_loaded),
+        ("cycle", controller.update_signal_logic),
+        ("responses", lambda: [response_cache.get(key, version(), builder)
+                               for key, (version, builder) in CACHED_RESPONSES.items()]),
+    )
+    for name, phase in phases:
+        started = time.perf_counter()
+        phase()
+        startup_timings[name] = time.perf_counter() - started
+    return dict(startup_timings)
+
 class TrafficRequestHandler(http.server.BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections alive, so every response must carry Content-Length
+    protocol_version = 'HTTP/1.1'
+    # Seconds a request may take to arrive, and an idle keep-alive connection may stay parked
+    timeout = int(os.environ.get("SERVER_KEEPALIVE_TIMEOUT", 15))
+    # True once this connection is waiting for its next request; the server then parks it
+    idle = False
+    # Buffer each response into one write and send it immediately; with Nagle
+    # on, a header write followed by a body write stalls on the delayed ACK
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        """Serve the requests that have already arrived, then hand the worker back.
+
+        A keep-alive connection with nothing more to read is marked idle
+        instead of blocking its worker until the next request, and the server
+        parks it with IdleConnections. resume() picks it up again.
+        """
+        self.idle = False
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection:
+            if not self._request_arrived():
+                self.idle = True
+                return
+            self.handle_one_request()
+
+    def resume(self):
+        """Serve a parked connection whose next request has started to arrive."""
+        try:
+            self.handle()
+        finally:
+            self.finish()
+
+    def finish(self):
+        if not self.idle:  # a parked connection keeps its buffered files
+            super().finish()
+
+    def _request_arrived(self):
+        """True if bytes of the next request are buffered or readable without blocking."""
+        self.connection.settimeout(0)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return True  # let handle_one_request see the error and close
+        finally:
+            self.connection.settimeout(self.timeout)
+
     def do_GET(self):
-        self.send_cors_headers()
+        started = time.perf_counter()
         if self.path.startswith('/api/'):
-            api_path = self.path[4:]
+            api_path = self.path.split('?')[0][len('/api/'):]
             if api_path == 'signal/status': self.handle_signal_status()
+            elif api_path == 'signal/offsets': self.send_json(controller.signal_offsets())
             elif api_path == 'intersections': self.handle_intersections()
             elif api_path == 'emergency/routes': self.handle_emergency_routes()
             elif api_path == 'emergency/status': self.handle_emergency_status()
+            elif api_path == 'stream': self.handle_stream()
+            elif api_path == 'traffic/bulk/stats': self.send_json(ingest_queue.stats())
+            elif api_path == 'traffic/history': self.handle_traffic_history()
+            elif api_path == 'traffic/latest': self.handle_traffic_latest()
+            elif api_path == 'metrics': self.handle_metrics()
+            elif api_path == 'metrics/profile': self.send_body(metrics.profiler.folded().encode(), 'text/plain; charset=utf-8')
             else: self.send_error(404, "API endpoint not found")
+            self.observe_request('GET', api_path, started)
         else:
             self.serve_static_file()
+            self.observe_request('GET', 'static', started)
 
     def serve_static_file(self):
         path = self.path.split('?')[0]
@@ -40,138 +141,575 @@ class TrafficRequestHandler(http.server.BaseHTTPRequestHandler):
                 '.png': 'image/png', '.jpg': 'image/jpeg'
             }.get(ext, 'application/octet-stream')
             
-            self.send_response(200)
-            self.send_header('Content-Type', content_type)
-            self.end_headers()
-            with open(file_path, 'rb') as f: self.wfile.write(f.read())
+            with open(file_path, 'rb') as f: self.send_body(f.read(), content_type)
         else:
             index_path = os.path.join('frontend', 'build', 'index.html')
             if os.path.exists(index_path):
-                self.send_response(200)
-                self.send_header('Content-Type', 'text/html')
-                self.end_headers()
-                with open(index_path, 'rb') as f: self.wfile.write(f.read())
+                with open(index_path, 'rb') as f: self.send_body(f.read(), 'text/html')
             else:
                 self.send_error(404, "File not found")
 
     def do_POST(self):
-        self.send_cors_headers()
+        started = time.perf_counter()
+        # Always drain the body so a reused connection starts at the next request line
+        self.request_body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
         if self.path.startswith('/api/'):
-            api_path = self.path[4:]
+            api_path = self.path.split('?')[0][len('/api/'):]
             if api_path == 'traffic/update': self.handle_traffic_update()
+            elif api_path == 'traffic/bulk': self.handle_traffic_bulk()
             elif api_path == 'emergency/trigger': self.handle_emergency_trigger()
             elif api_path == 'emergency/clear': self.handle_emergency_clear()
+            elif api_path == 'metrics/profile': self.handle_profiler_toggle()
+            elif api_path == 'network/reload': self.handle_network_reload()
             else: self.send_error(404, "API endpoint not found")
+            self.observe_request('POST', api_path, started)
         else:
             self.send_error(404)
 
     def do_OPTIONS(self):
-        self.send_cors_headers()
-        self.end_headers()
+        self.send_body(b'')
+
+    def handle_one_request(self):
+        self.response_status = 0  # a keep-alive connection must not report its previous request's status
+        super().handle_one_request()
+
+    def send_response(self, code, message=None):
+        self.response_status = code  # for the request metrics
+        super().send_response(code, message)
+
+    def observe_request(self, method, route, started):
+        if metrics.enabled:
+            status = self.response_status
+            # Unknown paths share one label so scanners cannot blow up the series count
+            route = 'unknown' if status == 404 and route != 'static' else route
+            metrics.HTTP_REQUEST_SECONDS.labels(method, route, status).observe(time.perf_counter() - started)
 
     def send_cors_headers(self):
-        self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, If-None-Match')
+        self.send_header('Access-Control-Expose-Headers', 'ETag')
+
+    def send_body(self, body, content_type='application/json', status=200):
+        """Send a complete response with an explicit length so the connection can be reused."""
+        self.send_response(status)
+        self.send_cors_headers()
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, payload, status=200):
+        self.send_body(json.dumps(payload).encode(), status=status)
+
+    def send_cached(self, key):
+        """Send one of CACHED_RESPONSES pre-encoded, honouring If-None-Match and gzip."""
+        version, builder = CACHED_RESPONSES[key]
+        entry = response_cache.get(key, version(), builder)
+        if entry.etag in (self.headers.get('If-None-Match') or ''):
+            self.send_response(304)
+            self.send_cors_headers()
+            self.send_header('ETag', entry.etag)
+            self.end_headers()
+            return
+
+        use_gzip = entry.gzipped is not None and 'gzip' in (self.headers.get('Accept-Encoding') or '')
+        body = entry.gzipped if use_gzip else entry.body
+        self.send_response(200)
+        self.send_cors_headers()
         self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', entry.etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+        if use_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        self.wfile.write(body)
 
     # --- Handlers ---
     def handle_signal_status(self):
         try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT ss.*, i.intersection_name, r.road_name, ir.direction
-                FROM signal_status ss
-                JOIN intersections i ON ss.intersection_id = i.intersection_id
-                JOIN roads r ON ss.road_id = r.road_id
-                JOIN intersection_roads ir ON ss.intersection_id = ir.intersection_id AND ss.road_id = ir.road_id
-            """)
-            data = [dict(row) for row in cursor.fetchall()]
-            conn.close()
-            self.end_headers()
-            self.wfile.write(json.dumps(data).encode())
+            # Served from the controller's in-memory signal store; no database round trip
+            self.send_cached('signal/status')
         except Exception as e:
             self.send_error(500, str(e))
 
     def handle_intersections(self):
         try:
-            self.end_headers()
-            self.wfile.write(json.dumps(get_intersections()).encode())
+            self.send_cached('intersections')
         except Exception as e:
             self.send_error(500, str(e))
 
     def handle_emergency_routes(self):
         try:
-            self.end_headers()
-            self.wfile.write(json.dumps(get_emergency_routes()).encode())
+            self.send_cached('emergency/routes')
         except Exception as e:
             self.send_error(500, str(e))
 
     def handle_emergency_status(self):
         try:
-            self.end_headers()
-            self.wfile.write(json.dumps({"active_emergency": get_emergency_status()}).encode())
+            state = controller.state  # lock-free snapshot of the running corridors
+            self.send_json({"active_emergency": get_emergency_status(),
+                            "corridors": [handle.to_dict() for handle in state.emergencies]})
+        except Exception as e:
+            self.send_error(500, str(e))
+
+    def handle_stream(self):
+        """Server-Sent Events feed of signal and emergency changes.
+
+        Resumes after the Last-Event-ID header (or ?last_event_id=) when given;
+        otherwise starts from now. After the headers the socket is handed to the
+        server's StreamBroadcaster and this worker is released.
+        """
+        streams = getattr(self.server, 'streams', None)
+        if streams is None:
+            return self.send_error(404, "Streaming not supported by this server")
+        query = parse_qs(urlsplit(self.path).query)
+        last_id = self.headers.get('Last-Event-ID') or query.get('last_event_id', [''])[0]
+        last_id = int(last_id) if last_id.isdigit() else None
+
+        self.send_response(200)
+        self.send_cors_headers()
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('X-Accel-Buffering', 'no')
+        self.end_headers()
+        self.wfile.write(b'retry: 3000\n\n')
+        self.wfile.flush()
+        streams.add(self.request, last_id)
+        self.close_connection = True
+
+    def handle_traffic_latest(self):
+        """Latest reading of every approach, with the density level and rate classified at ingest."""
+        try:
+            self.send_json(controller.get_traffic_data())
+        except Exception as e:
+            self.send_error(500, str(e))
+
+    def handle_traffic_history(self):
+        """Per-minute or per-hour aggregates from the rollup tables.
+
+        Query parameters: resolution (minute|hour, default hour), start, end,
+        intersection_id, road_id.
+        """
+        query = {key: values[0] for key, values in parse_qs(urlsplit(self.path).query).items()}
+        try:
+            history = get_traffic_history(
+                query.get('resolution', 'hour'), query.get('start'), query.get('end'),
+                int(query['intersection_id']) if 'intersection_id' in query else None,
+                int(query['road_id']) if 'road_id' in query else None)
+        except ValueError as e:
+            return self.send_json({"status": "error", "message": str(e)}, status=400)
+        except Exception as e:
+            return self.send_error(500, str(e))
+        self.send_json({"resolution": query.get('resolution', 'hour'), "buckets": history})
+
+    def handle_metrics(self):
+        """Every metric in Prometheus text exposition format."""
+        try:
+            self.send_body(metrics.registry.render().encode(), 'text/plain; version=0.0.4; charset=utf-8')
+        except Exception as e:
+            self.send_error(500, str(e))
+
+    def handle_profiler_toggle(self):
+        """Start/stop the sampling profiler: {"enabled": bool, "interval": seconds, "reset": bool}."""
+        try:
+            data = json.loads(self.request_body.decode()) if self.request_body else {}
+            if data.get("reset"):
+                metrics.profiler.reset()
+            if data.get("enabled"):
+                metrics.profiler.start(max(0.001, float(data.get("interval", 0.01))))
+            elif "enabled" in data:
+                metrics.profiler.stop()
+        except (ValueError, TypeError) as e:
+            return self.send_json({"status": "error", "message": str(e)}, status=400)
+        self.send_json(metrics.profiler.status())
+
+    def handle_network_reload(self):
+        """Rebuild the shared road network (and everything cached on it) after editing the topology."""
+        try:
+            network = road_network.reload()
+            self.send_json({"status": "success", "intersections": len(network),
+                            "approaches": len(network.approach_road), "edges": len(network.adj_targets) // 2})
         except Exception as e:
             self.send_error(500, str(e))
 
     def handle_traffic_update(self):
         try:
-            length = int(self.headers['Content-Length'])
-            data = json.loads(self.rfile.read(length).decode())
-            conn = get_connection()
-            conn.execute("INSERT INTO traffic_data (intersection_id, road_id, vehicle_count) VALUES (?, ?, ?)",
-                         (data.get("intersection_id"), data.get("road_id"), data.get("vehicle_count")))
-            conn.commit()
-            conn.close()
-            if traffic_controller: traffic_controller.update_signal_logic()
-            self.end_headers()
-            self.wfile.write(json.dumps({"status": "success"}).encode())
+            # Validated like a bulk reading, timestamp included
+            intersection_id, road_id, vehicle_count, timestamp = parse_reading(json.loads(self.request_body.decode()))
+        except ValueError as e:  # json.JSONDecodeError included
+            return self.send_json({"status": "error", "message": str(e)}, status=400)
+        try:
+            # Same classifier as bulk ingestion, so both paths share each approach's history
+            density_level, rate = ingest_queue.classifier.classify(intersection_id, road_id, vehicle_count)
+            get_storage().traffic_data.add(intersection_id, road_id, vehicle_count, density_level, rate, timestamp)
+            # Only this intersection is recomputed, after the debounce window and off this thread
+            if traffic_controller: traffic_controller.mark_dirty(intersection_id)
+            self.send_json({"status": "success", "density_level": density_level, "rate": rate})
+        except Exception as e:
+            self.send_error(500, str(e))
+
+    def handle_traffic_bulk(self):
+        """Accept a batch of readings (NDJSON or CSV) into the ingestion queue."""
+        try:
+            readings = parse_readings(self.request_body, self.headers.get('Content-Type'))
+        except ValueError as e:
+            return self.send_json({"status": "error", "message": str(e)}, status=400)
+        try:
+            if not ingest_queue.offer(readings):
+                # Backpressure: the writer is behind, ask the sensor gateway to retry shortly
+                self.send_response(429)
+                self.send_cors_headers()
+                self.send_header('Retry-After', '1')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_json({"status": "accepted", "accepted": len(readings)}, status=202)
         except Exception as e:
             self.send_error(500, str(e))
 
     def handle_emergency_trigger(self):
         try:
-            length = int(self.headers['Content-Length'])
-            data = json.loads(self.rfile.read(length).decode())
-            result = handle_emergency(data.get("start_intersection"), data.get("end_intersection"), data.get("emergency_type"))
-            self.end_headers()
-            self.wfile.write(json.dumps(result).encode())
+            data = json.loads(self.request_body.decode())
+            result = handle_emergency(data["start_intersection"], data["end_intersection"], data.get("emergency_type"))
+            self.send_json(result)
+        except (ValueError, KeyError, TypeError) as e:
+            # Malformed JSON, a missing or non-integer intersection, or no route between them
+            message = f"missing field {e}" if isinstance(e, KeyError) else str(e)
+            self.send_json({"status": "error", "message": message}, status=400)
         except Exception as e:
             self.send_error(500, str(e))
 
     def handle_emergency_clear(self):
         try:
-            self.end_headers()
-            self.wfile.write(json.dumps(clear_emergency()).encode())
+            data = json.loads(self.request_body.decode()) if self.request_body else {}
+            self.send_json(clear_emergency(data.get("corridor_id")))
+        except ValueError as e:
+            self.send_json({"status": "error", "message": str(e)}, status=400)
+        except LookupError as e:
+            self.send_json({"status": "error", "message": str(e)}, status=404)
         except Exception as e:
             self.send_error(500, str(e))
 
     def log_message(self, format, *args):
         return # Silence logs
 
+class StreamBroadcaster:
+    """Fans event frames out to every /api/stream client from a single thread.
+
+    Subscribers are non-blocking sockets with a small outgoing buffer, so an
+    open dashboard costs a socket rather than a worker thread. Clients that
+    stop reading are dropped once max_pending bytes pile up, and a comment
+    line every `heartbeat` seconds detects peers that went away.
+    """
+
+    def __init__(self, hub, heartbeat=15.0, max_pending=256 * 1024):
+        self.hub = hub
+        self.heartbeat = heartbeat
+        self.max_pending = max_pending
+        self._clients = {}  # socket -> pending bytes
+        self._lock = threading.Lock()
+        self._cursor = hub.last_id  # newest event already queued to every client
+        self._thread = None
+        self._closed = False
+
+    def __len__(self):
+        return len(self._clients)
+
+    def owns(self, sock):
+        return sock in self._clients
+
+    def add(self, sock, last_id=None):
+        """Take over a socket whose response headers were already sent."""
+        with self._lock:
+            if last_id is None:
+                pending = bytearray()
+            else:
+                backlog = self.hub.since(last_id, until=self._cursor)
+                if backlog is None:
+                    # Too far behind to replay; tell the client to refetch full state
+                    pending = bytearray(b'event: reset\ndata: {}\n\n')
+                else:
+                    pending = bytearray(b''.join(frame for _, frame in backlog))
+            sock.setblocking(False)
+            self._clients[sock] = pending
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stream-broadcaster", daemon=True)
+                self._thread.start()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            clients, self._clients = self._clients, {}
+        for sock in clients:
+            self._drop(sock)
+
+    def _run(self):
+        next_beat = time.monotonic() + self.heartbeat
+        while not self._closed:
+            backed_up = any(self._clients.values())
+            self.hub.wait(self._cursor, timeout=0.05 if backed_up else 0.5)
+            with self._lock:
+                events = self.hub.since(self._cursor)
+                if events is None:
+                    # This thread fell behind the hub's history; everyone must resync
+                    chunk = b'event: reset\ndata: {}\n\n'
+                    self._cursor = self.hub.last_id
+                else:
+                    chunk = b''.join(frame for _, frame in events)
+                    if events:
+                        self._cursor = events[-1][0]
+                if time.monotonic() >= next_beat:
+                    chunk += b': keepalive\n\n'
+                    next_beat = time.monotonic() + self.heartbeat
+                for sock, pending in list(self._clients.items()):
+                    pending.extend(chunk)
+                    if not pending:
+                        continue
+                    try:
+                        sent = sock.send(pending)
+                        del pending[:sent]
+                    except BlockingIOError:
+                        pass
+                    except OSError:
+                        del self._clients[sock]
+                        self._drop(sock)
+                        continue
+                    if len(pending) > self.max_pending:
+                        del self._clients[sock]
+                        self._drop(sock)
+
+    @staticmethod
+    def _drop(sock):
+        try:
+            sock.close()
+        except OSError:
+            pass
+
+class IdleConnections:
+    """Keep-alive connections parked between requests, off the worker pool.
+
+    An idle connection costs a registered socket rather than a worker
+    thread: one selector thread watches every parked socket and passes its
+    handler to `resume` as soon as the next request starts arriving.
+    Connections left idle for `timeout` seconds are passed to `close`.
+    """
+
+    def __init__(self, resume, close, timeout):
+        self.resume = resume
+        self.close_handler = close
+        self.timeout = timeout
+        self._parked = {}  # socket -> (handler, deadline)
+        self._pending = []  # sockets parked since the selector thread last registered
+        self._lock = threading.Lock()
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+        self._thread = None
+        self._closed = False
+
+    def __len__(self):
+        return len(self._parked)
+
+    def owns(self, sock):
+        return sock in self._parked
+
+    def park(self, handler):
+        with self._lock:
+            if not self._closed:
+                self._parked[handler.connection] = (handler, time.monotonic() + self.timeout)
+                self._pending.append(handler.connection)
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="idle-connections", daemon=True)
+                    self._thread.start()
+                handler = None
+        if handler is not None:
+            self.close_handler(handler)
+            return
+        self._wake()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            parked, self._parked = self._parked, {}
+        self._wake()
+        for handler, _ in parked.values():
+            self.close_handler(handler)
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b'\0')
+        except OSError:
+            pass  # already full of wake-ups, or closed
+
+    def _run(self):
+        next_sweep = time.monotonic() + 1.0
+        while not self._closed:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            for sock in pending:
+                try:
+                    self._selector.register(sock, selectors.EVENT_READ)
+                except (KeyError, ValueError, OSError):
+                    pass  # closed meanwhile
+            ready = []
+            for key, _ in self._selector.select(timeout=1.0):
+                if key.fileobj is self._wake_r:
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except OSError:
+                        pass
+                    continue
+                self._selector.unregister(key.fileobj)
+                ready.append(key.fileobj)
+
+            expired, now = [], time.monotonic()
+            with self._lock:
+                handlers = [self._parked.pop(sock)[0] for sock in ready if sock in self._parked]
+                if now >= next_sweep:
+                    next_sweep = now + 1.0
+                    for sock, (handler, deadline) in list(self._parked.items()):
+                        if deadline <= now:
+                            del self._parked[sock]
+                            expired.append(handler)
+            for handler in expired:
+                try:
+                    self._selector.unregister(handler.connection)
+                except (KeyError, ValueError):
+                    pass
+                self.close_handler(handler)
+            for handler in handlers:
+                self.resume(handler)
+        self._selector.close()
+
+class TrafficHTTPServer(http.server.HTTPServer):
+    """HTTP server that hands each connection to a bounded pool of worker threads.
+
+    A slow request (e.g. an emergency trigger) only occupies one worker, so
+    dashboard reads and sensor updates keep being served alongside it.
+    Workers are only held while a request is being served: between requests
+    a keep-alive connection is parked in IdleConnections, so there can be
+    far more open connections than workers. Requests beyond the pool size
+    wait in the executor queue, and the listen backlog bounds how many
+    connections can wait in the kernel before accept().
+    """
+    allow_reuse_address = True
+
+    def __init__(self, server_address, handler_class, workers=16, backlog=128):
+        self.request_queue_size = backlog
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http-worker")
+        self.streams = StreamBroadcaster(event_hub)
+        self.idle = IdleConnections(self._resume, self._close_idle, handler_class.timeout)
+        super().__init__(server_address, handler_class)
+        _servers.add(self)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process_request_worker, request, client_address)
+
+    def finish_request(self, request, client_address):
+        return self.RequestHandlerClass(request, client_address, self)
+
+    def _process_request_worker(self, request, client_address, handler=None):
+        try:
+            if handler is None:
+                handler = self.finish_request(request, client_address)
+            else:
+                handler.resume()
+            if handler.idle:
+                self.idle.park(handler)  # the worker goes back to the pool
+                return
+        except Exception:
+            self.handle_error(request, client_address)
+        self.shutdown_request(request)
+
+    def _resume(self, handler):
+        try:
+            self.executor.submit(self._process_request_worker, handler.request, handler.client_address, handler)
+        except RuntimeError:  # the pool has shut down
+            self._close_idle(handler)
+
+    def _close_idle(self, handler):
+        handler.idle = False
+        try:
+            handler.finish()
+        except OSError:
+            pass
+        self.shutdown_request(handler.request)
+
+    def shutdown_request(self, request):
+        # Streaming sockets now belong to the broadcaster
+        if not self.streams.owns(request):
+            super().shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.idle.close()
+        self.streams.close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+# Live servers, for the connection gauges
+_servers = weakref.WeakSet()
+
+metrics.registry.gauge("traffic_stream_clients", "Connected /api/stream clients",
+                       lambda: sum(len(server.streams) for server in list(_servers)))
+metrics.registry.gauge("traffic_idle_connections", "Keep-alive connections parked between requests",
+                       lambda: sum(len(server.idle) for server in list(_servers)))
+metrics.registry.gauge("traffic_response_cache_requests_total", "Response cache lookups by result",
+                       lambda: {("hit",): response_cache.hits, ("miss",): response_cache.misses},
+                       ("result",), kind="counter")
+metrics.registry.gauge("traffic_ingest_queue_depth", "Readings waiting for a group commit",
+                       lambda: ingest_queue.stats()["queued"])
+metrics.registry.gauge("traffic_events_published_total", "Events published to the stream feed",
+                       lambda: event_hub.last_id, kind="counter")
+metrics.registry.gauge("traffic_active_corridors", "Green corridors currently running",
+                       lambda: len(controller.state.emergencies))
+metrics.registry.gauge("traffic_shard_last_plan_seconds", "How long each zone worker took to plan its last cycle",
+                       lambda: {(str(shard),): stats["last_plan_s"] for shard, stats in
+                                enumerate(controller.shards.stats if controller.shards else [])},
+                       ("shard",))
+metrics.registry.gauge("traffic_zone_skipped_cycles_total", "Zone cycle deadlines skipped because a run overran",
+                       lambda: {(zone["zone"],): zone["skipped"] for zone in controller.scheduler.stats()},
+                       ("zone",), kind="counter")
+metrics.registry.gauge("traffic_zone_max_lateness_seconds", "Worst delay between a zone's deadline and its run starting",
+                       lambda: {(zone["zone"],): zone["max_lateness"] for zone in controller.scheduler.stats()},
+                       ("zone",))
+
+metrics.registry.gauge("traffic_startup_seconds", "Time each warm-up phase took before the server accepted traffic",
+                       lambda: {(phase,): seconds for phase, seconds in startup_timings.items()}, ("phase",))
+
+def create_server(port, workers=None, backlog=None, host="0.0.0.0"):
+    """Build the HTTP server; workers/backlog default to SERVER_WORKERS/SERVER_BACKLOG."""
+    if workers is None:
+        workers = int(os.environ.get("SERVER_WORKERS", 16))
+    if backlog is None:
+        backlog = int(os.environ.get("SERVER_BACKLOG", 128))
+    return TrafficHTTPServer((host, port), TrafficRequestHandler, workers=workers, backlog=backlog)
+
 def run_server():
     # --- CRITICAL FIX: Use Render's PORT ---
     port = int(os.environ.get("PORT", 5000))
-    
+
     # Ensure we listen on 0.0.0.0 (all interfaces)
-    server_address = ("0.0.0.0", port)
-    
-    with socketserver.TCPServer(server_address, TrafficRequestHandler) as httpd:
-        print(f"🚦 Server running on port {port}")
+    with create_server(port) as httpd:
+        print(f"🚦 Server running on port {port} ({httpd.workers} workers)")
         httpd.serve_forever()
 
 if __name__ == "__main__":
-    # 1. Initialize DB if missing
-    if not os.path.exists('traffic.db'):
-        print("Initializing Database...")
-        from init_db import init_db
-        init_db()
+    # 1. Migrate the schema (creating the DB on first run) and warm the caches
+    timings = warm_up()
+    print(f"Warmed up in {sum(timings.values()) * 1000:.1f} ms (" +
+          ", ".join(f"{phase} {seconds * 1000:.1f} ms" for phase, seconds in timings.items()) + ")")
 
     # 2. Start Controller (Non-blocking)
     print("Starting Traffic Controller...")
     traffic_controller = start_traffic_controller()
+    ingest_queue.on_commit = traffic_controller.mark_dirty_many
+    retention.start()
 
     # 3. Run Server
     run_server()
\ No newline at end of file
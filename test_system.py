@@ -6,8 +6,38 @@ Validates core functionality without requiring database connection
 
 import sys
 import os
+import contextlib
+import shutil
+import tempfile
+import time
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+@contextlib.contextmanager
+def temp_database():
+    """Run the body in a temp directory holding a fresh sample traffic.db"""
+    from init_db import init_db
+    previous = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="traffic-test-")
+    shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), "traffic_sys.sql"), workdir)
+    os.chdir(workdir)
+    try:
+        init_db()
+        yield workdir
+    finally:
+        from traffic_system.db import close_pools
+        close_pools()
+        os.chdir(previous)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def wait_until(predicate, timeout=5.0):
+    """Poll predicate until it is truthy or the timeout expires"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
 def test_imports():
     """Test that all modules can be imported"""
     try:
@@ -59,6 +89,1203 @@ def test_app_routes():
         print(f"✗ HTTP server test failed: {e}")
         return False
 
+def test_threaded_server():
+    """Test that the pooled server answers concurrent keep-alive clients"""
+    try:
+        import http.client
+        import threading
+        import server
+        httpd = server.create_server(0, workers=2, backlog=8, host="127.0.0.1")
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        try:
+            port = httpd.server_address[1]
+            first = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            second = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            for conn in (first, second, first):
+                conn.request("OPTIONS", "/api/signal/status")
+                response = conn.getresponse()
+                response.read()
+                assert response.status == 200
+                assert response.version == 11
+            # The first connection was reused rather than reopened
+            assert first.sock is not None
+            first.close()
+            second.close()
+
+            # Idle keep-alive connections do not hold workers: five clients share the two
+            clients = [http.client.HTTPConnection("127.0.0.1", port, timeout=2) for _ in range(5)]
+            for _ in range(3):
+                for conn in clients:
+                    conn.request("OPTIONS", "/api/signal/status")
+                    response = conn.getresponse()
+                    response.read()
+                    assert response.status == 200
+            assert all(conn.sock is not None for conn in clients)
+            assert wait_until(lambda: len(httpd.idle) == 5)
+            for conn in clients:
+                conn.close()
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+        print("✓ Threaded server keeps connections alive")
+        return True
+    except Exception as e:
+        print(f"✗ Threaded server test failed: {e}")
+        return False
+
+def test_green_corridor_non_blocking():
+    """Test that corridors return immediately, advance on timers and can be cancelled"""
+    try:
+        with temp_database():
+            from traffic_system.db import get_connection
+            from traffic_system.traffic_controller import TrafficController
+            controller = TrafficController()
+            controller.start_scheduler = lambda: None  # keep the normal cycle out of the way
+            controller.corridor_green_time = 0.05
+            controller.emergency_hold_time = 60
+
+            colors = controller.signals.colors
+
+            started = time.monotonic()
+            first = controller.create_green_corridor([4, 1, 5], "ambulance")
+            second = controller.create_green_corridor([2, 3], "fire")
+            assert time.monotonic() - started < 0.05
+            assert controller.is_emergency_active
+            assert wait_until(lambda: colors(5) == {'GREEN'} and colors(3) == {'GREEN'})
+            # Intersections the vehicles have passed are back under normal control
+            assert controller.corridors.claimed == {5, 3}
+            controller.update_signal_logic()  # the rest of the city keeps cycling around the corridors
+            assert colors(4) == {'GREEN', 'RED'} and colors(5) == {'GREEN'} and colors(3) == {'GREEN'}
+
+            assert controller.clear_emergency(first) == 1
+            assert controller.is_emergency_active
+            assert controller.clear_emergency(str(second)) == 0  # ids are ints; the API converts them
+            assert controller.clear_emergency(second) == 1
+            assert not controller.is_emergency_active
+            assert controller.clear_emergency(second) == 0
+
+            # The API rejects ids that are not integers and reports ones that match no corridor
+            from traffic_system.emergency_handler import clear_emergency
+            for bad, error in (("x", ValueError), (1.5, ValueError), (str(second), LookupError)):
+                try:
+                    clear_emergency(bad)
+                    assert False, f"{bad!r} reported as cleared"
+                except error:
+                    pass
+
+            conn = get_connection()
+            statuses = [row['status'] for row in conn.execute("SELECT status FROM emergency_logs")]
+            conn.close()
+            assert statuses == ['CLEARED', 'CLEARED']
+            controller.close()
+        print("✓ Green corridors run without blocking")
+        return True
+    except Exception as e:
+        print(f"✗ Green corridor test failed: {e}")
+        return False
+
+def test_concurrent_emergencies():
+    """Test snapshot reads and per-emergency handles under overlapping emergencies"""
+    try:
+        import threading
+        with temp_database():
+            from traffic_system.traffic_controller import TrafficController
+            controller = TrafficController()
+            controller.start_scheduler = lambda: None  # keep the normal cycle out of the way
+            controller.corridor_green_time = 0.01
+            controller.emergency_hold_time = 60
+            before = controller.state
+
+            handles = []
+            def trigger(route):
+                handles.append(controller.start_emergency(route, "ambulance"))
+            threads = [threading.Thread(target=trigger, args=([i % 5 + 1, (i + 1) % 5 + 1],)) for i in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(timeout=5)
+
+            state = controller.state
+            assert len(handles) == 8 and len({h.corridor_id for h in handles}) == 8
+            assert state.version == 8 and len(state.emergencies) == 8 and state.emergency_active
+            assert before.emergencies == () and not before.emergency_active  # old snapshots never change
+
+            # Clearing from several threads at once leaves the others running
+            clearers = [threading.Thread(target=controller.clear_emergency, args=(h.corridor_id,))
+                        for h in handles[:4]]
+            for thread in clearers:
+                thread.start()
+            for thread in clearers:
+                thread.join(timeout=5)
+            assert all(h.wait(0) and h.status == 'CLEARED' for h in handles[:4])
+            assert [h.corridor_id for h in controller.state.emergencies] == \
+                [h.corridor_id for h in state.emergencies if h not in handles[:4]]
+            assert controller.is_emergency_active
+
+            # A fire engine preempts the ambulances on its route, and its expiry clears only itself
+            controller.emergency_hold_time = 0.05
+            controller.corridors.retry_interval = 0.01
+            fire = controller.start_emergency([2, 3], "fire")
+            assert fire.priority > handles[0].priority
+            assert fire.wait(timeout=5) and fire.status == 'CLEARED'
+            assert len(controller.state.emergencies) == 4
+
+            # A police car waits at an intersection an ambulance owns until the ambulance clears
+            police = controller.start_emergency([2, 3], "police")
+            assert wait_until(lambda: any(c.waits for c in controller.corridors.active()
+                                          if c.corridor_id == police.corridor_id))
+            assert not police.wait(0.1)
+            for handle in handles[4:]:
+                controller.clear_emergency(handle.corridor_id)
+            assert police.wait(timeout=5)
+            assert not controller.corridors.claimed
+
+            controller.clear_emergency()
+            assert not controller.is_emergency_active and controller.emergency_route is None
+            assert all(not h.active for h in handles)
+            controller.close()
+        print("✓ Concurrent emergencies successful")
+        return True
+    except Exception as e:
+        print(f"✗ Concurrent emergencies test failed: {e}")
+        return False
+
+def test_batched_signal_update():
+    """Test that a cycle greens each intersection's busiest approach and splits the cycle by demand"""
+    try:
+        with temp_database():
+            from traffic_system.db import get_connection
+            from traffic_system.traffic_controller import TrafficController
+            conn = get_connection()
+            conn.executemany("INSERT INTO traffic_data (intersection_id, road_id, vehicle_count) VALUES (?, ?, ?)",
+                             [(1, 3, 12), (1, 1, 4), (2, 7, 25)])
+            conn.commit()
+            conn.close()
+
+            controller = TrafficController()
+            assert controller.update_signal_logic() == 20  # every approach now gets a share
+            assert controller.update_signal_logic() == 0  # nothing changed since
+            assert controller.signals.flush() == 20
+
+            conn = get_connection()
+            rows = conn.execute("SELECT intersection_id, road_id, signal_color, green_time FROM signal_status").fetchall()
+            conn.close()
+            greens = {(r[0], r[1]): r[3] for r in rows if r[2] == 'GREEN'}
+            splits = {(r[0], r[1]): r[3] for r in rows}
+            assert len(greens) == 5
+            # 60 s cycle, 4 s lost per phase, 7 s minimum: 16 spare seconds shared by demand
+            assert greens[(1, 3)] == 19 and splits[(1, 1)] == 11 and splits[(1, 2)] == 7
+            assert greens[(2, 7)] == 23
+            for iid in range(1, 6):
+                assert sum(g for (i, _), g in splits.items() if i == iid) == 60 - 4 * 4
+            controller.close()
+        print("✓ Batched signal update successful")
+        return True
+    except Exception as e:
+        print(f"✗ Batched signal update test failed: {e}")
+        return False
+
+def test_phase_split():
+    """Test the Webster-style cycle split across intersections"""
+    try:
+        from traffic_system.phase_split import split_cycle
+        greens = split_cycle([30, 10, 0, 0, 0, 0, 5, 5, 5], [0, 4, 6, 9], 60)
+        assert list(greens[:4]) == [7 + 12, 7 + 4, 7, 7]  # 44 s effective, 16 s spare
+        assert list(greens[4:6]) == [26, 26]  # no demand: equal shares
+        assert sum(greens[6:9]) == 60 - 3 * 4 and max(greens[6:9]) - min(greens[6:9]) <= 1
+        # A cycle too short for the minimum greens still gives every approach some time
+        assert list(split_cycle([9, 1, 1, 1], [0, 4], 20)) == [1, 1, 1, 1]
+        print("✓ Phase split successful")
+        return True
+    except Exception as e:
+        print(f"✗ Phase split test failed: {e}")
+        return False
+
+def test_dirty_set_updates():
+    """Test that traffic updates recompute only the intersections they touch"""
+    try:
+        with temp_database():
+            from traffic_system.db import get_connection
+            from traffic_system.traffic_controller import TrafficController
+            conn = get_connection()
+            conn.executemany("INSERT INTO traffic_data (intersection_id, road_id, vehicle_count) VALUES (?, ?, ?)",
+                             [(3, 6, 9), (1, 2, 30)])
+            conn.commit()
+            conn.close()
+
+            controller = TrafficController()
+            controller.debounce_time = 0.05
+            calls = []
+            original = controller.update_signal_logic
+            controller.update_signal_logic = lambda ids=None: calls.append(set(ids)) or original(ids)
+            controller.mark_dirty(3)
+            controller.mark_dirty(3)
+
+            def greens():
+                return [(row['intersection_id'], row['road_id']) for row in controller.signals.snapshot()
+                        if row['signal_color'] == 'GREEN']
+
+            assert wait_until(lambda: greens())
+            assert greens() == [(3, 6)]
+            assert calls == [{3}]
+            # Closing cancels a pending recompute, and later marks start none
+            controller.mark_dirty(1)
+            controller.close()
+            controller.mark_dirty(1)
+            time.sleep(0.1)
+            assert calls == [{3}] and controller._flush_timer is None
+        print("✓ Dirty-set signal updates successful")
+        return True
+    except Exception as e:
+        print(f"✗ Dirty-set update test failed: {e}")
+        return False
+
+def test_connection_pool():
+    """Test that pooled connections are reused, tuned and transactional"""
+    try:
+        with temp_database():
+            from traffic_system.db import connection, get_pool
+            with connection() as outer:
+                with connection() as inner:
+                    assert inner is outer  # nested blocks share one transaction
+                assert outer.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+                assert outer.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+            with connection() as again:
+                assert again is outer  # returned to the pool and handed out again
+
+            try:
+                with connection() as conn:
+                    conn.execute("UPDATE signal_status SET signal_color='GREEN'")
+                    raise RuntimeError("boom")
+            except RuntimeError:
+                pass
+            with connection() as conn:
+                assert conn.execute("SELECT COUNT(*) FROM signal_status WHERE signal_color='GREEN'").fetchone()[0] == 0
+            assert get_pool()._opened == 1
+        print("✓ Connection pool successful")
+        return True
+    except Exception as e:
+        print(f"✗ Connection pool test failed: {e}")
+        return False
+
+def test_signal_state_store():
+    """Test that signal reads come from memory and writes are flushed behind"""
+    try:
+        with temp_database():
+            from traffic_system.db import get_connection
+            from traffic_system.signal_state import SignalStateStore
+            store = SignalStateStore(flush_interval=60)
+            assert len(store.snapshot()) == 20
+            assert store.apply([(1, 1, 'GREEN', 30), (1, 2, 'RED', 0)]) == 1
+            assert store.get(1, 1) == ('GREEN', 30)
+
+            def stored(intersection_id, road_id):
+                conn = get_connection()
+                row = conn.execute("SELECT signal_color, green_time FROM signal_status "
+                                   "WHERE intersection_id=? AND road_id=?", (intersection_id, road_id)).fetchone()
+                conn.close()
+                return tuple(row)
+
+            assert stored(1, 1) == ('RED', 0)  # not written until the flush
+            assert store.set_intersection(2, 'GREEN', 20) == 4
+            assert store.flush() == 5
+            assert stored(1, 1) == ('GREEN', 30)
+            assert stored(2, 7) == ('GREEN', 20)
+            assert store.flush() == 0
+        print("✓ Signal state store successful")
+        return True
+    except Exception as e:
+        print(f"✗ Signal state store test failed: {e}")
+        return False
+
+def test_response_cache():
+    """Test ETag revalidation, gzip and invalidation on cached read endpoints"""
+    try:
+        import gzip
+        import http.client
+        import json
+        import threading
+        with temp_database():
+            import server
+            from traffic_system.response_cache import response_cache
+            server.controller.signals.load()
+            response_cache.clear()
+            httpd = server.create_server(0, workers=2, host="127.0.0.1")
+            threading.Thread(target=httpd.serve_forever, daemon=True).start()
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", httpd.server_address[1], timeout=5)
+
+                def get(path, headers=None):
+                    conn.request("GET", path, headers=headers or {})
+                    response = conn.getresponse()
+                    return response, response.read()
+
+                response, body = get("/api/intersections", {"Accept-Encoding": "gzip"})
+                assert response.status == 200
+                assert response.getheader("Content-Encoding") == "gzip"
+                assert len(json.loads(gzip.decompress(body))) == 5
+                etag = response.getheader("ETag")
+
+                response, body = get("/api/intersections", {"If-None-Match": etag})
+                assert response.status == 304 and body == b''
+
+                response_cache.invalidate('topology')
+                response, _ = get("/api/intersections", {"If-None-Match": etag})
+                assert response.status == 304  # rebuilt, but the content is unchanged
+
+                response, body = get("/api/signal/status")
+                signal_etag = response.getheader("ETag")
+                server.controller.signals.apply([(1, 1, 'GREEN', 30)])
+                response, body = get("/api/signal/status", {"If-None-Match": signal_etag})
+                assert response.status == 200
+                assert response.getheader("ETag") != signal_etag
+                server.controller.signals.flush()
+                conn.close()
+            finally:
+                httpd.shutdown()
+                httpd.server_close()
+        print("✓ Response cache successful")
+        return True
+    except Exception as e:
+        print(f"✗ Response cache test failed: {e}")
+        return False
+
+def test_event_stream():
+    """Test that /api/stream pushes signal deltas and resumes from Last-Event-ID"""
+    try:
+        import http.client
+        import json
+        import threading
+        with temp_database():
+            import server
+            from traffic_system.events import event_hub
+            server.controller.signals.load()
+            httpd = server.create_server(0, workers=1, host="127.0.0.1")
+            threading.Thread(target=httpd.serve_forever, daemon=True).start()
+            try:
+                port = httpd.server_address[1]
+
+                def open_stream(headers=None):
+                    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+                    conn.request("GET", "/api/stream", headers=headers or {})
+                    response = conn.getresponse()
+                    assert response.getheader("Content-Type") == "text/event-stream"
+                    assert response.fp.readline() == b"retry: 3000\n"
+                    response.fp.readline()
+                    return conn, response
+
+                def next_event(response):
+                    fields = {}
+                    while True:
+                        line = response.fp.readline().decode().rstrip("\n")
+                        if not line:
+                            return fields
+                        if not line.startswith(":"):
+                            key, _, value = line.partition(": ")
+                            fields[key] = value
+
+                conn, response = open_stream()
+                assert wait_until(lambda: len(httpd.streams) == 1)
+                # The stream no longer holds the only worker, so ordinary requests still get through
+                other = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+                other.request("OPTIONS", "/api/signal/status")
+                assert other.getresponse().status == 200
+                other.close()
+
+                server.controller.signals.apply([(1, 1, 'GREEN', 30)])
+                event = next_event(response)
+                assert event["event"] == "signals"
+                assert json.loads(event["data"]) == [
+                    {"intersection_id": 1, "road_id": 1, "signal_color": "GREEN", "green_time": 30}]
+                conn.close()
+
+                server.controller.signals.apply([(1, 1, 'RED', 0)])
+                server.controller.signals.apply([(2, 5, 'GREEN', 20)])
+                conn, response = open_stream({"Last-Event-ID": event["id"]})
+                missed = [next_event(response), next_event(response)]
+                assert [int(e["id"]) for e in missed] == [int(event["id"]) + 1, int(event["id"]) + 2]
+                assert int(missed[-1]["id"]) == event_hub.last_id
+                conn.close()
+
+                # An id from before a server restart is ahead of the hub: resync, don't wait for it
+                assert event_hub.since(event_hub.last_id + 100) is None
+                conn, response = open_stream({"Last-Event-ID": str(event_hub.last_id + 100)})
+                assert next_event(response)["event"] == "reset"
+                conn.close()
+                server.controller.signals.flush()
+            finally:
+                httpd.shutdown()
+                httpd.server_close()
+        print("✓ Event stream successful")
+        return True
+    except Exception as e:
+        print(f"✗ Event stream test failed: {e}")
+        return False
+
+def test_road_network():
+    """Test the array-backed network against the tables, and reload on topology changes"""
+    try:
+        with temp_database():
+            from traffic_system.db import connection, get_storage
+            from traffic_system.network import road_network
+            from traffic_system.response_cache import response_cache
+            from traffic_system.traffic_controller import TrafficController
+            network = road_network.get()
+            assert road_network.get() is network  # built once, shared
+            with connection() as conn:
+                expected = [dict(row) for row in conn.execute("""
+                    SELECT i.*, GROUP_CONCAT(ir.road_id) as road_ids, GROUP_CONCAT(r.road_name) as road_names,
+                           GROUP_CONCAT(ir.direction) as directions
+                    FROM intersections i
+                    JOIN intersection_roads ir ON i.intersection_id = ir.intersection_id
+                    JOIN roads r ON ir.road_id = r.road_id
+                    GROUP BY i.intersection_id
+                """)]
+                approaches = conn.execute("SELECT COUNT(*) FROM intersection_roads").fetchone()[0]
+            for row in expected:
+                for key in ("road_ids", "road_names", "directions"):
+                    row[key] = row[key].split(",")
+            assert network.intersection_dicts() == expected
+            assert len(network) == 5 and len(network.approach_road) == approaches
+            assert network.offsets[-1] == approaches and len(network.adj_offsets) == len(network) + 1
+            for slot in network.approaches(1):
+                assert network.slot[(1, network.approach_road[slot])] == slot
+            for index in range(len(network)):
+                for neighbour, weight in network.neighbours(index):
+                    assert (index, weight) in list(network.neighbours(neighbour))
+
+            controller = TrafficController()
+            full = {(u[0], u[1]): u for u in controller.plan_signals()}
+            assert controller.plan_signals([2, 4]) == [u for u in full.values() if u[0] in (2, 4)]
+
+            with connection() as conn:
+                conn.execute("INSERT INTO intersections (intersection_id, intersection_name) VALUES (6, 'New')")
+                conn.execute("INSERT INTO intersection_roads (intersection_id, road_id, direction) VALUES (6, 1, 'north')")
+            assert road_network.get() is network  # edited behind its back: still the old one
+            version = response_cache.version('topology')
+            get_storage().topology_changed()
+            reloaded = road_network.get()
+            assert reloaded is not network and len(reloaded) == 6
+            assert reloaded.version == response_cache.version('topology') > version
+            assert [u[0] for u in controller.plan_signals([6])] == [6]
+
+            # Another database bumps the topology too, so cached topology responses rebuild with it
+            from traffic_system.simulator import build_network, using_database
+            build_network("grid.db", 9)
+            with using_database("grid.db"):
+                assert len(road_network.get()) == 9 and road_network.get().version > reloaded.version
+            assert len(road_network.get()) == 6
+        print("✓ Road network successful")
+        return True
+    except Exception as e:
+        print(f"✗ Road network test failed: {e}")
+        return False
+
+def test_route_planner():
+    """Test predefined routes, A* fallback and topology invalidation"""
+    try:
+        with temp_database():
+            from traffic_system.db import get_connection
+            from traffic_system.network import road_network
+            from traffic_system.routing import RoutePlanner
+            planner = RoutePlanner()
+            assert planner.route(4, 5) == [4, 1, 5]  # predefined
+            path = planner.route(3, 5)
+            assert path == [3, 2, 5]  # A* over the road graph
+            assert planner.route(3, 5) == path  # served from the path cache
+            assert planner.route(1, 99) is None
+
+            # A new road directly joining 3 and 5 shows up after a topology invalidation
+            conn = get_connection()
+            conn.execute("INSERT INTO roads (road_name) VALUES ('Bypass')")
+            conn.executemany("INSERT INTO intersection_roads (intersection_id, road_id, direction) "
+                             "VALUES (?, 9, ?)", [(3, 'north'), (5, 'south')])
+            conn.commit()
+            conn.close()
+            assert planner.route(3, 5) == path
+            road_network.reload()
+            assert planner.route(3, 5) == [3, 5]
+        print("✓ Route planner successful")
+        return True
+    except Exception as e:
+        print(f"✗ Route planner test failed: {e}")
+        return False
+
+def test_bulk_ingestion():
+    """Test bulk parsing, group commits and backpressure in the ingestion queue"""
+    try:
+        with temp_database():
+            from traffic_system.db import get_connection
+            from traffic_system.ingest import IngestionQueue, parse_readings
+            ndjson = b'{"intersection_id": 1, "road_id": 2, "vehicle_count": 7}\n' \
+                     b'{"intersection_id": 3, "road_id": 5, "vehicle_count": 11, "timestamp": "2026-01-01 08:00:00"}\n'
+            csv = b"intersection_id,road_id,vehicle_count\n4,2,9\n5,8,3\n"
+            assert parse_readings(ndjson, "application/x-ndjson") == [
+                (1, 2, 7, None), (3, 5, 11, "2026-01-01 08:00:00")]
+            assert parse_readings(csv, "text/csv") == [(4, 2, 9, None), (5, 8, 3, None)]
+            try:
+                parse_readings(b'{"road_id": 1}', "application/x-ndjson")
+                assert False, "malformed reading accepted"
+            except ValueError:
+                pass
+
+            touched = []
+            queue = IngestionQueue(capacity=3, commit_interval=0.01, on_commit=touched.append)
+            assert queue.offer(parse_readings(ndjson, "application/x-ndjson"))
+            assert not queue.offer(parse_readings(csv, "text/csv"))  # would exceed capacity
+            assert queue.flush()
+            assert queue.offer(parse_readings(csv, "text/csv"))
+            assert queue.flush()
+
+            stats = queue.stats()
+            assert stats["ingested"] == 4 and stats["rejected"] == 2
+            assert set().union(*touched) == {1, 3, 4, 5}
+            conn = get_connection()
+            rows = conn.execute("SELECT intersection_id, vehicle_count, timestamp FROM traffic_data "
+                                "ORDER BY id").fetchall()
+            conn.close()
+            assert [(r[0], r[1]) for r in rows] == [(1, 7), (3, 11), (4, 9), (5, 3)]
+            assert rows[1][2] == "2026-01-01 08:00:00" and rows[0][2] is not None
+
+            # Timestamps are stored in one UTC form, so traffic_latest's text comparison picks the newest
+            assert parse_readings(b"1,1,5,2026-01-01T09:30:00+01:00\n", "text/csv") == [
+                (1, 1, 5, "2026-01-01 08:30:00")]
+            import http.client
+            import threading
+            import server
+            from traffic_system.ingest import ingest_queue
+            httpd = server.create_server(0, workers=2, host="127.0.0.1")
+            threading.Thread(target=httpd.serve_forever, daemon=True).start()
+            try:
+                def post(body, path="/api/traffic/bulk"):
+                    conn = http.client.HTTPConnection("127.0.0.1", httpd.server_address[1], timeout=5)
+                    conn.request("POST", path, body, {"Content-Type": "application/x-ndjson"})
+                    response = conn.getresponse()
+                    response.read()
+                    conn.close()
+                    return response.status
+                reading = '{"intersection_id": 2, "road_id": 4, "vehicle_count": %d, "timestamp": "%s"}'
+                assert post((reading % (3, "garbage")).encode()) == 400
+                assert post((reading % (3, "2026-01-01T08:00:00Z")).encode()) == 202
+                assert post((reading % (40, "2026-01-01 08:05:00")).encode()) == 202
+                assert ingest_queue.flush()
+                # The single-reading endpoint validates the same way
+                assert post((reading % (5, "garbage")).encode(), "/api/traffic/update") == 400
+                assert post(b'{"road_id": 4}', "/api/traffic/update") == 400
+                assert post((reading % (50, "2026-01-01T09:10:00+01:00")).encode(), "/api/traffic/update") == 200
+                # Bad emergency requests are the client's fault, not the server's
+                assert post(b"not json", "/api/emergency/trigger") == 400
+                assert post(b'{"start_intersection": 1}', "/api/emergency/trigger") == 400
+                assert post(b'{"start_intersection": "x", "end_intersection": 2}', "/api/emergency/trigger") == 400
+                assert post(b'{"start_intersection": 998, "end_intersection": 999}', "/api/emergency/trigger") == 400
+            finally:
+                httpd.shutdown()
+                httpd.server_close()
+            conn = get_connection()
+            latest = conn.execute("SELECT vehicle_count, timestamp FROM traffic_latest "
+                                  "WHERE intersection_id = 2 AND road_id = 4").fetchone()
+            conn.close()
+            assert tuple(latest) == (50, "2026-01-01 08:10:00")
+        print("✓ Bulk ingestion successful")
+        return True
+    except Exception as e:
+        print(f"✗ Bulk ingestion test failed: {e}")
+        return False
+
+def test_density_classification():
+    """Test the windowed EWMA, the thresholds and density stored at ingest"""
+    try:
+        from traffic_system.density import DensityClassifier
+        classifier = DensityClassifier(window=4, alpha=0.5, thresholds=(5, 15))
+        counts = [2, 40, 40, 3, 0, 0, 0, 0]
+        for n, count in enumerate(counts, 1):
+            level, rate = classifier.classify(1, 1, count)
+            window = counts[max(0, n - 4):n][::-1]  # newest first
+            weights = [0.5 * 0.5 ** k for k in range(len(window))]
+            expected = sum(w * c for w, c in zip(weights, window)) / sum(weights)
+            assert abs(rate - expected) < 0.01, (n, rate, expected)
+            assert level == ('LOW' if expected <= 5 else 'MEDIUM' if expected <= 15 else 'HIGH')
+        assert rate == 0.0  # the burst has left the window entirely
+        assert classifier.classify(1, 2, 9) == ('MEDIUM', 9.0)  # approaches are independent
+        assert classifier.classify(1, 2, None) == (None, None)
+        assert len(classifier._ring) == 2 * classifier.window  # one window of doubles per approach
+
+        with temp_database():
+            from traffic_system.db import connection
+            from traffic_system.ingest import IngestionQueue
+            queue = IngestionQueue(classifier=DensityClassifier(window=4, alpha=0.5))
+            queue.offer([(1, 1, 30, None), (1, 1, 30, None), (1, 3, 2, None)])
+            assert queue.flush()
+            with connection() as conn:
+                stored = [tuple(row) for row in conn.execute(
+                    "SELECT road_id, density_level, rate FROM traffic_data WHERE density_level IS NOT NULL ORDER BY id")]
+                latest = dict(((row[0], row[1]), (row[2], row[3])) for row in conn.execute(
+                    "SELECT intersection_id, road_id, density_level, rate FROM traffic_latest"))
+            assert stored == [(1, 'HIGH', 30.0), (1, 'HIGH', 30.0), (3, 'LOW', 2.0)]
+            assert latest[(1, 1)] == ('HIGH', 30.0) and latest[(1, 3)] == ('LOW', 2.0)
+
+            from traffic_system.traffic_controller import TrafficController
+            data = {(r['intersection_id'], r['road_id']): r for r in TrafficController().get_traffic_data()}
+            assert data[(1, 1)]['density_level'] == 'HIGH' and data[(1, 1)]['rate'] == 30.0
+        print("✓ Density classification successful")
+        return True
+    except Exception as e:
+        print(f"✗ Density classification test failed: {e}")
+        return False
+
+def test_demand_forecast():
+    """Test trend and profile forecasts, incremental refresh, the backtest and the blended plan"""
+    try:
+        from traffic_system.forecast import DemandForecaster, backtest, parse_timestamp
+        # Rising 2 vehicles a minute: with alpha = beta = 1 the trend is exact
+        forecaster = DemandForecaster(alpha=1, beta=1)
+        series = [(1, 1, 10 + 2 * k, f"2026-01-01 08:{k:02d}:00") for k in range(10)]
+        for iid, road, count, stamp in series:
+            forecaster.observe(iid, road, count, parse_timestamp(stamp), profile=False)
+        assert abs(forecaster.predict(1, 1, 60) - 30) < 1e-9
+        assert forecaster.predict(1, 2, 60) is None
+        assert len(forecaster._profile_sum) == len(forecaster._profile_n) == len(forecaster) * forecaster.bins
+
+        # The profile adds the usual step from 07:45-08:00 to 08:00-08:15
+        forecaster = DemandForecaster(alpha=1, beta=0)
+        for day in (1, 2):
+            forecaster.observe(2, 1, 4, parse_timestamp(f"2026-01-0{day} 07:50:00"))
+            forecaster.observe(2, 1, 20, parse_timestamp(f"2026-01-0{day} 08:05:00"))
+        forecaster.observe(2, 1, 6, parse_timestamp("2026-01-03 07:59:00"))
+        profile_before = (4 + 4 + 6) / 3
+        assert abs(forecaster.predict(2, 1, 120) - (6 + 20 - profile_before)) < 1e-9
+
+        result = backtest(series, horizon=60, forecaster=DemandForecaster(alpha=1, beta=1))
+        assert result["scored"] == 9 and result["naive_mae"] == 2.0 and result["mae"] < 0.5
+        assert result["fit_us_per_reading"] is not None
+
+        with temp_database():
+            from traffic_system.db import connection
+            from traffic_system.traffic_controller import TrafficController
+            insert = ("INSERT INTO traffic_data (intersection_id, road_id, vehicle_count, timestamp) "
+                      "VALUES (?, ?, ?, ?)")
+            with connection() as conn:
+                conn.executemany(insert, [(1, 1, 0, "2026-01-01 08:00:00"), (1, 3, 12, "2026-01-01 08:01:00")])
+            forecaster = DemandForecaster(alpha=1, beta=1)
+            assert forecaster.refresh() == 2
+            with connection() as conn:
+                conn.execute(insert, (1, 1, 10, "2026-01-01 08:01:00"))
+            assert forecaster.refresh() == 1  # only the new row is read
+            assert forecaster.refresh() == 0
+            assert abs(forecaster.predict(1, 1, 30) - 15) < 1e-9
+
+            controller = TrafficController()
+            assert dict(((r[0], r[1]), r[2]) for r in controller.plan_signals([1]))[(1, 3)] == 'GREEN'
+            controller.forecaster, controller.forecast_weight = forecaster, 1.0
+            # Road 1 is climbing past road 3's 12 by mid-cycle, so it gets the green
+            plan = dict(((r[0], r[1]), r[2]) for r in controller.plan_signals([1]))
+            assert plan[(1, 1)] == 'GREEN' and plan[(1, 3)] == 'RED'
+        print("✓ Demand forecast successful")
+        return True
+    except Exception as e:
+        print(f"✗ Demand forecast test failed: {e}")
+        return False
+
+def test_latest_readings():
+    """Test that traffic_latest tracks the newest reading per approach"""
+    try:
+        with temp_database():
+            from traffic_system.db import connection
+            from traffic_system.traffic_controller import TrafficController
+            with connection() as conn:
+                conn.executemany("INSERT INTO traffic_data (intersection_id, road_id, vehicle_count, timestamp) "
+                                 "VALUES (?, ?, ?, ?)", [
+                                     (1, 1, 30, "2026-01-01 08:00:00"),
+                                     (1, 1, 4, "2026-01-01 08:05:00"),
+                                     (1, 1, 50, "2026-01-01 07:00:00"),  # late replay of an old reading
+                                     (1, 3, 12, "2026-01-01 08:05:00"),
+                                 ])
+                latest = dict(((r[0], r[1]), r[2]) for r in conn.execute(
+                    "SELECT intersection_id, road_id, vehicle_count FROM traffic_latest"))
+            assert latest == {(1, 1): 4, (1, 3): 12}
+
+            controller = TrafficController()
+            data = controller.get_traffic_data()
+            assert len(data) == len({(r['intersection_id'], r['road_id']) for r in data})
+            controller.update_signal_logic([1])
+            assert controller.signals.get(1, 3)[0] == 'GREEN'
+            assert controller.signals.get(1, 1)[0] == 'RED'
+            controller.close()
+        print("✓ Latest readings successful")
+        return True
+    except Exception as e:
+        print(f"✗ Latest readings test failed: {e}")
+        return False
+
+def test_retention_rollups():
+    """Test rollups, batched raw expiry and the history query"""
+    try:
+        with temp_database():
+            from traffic_system.db import connection
+            from traffic_system.retention import RetentionManager, get_traffic_history
+            with connection() as conn:
+                conn.executemany("INSERT INTO traffic_data (intersection_id, road_id, vehicle_count, timestamp) "
+                                 "VALUES (?, ?, ?, ?)", [
+                                     (1, 1, 10, "2026-01-01 08:00:05"),
+                                     (1, 1, 20, "2026-01-01 08:00:40"),
+                                     (1, 1, 6, "2026-01-01 08:30:00"),
+                                     (2, 5, 3, "2026-01-01 08:00:10"),
+                                     (1, 1, 8, "2026-01-02 09:59:00"),
+                                 ])
+            manager = RetentionManager(raw_retention_hours=24, minute_retention_days=2,
+                                       hour_retention_days=30, batch_size=2)
+            result = manager.run_once(now="2026-01-02 10:00:00")
+            assert result["rolled_up"] == 5 and result["raw_deleted"] == 4, result
+            assert result["rollups_deleted"] == 0
+
+            minute = get_traffic_history('minute', intersection_id=1, end="2026-01-02 00:00:00")
+            assert [(b["bucket"], b["samples"], b["mean_count"], b["max_count"]) for b in minute] == [
+                ("2026-01-01 08:00:00", 2, 15.0, 20), ("2026-01-01 08:30:00", 1, 6.0, 6)]
+            hour = get_traffic_history('hour', start="2026-01-01 08:00:00", end="2026-01-01 09:00:00")
+            assert [(b["intersection_id"], b["samples"], b["max_count"]) for b in hour] == [(1, 3, 20), (2, 1, 3)]
+
+            # A second pass has nothing new; a day later the first minute buckets expire too
+            assert manager.run_once(now="2026-01-02 10:00:00")["rolled_up"] == 0
+            result = manager.run_once(now="2026-01-03 10:00:00")
+            assert result["raw_deleted"] == 1 and result["rollups_deleted"] == 3, result
+            assert len(get_traffic_history('hour')) == 3
+            try:
+                get_traffic_history('week')
+                assert False, "unknown resolution accepted"
+            except ValueError:
+                pass
+        print("✓ Retention rollups successful")
+        return True
+    except Exception as e:
+        print(f"✗ Retention rollups test failed: {e}")
+        return False
+
+def test_simulator_replay():
+    """Test that simulation runs are seeded and replays reproduce their decisions"""
+    try:
+        from traffic_system.simulator import build_network, simulate, replay
+        with tempfile.TemporaryDirectory() as workdir:
+            digests = []
+            for name in ("a.db", "b.db"):
+                path = os.path.join(workdir, name)
+                build_network(path, 9)
+                result = simulate(path, cycles=4, seed=3)
+                assert result["cycles"] == 4 and result["readings"] == 4 * 4 * 36
+                assert result["vehicles_served"] <= result["vehicles_arrived"]
+                digests.append(result["decision_digest"])
+            assert digests[0] == digests[1]
+
+            replayed = replay(os.path.join(workdir, "a.db"), os.path.join(workdir, "replay.db"))
+            assert replayed["cycles"] == 4 and replayed["decision_digest"] == digests[0]
+        print("✓ Simulator replay successful")
+        return True
+    except Exception as e:
+        print(f"✗ Simulator replay test failed: {e}")
+        return False
+
+def test_green_wave_offsets():
+    """Test arterial offsets, direction, incremental updates and the platoon simulation"""
+    try:
+        import array
+        from traffic_system.coordination import CoordinationEngine
+        from traffic_system.network import haversine, road_network
+        from traffic_system.simulator import build_network, green_wave, using_database
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, "grid.db")
+            build_network(path, 9)  # 3x3 grid: roads 1-6 run along rows, 7-12 along columns
+            with using_database(path):
+                network = road_network.get()
+            engine = CoordinationEngine(speed=10.0, hysteresis=0.2, smoothing=1.0)
+            demand = array.array('i', [1] * len(network.approach_road))
+            for iid in (1, 2, 3):
+                demand[network.slot[(iid, 2)]] = 20  # row 0 westbound is the busiest road
+            assert engine.update(network, demand, 60) > 0
+            assert engine.waves()[0] == {"road_id": 2, "intersections": [3, 2, 1]}
+            hop = round(haversine(network.coords(0), network.coords(1)) / 10.0)
+            assert [engine.offsets[iid] for iid in (3, 2, 1)] == [(0, 2), (hop % 60, 2), (2 * hop % 60, 2)]
+            assert len(engine.offsets) == 9
+
+            # Unchanged or slightly noisier demand keeps every offset without solving anything
+            before = engine.offsets
+            assert engine.update(network, demand, 60) == 0
+            demand[network.slot[(1, 2)]] = 22
+            assert engine.update(network, demand, 60) == 0 and engine.offsets == before
+            # Row 2 eastbound overtakes row 1, but they never cross: the ranking changes, no offset does
+            for iid in (7, 8, 9):
+                demand[network.slot[(iid, 5)]] = 10
+            assert engine.update(network, demand, 60) == 0 and engine.waves()[1]["road_id"] == 5
+            assert engine.offsets == before
+
+            # Column 2 northbound takes over, and the rows it crosses are re-timed around it
+            for iid in (3, 6, 9):
+                demand[network.slot[(iid, 11)]] = 80
+            assert engine.update(network, demand, 60) > 0
+            assert engine.waves()[0]["road_id"] == 11 and engine.offsets[3][1] == 11
+            # Row 0 still runs west from intersection 3, which the column also starts at 0
+            assert engine.offsets[1] == before[1] and engine.offsets[2] == before[2]
+
+            build_network(os.path.join(workdir, "wave.db"), 16)
+            result = green_wave(os.path.join(workdir, "wave.db"), cycles=20, seed=2)
+            assert result["stops_per_vehicle_coordinated"] < result["stops_per_vehicle_uncoordinated"]
+            assert "throughput_gain_pct" in result
+        print("✓ Green wave offsets successful")
+        return True
+    except Exception as e:
+        print(f"✗ Green wave offsets test failed: {e}")
+        return False
+
+def test_sharded_controller():
+    """Test that zone workers plan every intersection and respect corridor holds"""
+    try:
+        with temp_database():
+            from traffic_system.db import get_connection
+            from traffic_system.sharding import partition
+            from traffic_system.traffic_controller import TrafficController
+            zones = partition(2)
+            assert sorted(sum(zones, [])) == [1, 2, 3, 4, 5] and len(zones) == 2
+
+            conn = get_connection()
+            conn.executemany("INSERT INTO traffic_data (intersection_id, road_id, vehicle_count) VALUES (?, ?, ?)",
+                             [(1, 3, 12), (2, 7, 25), (4, 6, 9)])
+            conn.commit()
+            conn.close()
+
+            controller = TrafficController()
+            controller.shard_count = 2
+            controller.debounce_time = 0.05
+            controller.start_scheduler()
+            try:
+                pool = controller.shards
+                assert wait_until(lambda: all(s["plans"] for s in pool.stats), timeout=30)
+                assert wait_until(lambda: controller.coordination.offsets)  # refreshed by the coordinator
+                assert controller.signals.get(1, 3)[0] == 'GREEN'
+                assert controller.signals.get(2, 7)[0] == 'GREEN'
+
+                # Corridor intersections are held while the other zone keeps planning
+                pool.hold([1, 5])
+                controller.signals.set_intersection(1, 'GREEN', 20)
+                conn = get_connection()
+                conn.executemany("INSERT INTO traffic_data (intersection_id, road_id, vehicle_count) VALUES (?, ?, ?)",
+                                 [(1, 1, 50), (4, 2, 40)])
+                conn.commit()
+                conn.close()
+                controller.mark_dirty_many([1, 4])
+                assert wait_until(lambda: controller.signals.get(4, 2)[0] == 'GREEN')
+                assert controller.signals.colors(1) == {'GREEN'}
+
+                pool.release([1, 5])
+                assert wait_until(lambda: controller.signals.colors(1) == {'GREEN', 'RED'})
+                assert controller.signals.get(1, 1)[0] == 'GREEN'
+
+                # A corridor claims while a plan waits to be applied, before its hold reaches the pool
+                import time
+                from traffic_system.scheduler import intersection_locks
+                controller.signals.set_intersection(2, 'GREEN', 20)
+                plans = pool.stats[pool.owner[2]]["plans"]
+                with intersection_locks.hold([2]):
+                    pool._results.put((pool.owner[2], [(2, 7, 'RED', 0)], 0.0))
+                    assert wait_until(lambda: pool.stats[pool.owner[2]]["plans"] > plans)
+                    time.sleep(0.1)
+                    assert controller.signals.get(2, 7)[0] == 'GREEN'  # waits for the locks
+                    controller.corridors.claimed = frozenset({2})
+                time.sleep(0.2)
+                assert controller.signals.get(2, 7)[0] == 'GREEN'
+                controller.corridors.claimed = frozenset()
+            finally:
+                controller.close()
+            assert controller.shards is None
+        print("✓ Sharded controller successful")
+        return True
+    except Exception as e:
+        print(f"✗ Sharded controller test failed: {e}")
+        return False
+
+def test_cycle_scheduler():
+    """Test deadline cadence, overrun skips, pause/resume and independent zones"""
+    try:
+        import threading
+        import time
+        from traffic_system.scheduler import CycleScheduler, IntersectionLocks
+
+        runs = {"fast": [], "slow": []}
+        def task(intersection_ids, cycle_time):
+            runs["slow" if intersection_ids == [9] else "fast"].append(time.monotonic())
+            if intersection_ids == [9]:
+                time.sleep(0.25)  # overruns its 0.1 s cycle
+
+        scheduler = CycleScheduler(task, workers=2)
+        scheduler.add_zone("fast", [1, 2], 0.05)
+        scheduler.add_zone("slow", [9], 0.1)
+        scheduler.start()
+        try:
+            assert wait_until(lambda: len(runs["fast"]) >= 10)
+            # Deadlines stay on the grid: 10 runs take ~9 cycles despite the slow zone
+            assert runs["fast"][9] - runs["fast"][0] < 0.05 * 9 + 0.1
+            stats = {zone["zone"]: zone for zone in scheduler.stats()}
+            assert stats["slow"]["skipped"] >= 1 and stats["fast"]["skipped"] == 0
+
+            scheduler.pause("fast")
+            time.sleep(0.06)
+            paused_at = len(runs["fast"])
+            time.sleep(0.2)
+            assert len(runs["fast"]) == paused_at and scheduler.running
+            scheduler.resume("fast")
+            assert wait_until(lambda: len(runs["fast"]) > paused_at)
+        finally:
+            scheduler.stop()
+        assert not scheduler.running
+
+        # Overlapping lock sets acquired from two threads do not deadlock
+        locks = IntersectionLocks(stripes=4)
+        def churn(ids):
+            for _ in range(200):
+                with locks.hold(ids):
+                    pass
+        threads = [threading.Thread(target=churn, args=(ids,)) for ids in ([1, 2, 3], [3, 2, 1], None)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+        assert not any(thread.is_alive() for thread in threads)
+
+        with temp_database():
+            from traffic_system.traffic_controller import TrafficController
+            from traffic_system.scheduler import intersection_locks
+            controller = TrafficController()
+
+            # A plan is computed without the intersection locks; only applying it takes them
+            def probe():
+                with intersection_locks.hold([1, 2]):
+                    pass
+            def plan_unlocked(*args):
+                prober = threading.Thread(target=probe)
+                prober.start()
+                prober.join(timeout=1)
+                assert not prober.is_alive(), "plan_signals ran under the intersection locks"
+                return TrafficController.plan_signals(controller, *args)
+            controller.plan_signals = plan_unlocked
+            assert controller.update_signal_logic([1, 2]) > 0
+            del controller.plan_signals
+            assert not controller.coordination.offsets  # partial plans leave the offsets alone
+
+            controller.cycle_time = 0.05
+            controller.configure_zones({"downtown": {"intersections": [1, 2], "cycle_time": 0.1}})
+            # A zero period would divide by zero in the dispatcher; it is refused and nothing changes
+            for bad in (0, -5, "60", None):
+                try:
+                    controller.configure_zones({"downtown": {"intersections": [1, 2], "cycle_time": bad}})
+                    assert False, f"cycle_time {bad!r} accepted"
+                except ValueError:
+                    pass
+            try:
+                controller.scheduler.set_cycle_time("downtown", 0)
+                assert False, "set_cycle_time accepted 0"
+            except ValueError:
+                pass
+            zones = controller.scheduler.zones()
+            assert zones["downtown"].intersection_ids == [1, 2]
+            assert zones["city"].intersection_ids == [3, 4, 5]
+            controller.start_scheduler()
+            try:
+                assert wait_until(lambda: all(z["runs"] for z in controller.scheduler.stats()))
+                # No zone covers the whole city, so the offsets are refreshed after the zone plans
+                assert wait_until(lambda: controller.coordination.offsets)
+                # Emergencies no longer pause the cycle; it skips the corridor's intersections instead
+                controller.create_green_corridor([1, 2], "ambulance")
+                assert controller.scheduler.running
+                assert not any(z.paused for z in controller.scheduler.zones().values())
+                controller.clear_emergency()
+            finally:
+                controller.close()
+        print("✓ Cycle scheduler successful")
+        return True
+    except Exception as e:
+        print(f"✗ Cycle scheduler test failed: {e}")
+        return False
+
+def test_schema_migrations():
+    """Test versioned migrations of a pre-versioning database, lazy imports and the warm-up"""
+    try:
+        import sqlite3
+        import subprocess
+        import sys
+        from traffic_system.migrations import LATEST_VERSION, migrate, schema_version
+        with tempfile.TemporaryDirectory() as workdir:
+            # A database from before traffic_latest, the rollups and rates existed
+            legacy = os.path.join(workdir, "legacy.db")
+            conn = sqlite3.connect(legacy)
+            conn.executescript("""
+                CREATE TABLE traffic_data (id INTEGER PRIMARY KEY AUTOINCREMENT, intersection_id INTEGER,
+                    road_id INTEGER, vehicle_count INTEGER, density_level TEXT,
+                    timestamp TEXT DEFAULT CURRENT_TIMESTAMP);
+                CREATE TABLE emergency_logs (id INTEGER PRIMARY KEY AUTOINCREMENT, route_id INTEGER,
+                    emergency_type TEXT, status TEXT DEFAULT 'ACTIVE',
+                    created_at TEXT DEFAULT CURRENT_TIMESTAMP, cleared_at TEXT);
+                INSERT INTO traffic_data (intersection_id, road_id, vehicle_count, timestamp) VALUES
+                    (1, 1, 30, '2026-01-01 08:00:00'), (1, 1, 4, '2026-01-01 08:05:00'),
+                    (1, 1, 50, '2026-01-01 07:00:00'), (1, 3, 12, '2026-01-01 08:05:00');
+            """)
+            conn.close()
+            assert migrate(legacy) == list(range(1, LATEST_VERSION + 1))
+            assert schema_version(legacy) == LATEST_VERSION and migrate(legacy) == []
+            conn = sqlite3.connect(legacy)
+            latest = dict(((r[0], r[1]), r[2]) for r in conn.execute(
+                "SELECT intersection_id, road_id, vehicle_count FROM traffic_latest"))
+            assert latest == {(1, 1): 4, (1, 3): 12}  # backfilled from history
+            conn.execute("INSERT INTO traffic_data (intersection_id, road_id, vehicle_count, rate, timestamp) "
+                         "VALUES (1, 3, 7, 6.5, '2026-01-01 09:00:00')")
+            assert conn.execute("SELECT vehicle_count, rate FROM traffic_latest WHERE road_id = 3").fetchone() == (7, 6.5)
+            assert conn.execute("SELECT last_id FROM traffic_rollup_state").fetchone() == (0,)
+            conn.close()
+
+            fresh = os.path.join(workdir, "fresh.db")
+            assert migrate(fresh) == list(range(1, LATEST_VERSION + 1))
+            conn = sqlite3.connect(fresh)
+            assert conn.execute("SELECT COUNT(*) FROM intersections").fetchone()[0] == 5
+            conn.close()
+
+        # Importing the package loads none of its submodules until they are used
+        probe = ("import sys, traffic_system; loaded = [m for m in sys.modules if m.startswith('traffic_system.')]; "
+                 "assert not loaded, loaded; assert callable(traffic_system.update_signal_logic)")
+        subprocess.run([sys.executable, "-c", probe], check=True, capture_output=True,
+                       cwd=os.path.dirname(os.path.abspath(__file__)))
+
+        with temp_database():
+            import server
+            from traffic_system.response_cache import response_cache
+            server.controller.signals.load()  # still bound to an earlier test's database
+            timings = server.warm_up()
+            assert set(timings) == {"migrate", "network", "signals", "cycle", "responses"}
+            misses = response_cache.misses
+            for key, (version, builder) in server.CACHED_RESPONSES.items():
+                response_cache.get(key, version(), builder)
+            assert response_cache.misses == misses  # the first requests are served warm
+            server.controller.signals.close()  # stop its writer before the database goes
+        print("✓ Schema migrations successful")
+        return True
+    except Exception as e:
+        print(f"✗ Schema migrations test failed: {e}")
+        return False
+
+def test_storage_backends():
+    """Test the repositories on SQLite (and on PostgreSQL when TEST_POSTGRES_URL names a scratch database)"""
+    try:
+        import asyncio
+        from traffic_system.db import PostgresDialect, Row, SQLiteStorage, get_storage
+
+        def exercise(storage):
+            storage.migrate()
+            ids = storage.intersections.ids()
+            assert ids[:5] == [1, 2, 3, 4, 5] and storage.roads.names()[1] == 'Main Street North'
+            first = storage.traffic_data.add(1, 1, 9, 'MEDIUM', 9.0, "2030-01-01 00:00:00")
+            assert storage.traffic_data.add_many([(1, 2, 4, 'LOW', 4.0, "2030-01-01 00:00:00"),
+                                                  (2, 5, 20, 'HIGH', 20.0, None)]) == 2
+            assert [row[0] for row in storage.traffic_data.since(first - 1, 10)][:3] == [first, first + 1, first + 2]
+            assert storage.traffic_data.watermark() >= first + 2
+            assert [row[0] for row in storage.traffic_data.since(first - 1, 10, first + 1)] == [first, first + 1]
+            latest = storage.latest.readings({1, 2})
+            assert latest[(1, 1)] == (9, 'MEDIUM', 9.0) and latest[(2, 5)][0] == 20
+            assert {(iid, road) for iid, road, _ in storage.latest.counts([2])} >= {(2, 5)}
+
+            routed = storage.emergency_logs.open('ambulance', 1, 2)  # a predefined route
+            dynamic = storage.emergency_logs.open('fire')
+            active = storage.emergency_logs.active()
+            assert active["id"] == dynamic and active["route_id"] is None
+            storage.emergency_logs.clear([dynamic])
+            assert storage.emergency_logs.active()["id"] == routed
+            storage.emergency_logs.clear([routed])
+
+            storage.signal_status.update_many([('GREEN', 33, "2030-01-01 00:00:00", 1, 1)])
+            signal = next(row for row in storage.signal_status.load() if (row['intersection_id'], row['road_id']) == (1, 1))
+            assert signal['signal_color'] == 'GREEN' and signal['updated_epoch'] == 1893456000.0
+            assert storage.emergency_routes.paths()[(4, 5)] == [4, 1, 5]
+
+            async def read_async():
+                return await storage.run_async(storage.latest.readings, [1])
+            assert asyncio.run(read_async())[(1, 1)][0] == 9
+
+        with temp_database():
+            storage = get_storage()
+            assert isinstance(storage, SQLiteStorage) and storage.migrate() == []
+            exercise(storage)
+
+        # The server dialect's placeholders skip string literals and escape %
+        dialect = PostgresDialect()
+        assert dialect.sql("SELECT '?%' || ? FROM t WHERE a LIKE 'x%' AND b = ?") == \
+            "SELECT '?%%' || %s FROM t WHERE a LIKE 'x%%' AND b = %s"
+        assert dialect.in_ids("intersection_id", {3, 1}) == ("intersection_id = ANY(?)", [1, 3])
+        class Recorder:
+            def __init__(self):
+                self.statements = []
+            def execute(self, sql, params=()):
+                self.statements.append(sql)
+        recorder = Recorder()
+        dialect.settle_writes(recorder, "traffic_data")  # waits out inserts still in flight
+        assert recorder.statements == ["LOCK TABLE traffic_data IN SHARE MODE"]
+        row = Row({"a": 0, "b": 1}, (1, 2))
+        assert row["b"] == 2 and row[0] == 1 and dict(row) == {"a": 1, "b": 2} and tuple(row) == (1, 2)
+
+        url = os.environ.get("TEST_POSTGRES_URL")
+        if url:
+            try:
+                exercise(get_storage(url))
+            finally:
+                get_storage(url).close()
+        print("✓ Storage backends successful" + ("" if url else " (PostgreSQL skipped: TEST_POSTGRES_URL unset)"))
+        return True
+    except Exception as e:
+        print(f"✗ Storage backends test failed: {e}")
+        return False
+
+def test_metrics():
+    """Test Prometheus rendering, disabled timers and the sampling profiler"""
+    try:
+        from traffic_system import metrics
+        registry = metrics.Registry()
+        requests = registry.histogram("test_request_seconds", "Request time", ("route",), buckets=(0.1, 1.0))
+        rows = registry.counter("test_rows_total", "Rows")
+        registry.gauge("test_depth", "Depth", lambda: 3)
+        with metrics.timed(requests, "a"):
+            pass
+        requests.labels("a").observe(0.5)
+        rows.inc(2)
+
+        metrics.set_enabled(False)
+        try:
+            with metrics.timed(requests, "b"):
+                pass
+            rows.inc(5)
+        finally:
+            metrics.set_enabled(True)
+
+        text = registry.render()
+        assert '# TYPE test_request_seconds histogram' in text
+        assert 'test_request_seconds_bucket{route="a",le="0.1"} 1' in text
+        assert 'test_request_seconds_bucket{route="a",le="1"} 2' in text
+        assert 'test_request_seconds_bucket{route="a",le="+Inf"} 2' in text
+        assert 'test_request_seconds_count{route="a"} 2' in text
+        assert 'route="b"' not in text
+        assert 'test_rows_total 2\n' in text and 'test_depth 3\n' in text
+
+        # A keep-alive connection's next request starts without the previous one's status
+        import io
+        import server
+        handler = server.TrafficRequestHandler.__new__(server.TrafficRequestHandler)
+        handler.rfile, handler.response_status = io.BytesIO(b''), 404
+        handler.handle_one_request()
+        assert handler.response_status == 0 and handler.close_connection
+
+        profiler = metrics.SamplingProfiler()
+        profiler.start(interval=0.001)
+        assert wait_until(lambda: profiler.samples >= 5)
+        profiler.stop()
+        assert not profiler.running and profiler.folded()
+        print("✓ Metrics successful")
+        return True
+    except Exception as e:
+        print(f"✗ Metrics test failed: {e}")
+        return False
+
 def main():
     """Run all tests"""
     print("Running Traffic Management System Tests...")
@@ -68,7 +1295,31 @@ def main():
         test_imports,
         test_traffic_controller,
         test_emergency_handler,
-        test_app_routes
+        test_app_routes,
+        test_threaded_server,
+        test_green_corridor_non_blocking,
+        test_concurrent_emergencies,
+        test_batched_signal_update,
+        test_phase_split,
+        test_dirty_set_updates,
+        test_connection_pool,
+        test_signal_state_store,
+        test_response_cache,
+        test_event_stream,
+        test_road_network,
+        test_route_planner,
+        test_bulk_ingestion,
+        test_latest_readings,
+        test_density_classification,
+        test_demand_forecast,
+        test_retention_rollups,
+        test_simulator_replay,
+        test_green_wave_offsets,
+        test_sharded_controller,
+        test_cycle_scheduler,
+        test_schema_migrations,
+        test_storage_backends,
+        test_metrics
     ]
 
     passed = 0
@@ -28,12 +28,75 @@ CREATE TABLE traffic_data (
     intersection_id INTEGER,
     road_id INTEGER,
     vehicle_count INTEGER,
-    density_level TEXT,
+    density_level TEXT, -- 'LOW' / 'MEDIUM' / 'HIGH', classified at ingest
+    rate REAL, -- smoothed vehicle count of the approach (windowed EWMA) at this reading
     timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (intersection_id) REFERENCES intersections(intersection_id),
     FOREIGN KEY (road_id) REFERENCES roads(road_id)
 );
 
+-- Composite index for per-approach history lookups and time-range scans
+CREATE INDEX idx_traffic_data_approach_time ON traffic_data (intersection_id, road_id, timestamp);
+
+-- Latest reading per (intersection, road), kept current by a trigger on traffic_data
+-- so the controller never has to scan the history
+CREATE TABLE traffic_latest (
+    intersection_id INTEGER NOT NULL,
+    road_id INTEGER NOT NULL,
+    reading_id INTEGER,
+    vehicle_count INTEGER,
+    density_level TEXT,
+    rate REAL,
+    timestamp TEXT,
+    PRIMARY KEY (intersection_id, road_id)
+) WITHOUT ROWID;
+
+CREATE TRIGGER traffic_data_latest AFTER INSERT ON traffic_data
+BEGIN
+    INSERT INTO traffic_latest (intersection_id, road_id, reading_id, vehicle_count, density_level, rate, timestamp)
+    VALUES (NEW.intersection_id, NEW.road_id, NEW.id, NEW.vehicle_count, NEW.density_level, NEW.rate, NEW.timestamp)
+    ON CONFLICT (intersection_id, road_id) DO UPDATE SET
+        reading_id = excluded.reading_id,
+        vehicle_count = excluded.vehicle_count,
+        density_level = excluded.density_level,
+        rate = excluded.rate,
+        timestamp = excluded.timestamp
+    WHERE excluded.timestamp >= traffic_latest.timestamp;  -- late (replayed) readings don't win
+END;
+
+-- Per-minute and per-hour rollups of traffic_data; raw rows expire once rolled up
+CREATE TABLE traffic_rollup_minute (
+    bucket TEXT NOT NULL, -- 'YYYY-MM-DD HH:MM:00' (UTC)
+    intersection_id INTEGER NOT NULL,
+    road_id INTEGER NOT NULL,
+    samples INTEGER NOT NULL,
+    total_count INTEGER NOT NULL,
+    max_count INTEGER,
+    PRIMARY KEY (intersection_id, road_id, bucket)
+) WITHOUT ROWID;
+
+CREATE INDEX idx_traffic_rollup_minute_bucket ON traffic_rollup_minute (bucket);
+
+CREATE TABLE traffic_rollup_hour (
+    bucket TEXT NOT NULL, -- 'YYYY-MM-DD HH:00:00' (UTC)
+    intersection_id INTEGER NOT NULL,
+    road_id INTEGER NOT NULL,
+    samples INTEGER NOT NULL,
+    total_count INTEGER NOT NULL,
+    max_count INTEGER,
+    PRIMARY KEY (intersection_id, road_id, bucket)
+) WITHOUT ROWID;
+
+CREATE INDEX idx_traffic_rollup_hour_bucket ON traffic_rollup_hour (bucket);
+
+-- Highest traffic_data.id already folded into the rollups
+CREATE TABLE traffic_rollup_state (
+    name TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT INTO traffic_rollup_state (name, last_id) VALUES ('traffic_data', 0);
+
 -- Signal Status Table (one per intersection-road combination)
 CREATE TABLE signal_status (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -69,6 +132,8 @@ CREATE TABLE emergency_logs (
     FOREIGN KEY (route_id) REFERENCES emergency_routes(route_id)
 );
 
+CREATE INDEX idx_emergency_logs_status ON emergency_logs (status, created_at);
+
 -- Insert sample data
 -- Roads
 INSERT INTO roads (road_name) VALUES
@@ -0,0 +1,181 @@
+-- PostgreSQL version of traffic_sys.sql (selected with TRAFFIC_DB_URL=postgresql://...).
+-- Keep the two in step. Timestamps are 'YYYY-MM-DD HH:MM:SS' UTC text, as in SQLite.
+
+-- Roads Table
+CREATE TABLE roads (
+    road_id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    road_name TEXT NOT NULL
+);
+
+-- Intersections Table (representing traffic lights at intersections)
+CREATE TABLE intersections (
+    intersection_id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    intersection_name TEXT NOT NULL,
+    latitude DOUBLE PRECISION,
+    longitude DOUBLE PRECISION
+);
+
+-- Intersection-Road relationships (which roads meet at each intersection)
+CREATE TABLE intersection_roads (
+    id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    intersection_id INTEGER REFERENCES intersections(intersection_id),
+    road_id INTEGER REFERENCES roads(road_id),
+    direction TEXT -- 'north', 'south', 'east', 'west'
+);
+
+-- Traffic Data Table
+CREATE TABLE traffic_data (
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    intersection_id INTEGER REFERENCES intersections(intersection_id),
+    road_id INTEGER REFERENCES roads(road_id),
+    vehicle_count INTEGER,
+    density_level TEXT, -- 'LOW' / 'MEDIUM' / 'HIGH', classified at ingest
+    rate DOUBLE PRECISION, -- smoothed vehicle count of the approach (windowed EWMA) at this reading
+    timestamp TEXT DEFAULT to_char(now() AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI:SS')
+);
+
+-- Composite index for per-approach history lookups and time-range scans
+CREATE INDEX idx_traffic_data_approach_time ON traffic_data (intersection_id, road_id, timestamp);
+
+-- Latest reading per (intersection, road), kept current by a trigger on traffic_data
+-- so the controller never has to scan the history
+CREATE TABLE traffic_latest (
+    intersection_id INTEGER NOT NULL,
+    road_id INTEGER NOT NULL,
+    reading_id BIGINT,
+    vehicle_count INTEGER,
+    density_level TEXT,
+    rate DOUBLE PRECISION,
+    timestamp TEXT,
+    PRIMARY KEY (intersection_id, road_id)
+);
+
+CREATE FUNCTION traffic_data_latest() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO traffic_latest (intersection_id, road_id, reading_id, vehicle_count, density_level, rate, timestamp)
+    VALUES (NEW.intersection_id, NEW.road_id, NEW.id, NEW.vehicle_count, NEW.density_level, NEW.rate, NEW.timestamp)
+    ON CONFLICT (intersection_id, road_id) DO UPDATE SET
+        reading_id = excluded.reading_id,
+        vehicle_count = excluded.vehicle_count,
+        density_level = excluded.density_level,
+        rate = excluded.rate,
+        timestamp = excluded.timestamp
+    WHERE excluded.timestamp >= traffic_latest.timestamp;  -- late (replayed) readings don't win
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER traffic_data_latest AFTER INSERT ON traffic_data
+    FOR EACH ROW WHEN (NEW.intersection_id IS NOT NULL AND NEW.road_id IS NOT NULL)
+    EXECUTE FUNCTION traffic_data_latest();
+
+-- Per-minute and per-hour rollups of traffic_data; raw rows expire once rolled up
+CREATE TABLE traffic_rollup_minute (
+    bucket TEXT NOT NULL, -- 'YYYY-MM-DD HH:MM:00' (UTC)
+    intersection_id INTEGER NOT NULL,
+    road_id INTEGER NOT NULL,
+    samples INTEGER NOT NULL,
+    total_count BIGINT NOT NULL,
+    max_count INTEGER,
+    PRIMARY KEY (intersection_id, road_id, bucket)
+);
+
+CREATE INDEX idx_traffic_rollup_minute_bucket ON traffic_rollup_minute (bucket);
+
+CREATE TABLE traffic_rollup_hour (
+    bucket TEXT NOT NULL, -- 'YYYY-MM-DD HH:00:00' (UTC)
+    intersection_id INTEGER NOT NULL,
+    road_id INTEGER NOT NULL,
+    samples INTEGER NOT NULL,
+    total_count BIGINT NOT NULL,
+    max_count INTEGER,
+    PRIMARY KEY (intersection_id, road_id, bucket)
+);
+
+CREATE INDEX idx_traffic_rollup_hour_bucket ON traffic_rollup_hour (bucket);
+
+-- Highest traffic_data.id already folded into the rollups
+CREATE TABLE traffic_rollup_state (
+    name TEXT PRIMARY KEY,
+    last_id BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO traffic_rollup_state (name, last_id) VALUES ('traffic_data', 0);
+
+-- Signal Status Table (one per intersection-road combination)
+CREATE TABLE signal_status (
+    id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    intersection_id INTEGER REFERENCES intersections(intersection_id),
+    road_id INTEGER REFERENCES roads(road_id),
+    signal_color TEXT DEFAULT 'RED',
+    green_time INTEGER DEFAULT 0,
+    updated_at TEXT DEFAULT to_char(now() AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI:SS'),
+    UNIQUE (intersection_id, road_id)
+);
+
+-- Emergency Routes (predefined paths for emergency vehicles)
+CREATE TABLE emergency_routes (
+    route_id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    route_name TEXT NOT NULL,
+    start_intersection_id INTEGER REFERENCES intersections(intersection_id),
+    end_intersection_id INTEGER REFERENCES intersections(intersection_id),
+    path_order TEXT -- JSON Array of intersection_ids in order
+);
+
+-- Emergency Logs
+CREATE TABLE emergency_logs (
+    id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    route_id INTEGER REFERENCES emergency_routes(route_id),
+    emergency_type TEXT,
+    status TEXT DEFAULT 'ACTIVE',
+    created_at TEXT DEFAULT to_char(now() AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI:SS'),
+    cleared_at TEXT
+);
+
+CREATE INDEX idx_emergency_logs_status ON emergency_logs (status, created_at);
+
+-- Insert sample data
+-- Roads
+INSERT INTO roads (road_name) VALUES
+('Main Street North'), ('Main Street South'), ('Elm Avenue East'), ('Elm Avenue West'),
+('Oak Street North'), ('Oak Street South'), ('Pine Avenue East'), ('Pine Avenue West');
+
+-- Intersections (4-way intersections)
+INSERT INTO intersections (intersection_name, latitude, longitude) VALUES
+('Downtown Center', 40.7128, -74.0060),
+('North District', 40.7589, -73.9851),
+('East District', 40.7505, -73.9934),
+('South District', 40.7282, -74.0776),
+('West District', 40.7831, -73.9712);
+
+-- Intersection-Road relationships
+-- Downtown Center (intersection 1)
+INSERT INTO intersection_roads (intersection_id, road_id, direction) VALUES
+(1, 1, 'north'), (1, 2, 'south'), (1, 3, 'east'), (1, 4, 'west');
+
+-- North District (intersection 2)
+INSERT INTO intersection_roads (intersection_id, road_id, direction) VALUES
+(2, 1, 'south'), (2, 5, 'north'), (2, 7, 'east'), (2, 8, 'west');
+
+-- East District (intersection 3)
+INSERT INTO intersection_roads (intersection_id, road_id, direction) VALUES
+(3, 5, 'south'), (3, 6, 'north'), (3, 3, 'west'), (3, 7, 'east');
+
+-- South District (intersection 4)
+INSERT INTO intersection_roads (intersection_id, road_id, direction) VALUES
+(4, 2, 'north'), (4, 6, 'south'), (4, 3, 'east'), (4, 4, 'west');
+
+-- West District (intersection 5)
+INSERT INTO intersection_roads (intersection_id, road_id, direction) VALUES
+(5, 1, 'east'), (5, 2, 'west'), (5, 7, 'south'), (5, 8, 'north');
+
+-- Initialize signal status for all intersection-road combinations
+INSERT INTO signal_status (intersection_id, road_id, signal_color, green_time)
+SELECT ir.intersection_id, ir.road_id, 'RED', 0
+FROM intersection_roads ir;
+
+-- Sample emergency routes
+INSERT INTO emergency_routes (route_name, start_intersection_id, end_intersection_id, path_order) VALUES
+('Hospital Route 1', 1, 2, '[1, 2]'),
+('Fire Station Route', 1, 3, '[1, 3]'),
+('Police Route', 4, 5, '[4, 1, 5]');
@@ -1,10 +1,41 @@
-from .db import get_connection
-from .traffic_controller import update_signal_logic
-from .emergency_handler import handle_emergency, clear_emergency
-
-__all__ = [
-    "get_connection",
-    "update_signal_logic",
-    "handle_emergency",
-    "clear_emergency",
-]
+import importlib
+import os
+
+def _load_env():
+    """Apply a .env file, if there is one, before any submodule reads its settings.
+
+    python-dotenv is only imported when a .env file exists (in the working
+    directory or next to the package), so deployments configured through the
+    real environment don't pay for it at startup.
+    """
+    candidates = (os.path.abspath(".env"),
+                  os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env"))
+    for path in candidates:
+        if os.path.isfile(path):
+            from dotenv import load_dotenv
+            load_dotenv(path)
+
+_load_env()
+
+# Submodules are imported on first use (PEP 562), so `import traffic_system`
+# no longer builds the controller singleton or opens anything
+_EXPORTS = {
+    "get_connection": ".db",
+    "connection": ".db",
+    "update_signal_logic": ".traffic_controller",
+    "handle_emergency": ".emergency_handler",
+    "clear_emergency": ".emergency_handler",
+}
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
+
+__all__ = list(_EXPORTS)
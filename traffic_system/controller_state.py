@@ -0,0 +1,123 @@
+import collections
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+class EmergencyHandle:
+    """One active emergency: its corridor, its log row and whether it has been cleared.
+
+    Handles are created and cleared only by the controller's command thread;
+    anyone may read them or wait() for the emergency to end.
+    """
+
+    def __init__(self, corridor_id, route_path, emergency_type, log_id, priority=0):
+        self.corridor_id = corridor_id
+        self.route_path = tuple(route_path)
+        self.emergency_type = emergency_type
+        self.priority = priority
+        self.log_id = log_id
+        self.status = 'ACTIVE'  # ACTIVE -> CLEARED
+        self.started_at = time.time()
+        self.cleared_at = None
+        self._cleared = threading.Event()
+
+    @property
+    def active(self):
+        return self.status == 'ACTIVE'
+
+    def wait(self, timeout=None):
+        """Block until the emergency is cleared (or timeout); returns whether it was."""
+        return self._cleared.wait(timeout)
+
+    def _clear(self):
+        self.status = 'CLEARED'
+        self.cleared_at = time.time()
+        self._cleared.set()
+
+    def to_dict(self):
+        return {
+            "corridor_id": self.corridor_id,
+            "route_path": list(self.route_path),
+            "emergency_type": self.emergency_type,
+            "priority": self.priority,
+            "log_id": self.log_id,
+            "status": self.status,
+            "started_at": self.started_at,
+            "cleared_at": self.cleared_at,
+        }
+
+class ControllerState(collections.namedtuple("ControllerState", ("version", "emergencies"))):
+    """Immutable snapshot of the controller's emergency state.
+
+    The command thread builds a new snapshot for every change and swaps the
+    controller's reference to it in one assignment, so readers on any thread
+    take `controller.state` once and see a consistent view without locking.
+    emergencies holds the active EmergencyHandles in the order they started.
+    """
+    __slots__ = ()
+
+    @property
+    def emergency_active(self):
+        return bool(self.emergencies)
+
+    @property
+    def emergency_route(self):
+        """Route of the most recently started emergency, or None."""
+        return list(self.emergencies[-1].route_path) if self.emergencies else None
+
+    def emergency(self, corridor_id):
+        for handle in self.emergencies:
+            if handle.corridor_id == corridor_id:
+                return handle
+        return None
+
+    def replace(self, emergencies):
+        """The next snapshot, holding the given emergencies."""
+        return ControllerState(self.version + 1, tuple(emergencies))
+
+INITIAL_STATE = ControllerState(0, ())
+
+class CommandQueue:
+    """Single writer thread that applies state changes one at a time, in order.
+
+    submit() queues fn(*args) and returns a Future; call() also waits for
+    it. A command submitted from the writer thread itself (e.g. a command
+    that clears an emergency from inside another command) runs inline
+    rather than deadlocking on its own queue.
+    """
+
+    def __init__(self, name="controller-commands"):
+        self.name = name
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        future = Future()
+        if threading.current_thread() is self._thread:
+            self._execute(future, fn, args)
+            return future
+        self._queue.put((future, fn, args))
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+        return future
+
+    def call(self, fn, *args, timeout=None):
+        return self.submit(fn, *args).result(timeout)
+
+    def _run(self):
+        while True:
+            future, fn, args = self._queue.get()
+            self._execute(future, fn, args)
+
+    @staticmethod
+    def _execute(future, fn, args):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
@@ -0,0 +1,200 @@
+import array
+import math
+import os
+import threading
+from operator import itemgetter, mul
+from .network import haversine
+
+# Progression speed (m/s) platoons are assumed to travel at between intersections
+SPEED = float(os.environ.get("GREEN_WAVE_SPEED", 13.9))
+# How far demand must shift (as a fraction) before a wave changes direction or priority
+HYSTERESIS = float(os.environ.get("GREEN_WAVE_HYSTERESIS", 0.2))
+SMOOTHING = float(os.environ.get("GREEN_WAVE_SMOOTHING", 0.2))
+
+# Unit (north, east) vector of each approach direction label
+HEADINGS = {'north': (1.0, 0.0), 'south': (-1.0, 0.0), 'east': (0.0, 1.0), 'west': (0.0, -1.0)}
+
+class Arterial:
+    """A road through two or more intersections, in order along the road.
+
+    slots[k] is the road's approach at chain[k] and travel[k] the seconds
+    from chain[k] to chain[k + 1] at the progression speed. signs[k] says
+    how much that approach's direction label points along the chain (+1
+    forwards, -1 backwards, 0 across or unlabelled), so demand on it votes
+    for the wave's direction.
+    """
+    __slots__ = ("road_id", "chain", "ids", "slots", "travel", "signs", "counts")
+
+    def __init__(self, network, road_id, chain, speed):
+        self.road_id = road_id
+        self.chain = chain
+        self.ids = tuple(network.intersections[i].intersection_id for i in chain)
+        self.slots = tuple(network.slot[(network.intersections[i].intersection_id, road_id)] for i in chain)
+        self.travel = tuple(haversine(network.coords(a), network.coords(b)) / speed
+                            for a, b in zip(chain, chain[1:]))
+        first, last = network.coords(chain[0]), network.coords(chain[-1])
+        north = last[0] - first[0]
+        east = (last[1] - first[1]) * math.cos(math.radians((first[0] + last[0]) / 2))
+        length = math.hypot(north, east) or 1.0
+        signs = []
+        for slot in self.slots:
+            heading_north, heading_east = HEADINGS.get(network.approach_direction[slot], (0.0, 0.0))
+            signs.append((heading_north * north + heading_east * east) / length)
+        self.signs = tuple(signs)
+        getter = itemgetter(*self.slots)
+        self.counts = getter if len(self.slots) > 1 else (lambda demand: (getter(demand),))
+
+    def weigh(self, demand):
+        """(total demand, net demand pointing forwards) on this road."""
+        counts = self.counts(demand)
+        return sum(counts), sum(map(mul, counts, self.signs))
+
+class CoordinationEngine:
+    """Signal offsets that line up green waves along the busiest arterials.
+
+    Every road through two or more intersections is an arterial. On each
+    update the arterials are weighed by the demand on their approaches
+    (smoothed over updates) and ranked, heaviest first; each one's wave
+    runs in the direction most of its demand is heading. In rank order,
+    each arterial fixes the offset of every intersection it crosses that no
+    heavier arterial has fixed: walking the chain in the wave direction, an
+    intersection's offset is the previous one's plus the travel time
+    between them (modulo the cycle), so a platoon released at the start of
+    one green arrives at the start of the next. The offset is when that
+    arterial's approach turns green, relative to a common cycle start.
+
+    Updates are incremental: an arterial only overtakes another, or turns
+    its wave around, once demand has shifted by more than `hysteresis`, so
+    noise does not reshuffle the plan. An arterial is only solved again when
+    its direction changed or an intersection on it is now timed differently
+    by the arterials ranked above it; every other arterial keeps its
+    offsets, so signals are not pushed through needless transitions.
+    offsets is replaced wholesale on every change, so readers can take it
+    without locking.
+
+    The offsets are advisory: the controller's plans set one colour and
+    green time per approach per cycle, with no phase start to shift, so
+    they are published (GET /api/signal/offsets) for signal controllers
+    that run their own phase timing, and used by the simulator.
+    """
+
+    def __init__(self, speed=SPEED, hysteresis=HYSTERESIS, smoothing=SMOOTHING):
+        self.speed = speed
+        self.hysteresis = hysteresis
+        self.smoothing = smoothing  # weight of the newest demand in each arterial's running weight
+        self.network = None
+        self.cycle_time = None
+        self.arterials = []
+        self.offsets = {}  # intersection_id -> (offset seconds, coordinated road_id)
+        self.solved = 0  # arterials solved since the network was loaded
+        self._order = []  # [(arterial index, direction)] by rank, as last solved
+        self._fixed = {}  # arterial index -> intersection ids it fixed
+        self._owners = {}  # intersection_id -> arterial index that fixed it
+        self._directions = {}  # arterial index -> direction last chosen
+        self._weights = array.array('d')  # smoothed demand per arterial
+        self._nets = array.array('d')  # smoothed demand heading forwards per arterial
+        self._lock = threading.Lock()
+
+    def update(self, network, demand, cycle_time):
+        """Recompute offsets for demand in network slot order; returns arterials solved."""
+        with self._lock:
+            return self._update(network, demand, max(1, int(cycle_time)))  # offsets are whole seconds
+
+    def _update(self, network, demand, cycle_time):
+        if network is not self.network or cycle_time != self.cycle_time:
+            self.network, self.cycle_time = network, cycle_time
+            self.arterials = [Arterial(network, road_id, chain, self.speed)
+                              for road_id, chain in sorted(network.chains.items())]
+            self.offsets, self._order, self._fixed, self._owners, self._directions = {}, [], {}, {}, {}
+            self._weights, self._nets = array.array('d'), array.array('d')
+            self.solved = 0
+
+        # Smoothed across updates: a coordinated approach's queue shrinks once its
+        # wave works, and raw counts would hand the wave to another road
+        keep, fresh = 1.0 - self.smoothing, len(self._weights) != len(self.arterials)
+        if fresh:
+            self._weights = array.array('d', bytes(8 * len(self.arterials)))
+            self._nets = array.array('d', bytes(8 * len(self.arterials)))
+        weights, nets = self._weights, self._nets
+        directions = {}
+        for a, arterial in enumerate(self.arterials):
+            weight, net = arterial.weigh(demand)
+            if fresh:
+                weights[a], nets[a] = weight, net
+            else:
+                weights[a] = keep * weights[a] + self.smoothing * weight
+                nets[a] = net = keep * nets[a] + self.smoothing * net
+            direction = self._directions.get(a, 1)
+            if abs(net) > self.hysteresis * weights[a] and (net > 0) != (direction > 0):
+                direction = 1 if net > 0 else -1
+            directions[a] = direction
+        self._directions = directions
+
+        # Start from the last ranking (or road order) and move an arterial up past
+        # another only when it outweighs it by more than the hysteresis margin
+        ranked = [a for a, _ in self._order] or list(range(len(self.arterials)))
+        margin = 1.0 + self.hysteresis
+        for i in range(1, len(ranked)):
+            a, j = ranked[i], i
+            while j and weights[a] > weights[ranked[j - 1]] * margin:
+                ranked[j] = ranked[j - 1]
+                j -= 1
+            ranked[j] = a
+        order = [(a, directions[a]) for a in ranked]
+
+        if order == self._order:
+            return 0
+        # Solve in rank order, reusing an arterial's last offsets wherever it
+        # would find its chain exactly as it did last time
+        previous, directions_before = self.offsets, dict(self._order)
+        offsets, owners, fixed_by, solved = {}, {}, {}, 0
+        for a, direction in order:
+            arterial = self.arterials[a]
+            if directions_before.get(a) == direction and all(
+                    iid not in offsets if self._owners.get(iid) == a else offsets.get(iid) == previous.get(iid)
+                    for iid in arterial.ids):
+                fixed = self._fixed[a]
+                for iid in fixed:
+                    offsets[iid] = previous[iid]
+            else:
+                fixed = self._solve(offsets, arterial, direction)
+                solved += 1
+            fixed_by[a] = fixed
+            owners.update(dict.fromkeys(fixed, a))
+        self.offsets, self._order, self._fixed, self._owners = offsets, order, fixed_by, owners
+        self.solved += solved
+        return solved
+
+    def _solve(self, offsets, arterial, direction):
+        """Fix the offsets along one arterial that are still free; returns the ids fixed."""
+        ids, travel = arterial.ids, arterial.travel
+        if direction < 0:
+            ids, travel = ids[::-1], travel[::-1]
+        # Anchored on the first intersection a heavier arterial has already timed, if any
+        offset = 0.0
+        for k, iid in enumerate(ids):
+            if iid in offsets:
+                offset = offsets[iid][0] - sum(travel[:k])
+                break
+        fixed = []
+        for k, iid in enumerate(ids):
+            if k:
+                offset += travel[k - 1]
+            taken = offsets.get(iid)
+            if taken is not None:
+                offset = taken[0]  # and continues from each one's timing
+            else:
+                offsets[iid] = (int(round(offset)) % self.cycle_time, arterial.road_id)
+                fixed.append(iid)
+        return fixed
+
+    def waves(self):
+        """The arterials in rank order, each with its intersections in wave order."""
+        result = []
+        for a, direction in self._order:
+            arterial = self.arterials[a]
+            result.append({
+                "road_id": arterial.road_id,
+                "intersections": list(arterial.ids if direction > 0 else arterial.ids[::-1]),
+            })
+        return result
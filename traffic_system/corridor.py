@@ -0,0 +1,258 @@
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from .metrics import CORRIDOR_PHASE_SECONDS, timed
+from .scheduler import intersection_locks
+
+# Higher wins an intersection two corridors both need; unknown types rank below all of these
+PRIORITIES = json.loads(os.environ.get("EMERGENCY_PRIORITIES") or '{"fire": 3, "ambulance": 2, "police": 1}')
+
+class Corridor:
+    """One emergency vehicle's walk along a route, advanced by CorridorEngine."""
+
+    def __init__(self, corridor_id, route_path, emergency_type, log_id, green_time, hold_time, priority=0):
+        self.corridor_id = corridor_id
+        self.route_path = list(route_path)
+        self.emergency_type = emergency_type
+        self.log_id = log_id
+        self.green_time = green_time
+        self.hold_time = hold_time
+        self.priority = priority
+        self.step = 0  # index of the intersection the vehicle is crossing
+        self.state = 'PENDING'  # PENDING -> RUNNING -> HOLDING -> DONE / CANCELLED
+        self.claims = set()  # intersections this corridor still needs
+        self.waits = 0  # phases delayed because a higher-priority corridor owned the intersection
+
+    def to_dict(self):
+        return {
+            "corridor_id": self.corridor_id,
+            "route_path": self.route_path,
+            "emergency_type": self.emergency_type,
+            "priority": self.priority,
+            "log_id": self.log_id,
+            "step": self.step,
+            "state": self.state,
+            "waits": self.waits,
+        }
+
+class CorridorEngine:
+    """Timer-driven green corridors.
+
+    Every pending phase transition sits in one heap ordered by due time and a
+    single worker thread applies them as they fall due, so starting a corridor
+    returns immediately and any number of corridors can run side by side.
+    Each transition is applied to the signal store on its own and persisted by
+    the store's write-behind flush.
+
+    A corridor claims only the intersections on its route, and releases each
+    one as soon as its vehicle has passed. When corridors need the same
+    intersection the highest priority (then the earliest) owns it: it
+    preempts a lower-priority corridor holding it green, and a corridor
+    reaching an intersection it does not own waits there until it does.
+    on_claim(ids) / on_release(ids) are called as intersections enter and
+    leave emergency control, so normal scheduling can skip and resume them;
+    `claimed` is a lock-free frozenset of the intersections currently held.
+    """
+
+    def __init__(self, signals, on_finish=None, clock=time.monotonic, on_claim=None, on_release=None,
+                 priorities=PRIORITIES):
+        self.signals = signals
+        self.on_finish = on_finish
+        self.on_claim = on_claim
+        self.on_release = on_release
+        self.clock = clock
+        self.priorities = priorities
+        self.retry_interval = 1.0  # seconds between checks while waiting for an intersection
+        self.claimed = frozenset()
+        self._claims = {}  # intersection_id -> {corridor_id: Corridor}
+        self._heap = []  # (due, seq, corridor_id)
+        self._seq = itertools.count()
+        self._ids = itertools.count(1)
+        self._corridors = {}
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def next_id(self):
+        """Reserve a corridor id, for callers that must publish it before the corridor starts."""
+        return next(self._ids)
+
+    def priority(self, emergency_type):
+        return self.priorities.get(emergency_type, 0)
+
+    def start(self, route_path, emergency_type, log_id=None, green_time=20, hold_time=120, corridor_id=None):
+        """Schedule a corridor along route_path and return its id without blocking."""
+        with self._cond:
+            if corridor_id is None:
+                corridor_id = next(self._ids)
+            corridor = Corridor(corridor_id, route_path, emergency_type, log_id, green_time, hold_time,
+                                self.priority(emergency_type))
+            self._corridors[corridor.corridor_id] = corridor
+            self._push(self.clock(), corridor.corridor_id)
+            self._ensure_thread()
+            return corridor.corridor_id
+
+    def cancel(self, corridor_id):
+        """Stop a corridor; its remaining transitions are dropped. Returns the Corridor or None."""
+        with self._cond:
+            corridor = self._corridors.pop(corridor_id, None)
+            if corridor is None:
+                return None
+            corridor.state = 'CANCELLED'
+            self._cond.notify()
+        self._release(corridor, list(corridor.claims))
+        return corridor
+
+    def cancel_all(self):
+        with self._cond:
+            ids = list(self._corridors)
+        return [c for c in (self.cancel(cid) for cid in ids) if c is not None]
+
+    def active(self):
+        """Snapshot of corridors that have not finished or been cancelled."""
+        with self._cond:
+            return list(self._corridors.values())
+
+    def owner(self, intersection_id):
+        """Id of the corridor controlling an intersection, or None."""
+        with self._cond:
+            owner = self._owner(intersection_id)
+            return owner.corridor_id if owner else None
+
+    def _owner(self, intersection_id):
+        claimants = self._claims.get(intersection_id)
+        if not claimants:
+            return None
+        return max(claimants.values(), key=lambda c: (c.priority, -c.corridor_id))
+
+    def _push(self, due, corridor_id):
+        heapq.heappush(self._heap, (due, next(self._seq), corridor_id))
+        self._cond.notify()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="corridor-engine", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    due, _, corridor_id = self._heap[0]
+                    delay = due - self.clock()
+                    if delay > 0:
+                        self._cond.wait(delay)
+                        continue
+                    heapq.heappop(self._heap)
+                    corridor = self._corridors.get(corridor_id)
+                    if corridor is not None:
+                        break
+            try:
+                with timed(CORRIDOR_PHASE_SECONDS):
+                    self._advance(corridor, due)
+            except Exception as e:
+                print(f"Corridor {corridor.corridor_id} failed: {e}")
+                self.cancel(corridor.corridor_id)
+
+    def _claim(self, corridor):
+        """Register the corridor on every intersection of its route; returns the ones it owns."""
+        with self._cond:
+            if corridor.corridor_id not in self._corridors:
+                return []  # cancelled before its first phase
+            newly = []
+            for intersection_id in dict.fromkeys(corridor.route_path):
+                claimants = self._claims.setdefault(intersection_id, {})
+                if not claimants:
+                    newly.append(intersection_id)
+                claimants[corridor.corridor_id] = corridor
+                corridor.claims.add(intersection_id)
+            if newly:
+                self.claimed = frozenset(self._claims)
+            owned = [iid for iid in corridor.claims if self._owner(iid) is corridor]
+        if newly and self.on_claim:
+            self.on_claim(newly)
+        return owned
+
+    def _release(self, corridor, intersection_ids):
+        """Drop the corridor's claim on intersections, handing each to the next claimant or back to normal."""
+        freed, handover = [], []
+        with self._cond:
+            for intersection_id in intersection_ids:
+                corridor.claims.discard(intersection_id)
+                claimants = self._claims.get(intersection_id)
+                if not claimants or claimants.pop(corridor.corridor_id, None) is None:
+                    continue
+                if not claimants:
+                    del self._claims[intersection_id]
+                    freed.append(intersection_id)
+                    continue
+                owner = self._owner(intersection_id)
+                # The next owner's vehicle may be waiting right there
+                at = owner.state in ('RUNNING', 'HOLDING') and owner.route_path[owner.step] == intersection_id
+                handover.append((intersection_id, owner.green_time if at else None))
+            if freed:
+                self.claimed = frozenset(self._claims)
+        if handover:
+            with intersection_locks.hold([iid for iid, _ in handover]):
+                for intersection_id, green_time in handover:
+                    if green_time is None:
+                        self.signals.set_intersection(intersection_id, 'RED', 0)
+                    else:
+                        self.signals.set_intersection(intersection_id, 'GREEN', green_time)
+        if freed and self.on_release:
+            self.on_release(freed)
+
+    def _advance(self, corridor, due):
+        """Apply the corridor's next phase and schedule the one after it."""
+        if corridor.state == 'HOLDING':
+            with self._cond:
+                if self._corridors.pop(corridor.corridor_id, None) is None:
+                    return  # cancelled while we were waking up
+                corridor.state = 'DONE'
+            self._release(corridor, list(corridor.claims))
+            if self.on_finish:
+                self.on_finish(corridor)
+            return
+
+        route, step = corridor.route_path, corridor.step
+        if corridor.state == 'PENDING':
+            owned = self._claim(corridor)
+            # Stop cross traffic along the part of the route this corridor controls
+            with intersection_locks.hold(owned):
+                for intersection_id in owned:
+                    self.signals.set_intersection(intersection_id, 'RED', 0)
+            corridor.state = 'RUNNING'
+
+        target = route[step]
+        # Held across the ownership check so a cancel or handover cannot slip in before the green
+        with intersection_locks.hold([target]):
+            with self._cond:
+                if corridor.corridor_id not in self._corridors:
+                    return
+                if self._owner(target) is not corridor:
+                    # A higher-priority corridor has this intersection; the vehicle waits where it is
+                    corridor.waits += 1
+                    self._push(self.clock() + self.retry_interval, corridor.corridor_id)
+                    return
+
+            # All directions at the vehicle's current intersection go GREEN
+            self.signals.set_intersection(target, 'GREEN', corridor.green_time)
+        if step > 0 and route[step - 1] != target:
+            # The vehicle has passed the previous intersection: hand it back straight away
+            self._release(corridor, [route[step - 1]])
+
+        with self._cond:
+            if corridor.corridor_id not in self._corridors:
+                return
+            if step < len(route) - 1:
+                corridor.step += 1
+                self._push(due + corridor.green_time, corridor.corridor_id)
+            else:
+                # Last intersection stays GREEN until the hold expires or someone clears it
+                corridor.state = 'HOLDING'
+                self._push(due + corridor.hold_time, corridor.corridor_id)
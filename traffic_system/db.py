@@ -1,55 +1,397 @@
 import sqlite3
 import json
 import os
-from dotenv import load_dotenv
+import threading
+import contextlib
+from .metrics import DB_POOL_WAIT_SECONDS, DB_TRANSACTION_SECONDS, timed
+from .response_cache import response_cache
+from .repositories import (ApproachRepository, EmergencyLogRepository, EmergencyRouteRepository,
+                           IntersectionRepository, LatestReadingRepository, RoadRepository, RollupRepository,
+                           SignalStatusRepository, TrafficDataRepository)
 
-# Load environment variables from .env file
-load_dotenv()
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 16))
+BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", 5000))
+STATEMENT_CACHE_SIZE = 256
+# Memory-mapped I/O and page cache per SQLite connection (single-node tuning)
+SQLITE_MMAP_BYTES = int(os.environ.get("SQLITE_MMAP_BYTES", 256 * 1024 * 1024))
+SQLITE_CACHE_KB = int(os.environ.get("SQLITE_CACHE_KB", 16384))
 
-def get_connection():
-    """Return a new SQLite connection."""
-    conn = sqlite3.connect('traffic.db')
+SERVER_SCHEMES = ("postgres://", "postgresql://")
+SERVER_SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                  "traffic_sys_postgres.sql")
+
+def database_path():
+    """Absolute path of the database file (TRAFFIC_DB_PATH, default traffic.db in the cwd)."""
+    return os.path.abspath(os.environ.get("TRAFFIC_DB_PATH", "traffic.db"))
+
+def database_target():
+    """Where the current storage lives: TRAFFIC_DB_URL if set, else the SQLite file."""
+    return os.environ.get("TRAFFIC_DB_URL") or database_path()
+
+def _connect(path, check_same_thread=True):
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000.0,
+                           cached_statements=STATEMENT_CACHE_SIZE,
+                           check_same_thread=check_same_thread)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_BYTES}")
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KB}")
     return conn
 
-def get_intersections():
-    """Get all intersections with their connected roads."""
-    conn = get_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-        SELECT i.*, GROUP_CONCAT(ir.road_id) as road_ids,
-               GROUP_CONCAT(r.road_name) as road_names,
-               GROUP_CONCAT(ir.direction) as directions
-        FROM intersections i
-        JOIN intersection_roads ir ON i.intersection_id = ir.intersection_id
-        JOIN roads r ON ir.road_id = r.road_id
-        GROUP BY i.intersection_id
-    """)
-
-    intersections = [dict(row) for row in cur.fetchall()]
-    conn.close()
-
-    # Parse the grouped data
-    for intersection in intersections:
-        intersection['road_ids'] = intersection['road_ids'].split(',') if intersection['road_ids'] else []
-        intersection['road_names'] = intersection['road_names'].split(',') if intersection['road_names'] else []
-        intersection['directions'] = intersection['directions'].split(',') if intersection['directions'] else []
-
-    return intersections
+def get_connection():
+    """Return a new standalone SQLite connection; the caller must close it.
 
-def get_emergency_routes():
-    """Get all predefined emergency routes."""
-    conn = get_connection()
-    cur = conn.cursor()
+    Prefer `with connection() as conn:` which reuses pooled connections.
+    """
+    return _connect(database_path())
+
+class Row:
+    """A result row addressable by position or column name, like sqlite3.Row."""
+
+    __slots__ = ("_index", "_values")
+
+    def __init__(self, index, values):
+        self._index = index
+        self._values = values
+
+    def __getitem__(self, key):
+        return self._values[self._index[key] if isinstance(key, str) else key]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def keys(self):
+        return list(self._index)
+
+    def __repr__(self):
+        return f"Row({dict(zip(self._index, self._values))!r})"
+
+def _row_factory(cursor):
+    index = {column.name: i for i, column in enumerate(cursor.description or ())}
+    return lambda values: Row(index, values)
+
+class SQLiteDialect:
+    """The SQL the repositories need that SQLite and server databases spell differently.
+
+    Repositories write `?` placeholders and plain SQL, and ask the dialect
+    for the rest. Timestamps are stored as 'YYYY-MM-DD HH:MM:SS' UTC text on
+    every backend, so they compare and parse the same everywhere.
+    """
+
+    name = "sqlite"
+    now = "CURRENT_TIMESTAMP"
+    greatest = "MAX"
+
+    def sql(self, text):
+        return text
+
+    def in_ids(self, column, ids):
+        """(condition, parameter) restricting column to the given ids."""
+        return f"{column} IN (SELECT value FROM json_each(?))", json.dumps(sorted(ids))
+
+    def epoch(self, column):
+        """Seconds since the epoch of a timestamp column, as a float."""
+        return f"CAST(strftime('%s', {column}) AS REAL)"
+
+    def bucket(self, fmt, column):
+        """A strftime-formatted bucket of a timestamp column (NULL if unparseable)."""
+        return f"strftime('{fmt}', {column})"
+
+    def insert(self, conn, sql, params=()):
+        """Run an INSERT; returns the new row's id, or None if it inserted nothing."""
+        cur = conn.execute(sql, params)
+        return cur.lastrowid if cur.rowcount else None
+
+    def settle_writes(self, conn, table):
+        """Wait, within conn's transaction, until no other transaction can still insert into table.
+
+        SQLite has one writer at a time, so every id it has handed out is
+        already committed: nothing to wait for.
+        """
+
+class PostgresDialect(SQLiteDialect):
+    name = "postgresql"
+    now = "to_char(now() AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI:SS')"
+    greatest = "GREATEST"
+    _FORMATS = {'%Y': 'YYYY', '%m': 'MM', '%d': 'DD', '%H': 'HH24', '%M': 'MI', '%S': 'SS'}
+
+    def __init__(self):
+        self._translated = {}
+
+    def sql(self, text):
+        """`?` placeholders (outside string literals) as %s, and literal % doubled."""
+        translated = self._translated.get(text)
+        if translated is None:
+            parts = text.replace('%', '%%').split("'")
+            translated = "'".join(part.replace('?', '%s') if i % 2 == 0 else part
+                                  for i, part in enumerate(parts))
+            self._translated[text] = translated
+        return translated
+
+    def in_ids(self, column, ids):
+        return f"{column} = ANY(?)", sorted(ids)
+
+    def epoch(self, column):
+        return f"CAST(EXTRACT(EPOCH FROM CAST({column} AS timestamp)) AS DOUBLE PRECISION)"
+
+    def bucket(self, fmt, column):
+        for code, pattern in self._FORMATS.items():
+            fmt = fmt.replace(code, pattern)
+        return (f"CASE WHEN {column} ~ '^\\d{{4}}-\\d\\d-\\d\\d[ T]\\d\\d:\\d\\d' "
+                f"THEN to_char(CAST({column} AS timestamp), '{fmt}') END")
+
+    def insert(self, conn, sql, params=()):
+        row = conn.execute(f"{sql} RETURNING id", params).fetchone()
+        return row[0] if row else None
+
+    def settle_writes(self, conn, table):
+        # Concurrent writers commit identity values out of order. SHARE conflicts with the
+        # ROW EXCLUSIVE lock every INSERT holds until commit, so this waits out in-flight
+        # inserts; later ones draw higher ids. Held only until conn's transaction ends.
+        conn.execute(f"LOCK TABLE {table} IN SHARE MODE")
+
+class ServerConnection:
+    """A server database connection speaking the sqlite3 subset the repositories use."""
+
+    def __init__(self, conn, dialect):
+        self.raw = conn
+        self.dialect = dialect
+
+    def execute(self, sql, params=()):
+        cur = self.raw.cursor()
+        cur.execute(self.dialect.sql(sql), tuple(params))
+        return cur
 
-    cur.execute("SELECT * FROM emergency_routes")
-    routes = [dict(row) for row in cur.fetchall()]
+    def executemany(self, sql, rows):
+        cur = self.raw.cursor()
+        cur.executemany(self.dialect.sql(sql), rows)  # pipelined by psycopg: one round trip per batch
+        return cur
 
-    conn.close()
+    def executescript(self, script):
+        self.raw.execute(script)  # no parameters, so the script's own % and ? are left alone
 
-    # Parse JSON path_order
-    for route in routes:
-        route['path_order'] = json.loads(route['path_order'])
+    def commit(self):
+        self.raw.commit()
 
-    return routes
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        self.raw.close()
+
+class ConnectionPool:
+    """A bounded pool of connections to one database.
+
+    Connections are opened lazily up to `size` and handed out most-recently-used
+    first, so a busy thread keeps getting a connection with warm page and
+    statement caches. Nested `connection()` blocks on the same thread share
+    the outer block's connection and transaction. connect opens one
+    connection (by default a tuned SQLite connection to path).
+    """
+
+    def __init__(self, path, size=POOL_SIZE, connect=None):
+        self.path = path
+        self.size = size
+        self._connect = connect or (lambda: _connect(path, check_same_thread=False))
+        self._idle = []
+        self._opened = 0
+        self._cond = threading.Condition()
+        self._local = threading.local()
+
+    def _acquire(self):
+        with self._cond:
+            while not self._idle and self._opened >= self.size:
+                self._cond.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._opened += 1
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._opened -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, conn):
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Borrow a connection; commits on success, rolls back on error."""
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            yield held  # nested block: the outermost one owns the transaction
+            return
+
+        with timed(DB_POOL_WAIT_SECONDS):
+            conn = self._acquire()
+        self._local.conn = conn
+        try:
+            with timed(DB_TRANSACTION_SECONDS):
+                yield conn
+                conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._local.conn = None
+            self._release(conn)
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._opened -= len(idle)
+        for conn in idle:
+            conn.close()
+
+class Storage:
+    """One database behind a connection pool, with a repository per table.
+
+    The application reads and writes through the repositories
+    (`get_storage().traffic_data.add_many(rows)`), which take their SQL
+    differences from the backend's dialect.
+    """
+
+    dialect = SQLiteDialect()
+
+    def __init__(self, target, pool):
+        self.target = target
+        self.pool = pool
+        self._executor = None
+        self.intersections = IntersectionRepository(self)
+        self.roads = RoadRepository(self)
+        self.approaches = ApproachRepository(self)
+        self.traffic_data = TrafficDataRepository(self)
+        self.latest = LatestReadingRepository(self)
+        self.rollups = RollupRepository(self)
+        self.signal_status = SignalStatusRepository(self)
+        self.emergency_routes = EmergencyRouteRepository(self)
+        self.emergency_logs = EmergencyLogRepository(self)
+
+    def connection(self):
+        """Context manager yielding a pooled connection; commits on success."""
+        return self.pool.connection()
+
+    def topology_changed(self):
+        """Rebuild the road network, routes and cached responses built on the topology tables.
+
+        Call after writing intersections, roads, intersection_roads or
+        emergency_routes; migrate() calls it whenever it applied anything.
+        """
+        response_cache.invalidate('topology')
+
+    def run_async(self, fn, *args):
+        """Await fn(*args) (e.g. a repository method) from asyncio code.
+
+        Runs on a thread pool no larger than the connection pool, so the
+        event loop never blocks on the database and waiting coroutines
+        queue for a worker rather than for a connection.
+        """
+        import asyncio
+        import functools
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._executor = ThreadPoolExecutor(self.pool.size, thread_name_prefix="storage")
+        return asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(fn, *args))
+
+    def close(self):
+        self.pool.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+class SQLiteStorage(Storage):
+    """Storage in a local SQLite file (WAL, memory-mapped, big page cache): the single-node default."""
+
+    def __init__(self, path, pool_size=POOL_SIZE):
+        super().__init__(path, ConnectionPool(path, pool_size))
+
+    def migrate(self):
+        """Create or upgrade the schema; returns the versions applied."""
+        from .migrations import migrate
+        applied = migrate(self.target)
+        if applied:
+            self.topology_changed()
+        return applied
+
+class PostgresStorage(Storage):
+    """Storage in a PostgreSQL server, for more concurrent writers than SQLite's one.
+
+    Needs psycopg (3.x). Every pooled connection auto-prepares the
+    statements it runs repeatedly, and the schema is created from
+    traffic_sys_postgres.sql on first migrate().
+    """
+
+    dialect = PostgresDialect()
+
+    def __init__(self, url, pool_size=POOL_SIZE):
+        super().__init__(url, ConnectionPool(url, pool_size, connect=self._connect))
+
+    def _connect(self):
+        try:
+            import psycopg
+        except ImportError as e:
+            raise RuntimeError("TRAFFIC_DB_URL names a PostgreSQL server; install psycopg "
+                               "(pip install 'psycopg[binary]')") from e
+        return ServerConnection(psycopg.connect(self.target, row_factory=_row_factory), self.dialect)
+
+    def migrate(self, schema_path=SERVER_SCHEMA_PATH):
+        """Create the schema (sample data included) if it is missing; returns the versions applied."""
+        from .migrations import LATEST_VERSION
+        with self.connection() as conn:
+            conn.execute("SELECT pg_advisory_xact_lock(hashtext('traffic_system.migrate'))")
+            if conn.execute("SELECT to_regclass('intersections')").fetchone()[0] is not None:
+                return []
+            with open(schema_path) as f:
+                conn.executescript(f.read())
+        self.topology_changed()
+        return list(range(1, LATEST_VERSION + 1))
+
+_storages = {}
+_storages_lock = threading.Lock()
+
+def get_storage(target=None):
+    """Return the shared Storage for a database (default: database_target()), creating it on first use."""
+    target = target or database_target()
+    storage = _storages.get(target)
+    if storage is None:
+        with _storages_lock:
+            storage = _storages.get(target)
+            if storage is None:
+                kind = PostgresStorage if target.startswith(SERVER_SCHEMES) else SQLiteStorage
+                storage = _storages[target] = kind(target)
+    return storage
+
+def get_pool(path=None):
+    """Return the shared pool for a database, creating it on first use."""
+    return get_storage(path).pool
+
+def connection():
+    """Context manager yielding a pooled connection to the current database."""
+    return get_storage().connection()
+
+def close_pools():
+    """Close every idle pooled connection (e.g. before deleting a database file)."""
+    with _storages_lock:
+        storages = list(_storages.values())
+        _storages.clear()
+    for storage in storages:
+        storage.close()
+
+def get_intersections():
+    """Get all intersections with their connected roads, from the shared RoadNetwork."""
+    from .network import road_network
+    return road_network.get().intersection_dicts()
+
+def get_emergency_routes():
+    """Get all predefined emergency routes."""
+    return get_storage().emergency_routes.all()
@@ -0,0 +1,94 @@
+import array
+import os
+import threading
+
+LEVELS = ('LOW', 'MEDIUM', 'HIGH')
+WINDOW = int(os.environ.get("DENSITY_WINDOW", 8))
+ALPHA = float(os.environ.get("DENSITY_ALPHA", 0.5))
+# Upper bounds (vehicles per reading, smoothed) of LOW and MEDIUM; above the second is HIGH
+THRESHOLDS = tuple(float(x) for x in os.environ.get("DENSITY_THRESHOLDS", "5,15").split(","))
+
+class DensityClassifier:
+    """Streaming per-approach rate and density level for incoming readings.
+
+    Each approach keeps its last `window` vehicle counts in a ring buffer
+    (one slice of a flat array per approach) and a running exponentially
+    weighted average over just those samples: every reading adds its count
+    and drops the one falling out of the window in O(1), so a burst stops
+    influencing the rate after `window` readings. The rate is compared
+    against `thresholds` to give LOW / MEDIUM / HIGH.
+
+    Thread-safe; the ingest writer and the single-reading handler share one.
+    """
+
+    def __init__(self, window=WINDOW, alpha=ALPHA, thresholds=THRESHOLDS):
+        self.window = window
+        self.alpha = alpha
+        self.thresholds = thresholds
+        self._keep = 1.0 - alpha
+        self._dropped_weight = alpha * self._keep ** window  # weight of a sample leaving the window
+        self._lock = threading.Lock()
+        self._index = {}  # (intersection_id, road_id) -> approach number
+        self._ring = array.array('d')  # approach * window + position
+        self._head = array.array('i')  # next ring position per approach
+        self._filled = array.array('i')  # samples held per approach
+        self._sum = array.array('d')  # windowed EWMA, not yet normalised
+
+    def level(self, rate):
+        for level, bound in zip(LEVELS, self.thresholds):
+            if rate <= bound:
+                return level
+        return LEVELS[-1]
+
+    def classify(self, intersection_id, road_id, vehicle_count):
+        """Feed one reading; returns (density_level, rate), or (None, None) without a count."""
+        if vehicle_count is None:
+            return None, None
+        with self._lock:
+            return self._update((intersection_id, road_id), vehicle_count)
+
+    def classify_batch(self, readings):
+        """(intersection_id, road_id, vehicle_count, timestamp) tuples, in arrival order, to
+        (intersection_id, road_id, vehicle_count, density_level, rate, timestamp) rows."""
+        rows = []
+        with self._lock:
+            for intersection_id, road_id, vehicle_count, timestamp in readings:
+                if vehicle_count is None:
+                    level, rate = None, None
+                else:
+                    level, rate = self._update((intersection_id, road_id), vehicle_count)
+                rows.append((intersection_id, road_id, vehicle_count, level, rate, timestamp))
+        return rows
+
+    def _update(self, key, vehicle_count):
+        approach = self._index.get(key)
+        if approach is None:
+            approach = self._index[key] = len(self._head)
+            self._ring.frombytes(bytes(8 * self.window))
+            self._head.append(0)
+            self._filled.append(0)
+            self._sum.append(0.0)
+
+        count = vehicle_count if vehicle_count > 0 else 0
+        head, filled, ring = self._head, self._filled, self._ring
+        position = approach * self.window + head[approach]
+        total = self.alpha * count + self._keep * self._sum[approach]
+        held = filled[approach]
+        if held == self.window:
+            total -= self._dropped_weight * ring[position]  # the oldest sample leaves the window
+        else:
+            held = filled[approach] = held + 1
+        ring[position] = count
+        head[approach] = (head[approach] + 1) % self.window
+        self._sum[approach] = total
+
+        # Normalise by the weight the samples actually held carry
+        rate = round((total if total > 0 else 0.0) / (1.0 - self._keep ** held), 2)
+        return self.level(rate), rate
+
+    def reset(self):
+        """Forget every approach's history."""
+        with self._lock:
+            self._index.clear()
+            for values in (self._ring, self._head, self._filled, self._sum):
+                del values[:]
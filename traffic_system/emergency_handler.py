@@ -1,18 +1,14 @@
-from .db import get_connection, get_emergency_routes
+from .db import get_storage
 from .traffic_controller import controller
-import json
+from .routing import planner
 
 def get_route_path(start_intersection, end_intersection):
-    """Find or calculate a path between two intersections."""
-    # First check predefined routes
-    routes = get_emergency_routes()
-    for route in routes:
-        if route['start_intersection_id'] == start_intersection and route['end_intersection_id'] == end_intersection:
-            return route['path_order']
+    """Find or calculate a path between two intersections.
 
-    # For now, return a simple path (in real system, use pathfinding algorithm)
-    # This is a simplified implementation
-    return [start_intersection, end_intersection]
+    Predefined emergency routes are used when one exists; otherwise the route
+    planner runs A* over the road graph. Returns None if no route exists.
+    """
+    return planner.route(int(start_intersection), int(end_intersection))
 
 def handle_emergency(start_intersection, end_intersection, emergency_type):
     """Handle emergency by creating a green corridor along the route."""
@@ -22,72 +18,40 @@ def handle_emergency(start_intersection, end_intersection, emergency_type):
     if not route_path:
         raise ValueError("No valid route found between intersections")
 
-    # Log the emergency
-    conn = get_connection()
-    cur = conn.cursor()
+    # Log the emergency (against its predefined route, if there is one)
+    log_id = get_storage().emergency_logs.open(emergency_type, start_intersection, end_intersection)
 
-    cur.execute("""
-        INSERT INTO emergency_logs (route_id, emergency_type, status)
-        SELECT route_id, ?, 'ACTIVE'
-        FROM emergency_routes
-        WHERE start_intersection_id = ? AND end_intersection_id = ?
-        LIMIT 1
-    """, (emergency_type, start_intersection, end_intersection))
-
-    # If no predefined route, still log it
-    if cur.rowcount == 0:
-        cur.execute("""
-            INSERT INTO emergency_logs (emergency_type, status)
-            VALUES (?, 'ACTIVE')
-        """, (emergency_type,))
-
-    conn.commit()
-    conn.close()
-
-    # Create the green corridor
-    controller.create_green_corridor(route_path, emergency_type)
+    # Create the green corridor (returns immediately; phases run on the corridor engine)
+    corridor_id = controller.create_green_corridor(route_path, emergency_type, log_id=log_id)
 
     return {
         "status": "success",
+        "corridor_id": corridor_id,
         "route_path": route_path,
         "message": f"Green corridor activated for {emergency_type} from intersection {start_intersection} to {end_intersection}"
     }
 
-def clear_emergency():
-    """Clear active emergency and resume normal operation."""
-    controller.clear_emergency()
-
-    conn = get_connection()
-    cur = conn.cursor()
+def clear_emergency(corridor_id=None):
+    """Clear one active corridor (or all of them) and resume normal operation.
 
-    # Update the most recent active emergency
-    cur.execute("""
-        UPDATE emergency_logs
-        SET status='CLEARED', cleared_at=NOW()
-        WHERE status='ACTIVE'
-        ORDER BY created_at DESC LIMIT 1
-    """)
+    Raises ValueError if corridor_id is not an integer, and LookupError if
+    no running corridor has that id.
+    """
+    if corridor_id is not None:
+        try:
+            corridor_id = int(str(corridor_id))  # accepts 7 and "7", not 7.5 or true
+        except ValueError:
+            raise ValueError(f"corridor_id must be an integer, got {corridor_id!r}") from None
+    # The controller cancels the corridor and marks its emergency log CLEARED
+    cleared = controller.clear_emergency(corridor_id)
+    if corridor_id is not None and not cleared:
+        raise LookupError(f"No active corridor {corridor_id}")
 
-    conn.commit()
-    conn.close()
-
-    return {"status": "emergency cleared"}
+    return {"status": "emergency cleared", "cleared": cleared}
 
 def get_emergency_status():
     """Get current emergency status."""
-    conn = get_connection()
-    cur = conn.cursor(dictionary=True)
-
-    cur.execute("""
-        SELECT * FROM emergency_logs
-        WHERE status='ACTIVE'
-        ORDER BY created_at DESC LIMIT 1
-    """)
-
-    active_emergency = cur.fetchone()
-    conn.close()
-
-    return active_emergency
+    return get_storage().emergency_logs.active()
 
 # Legacy function for backward compatibility
 def handle_emergency_legacy(road_id, emergency_type):
@@ -0,0 +1,50 @@
+import collections
+import json
+import threading
+
+class EventHub:
+    """Ordered feed of signal and emergency changes for streaming clients.
+
+    Every published event gets the next integer id and is pre-encoded once as
+    a Server-Sent Events frame. The last `history` frames are retained so a
+    reconnecting client can resume from its Last-Event-ID.
+    """
+
+    def __init__(self, history=1024):
+        self.last_id = 0
+        self._frames = collections.deque(maxlen=history)  # (id, frame bytes)
+        self._cond = threading.Condition()
+
+    def publish(self, event_type, payload):
+        """Append an event and wake anyone waiting for it; returns its id."""
+        with self._cond:
+            self.last_id += 1
+            frame = f"id: {self.last_id}\nevent: {event_type}\ndata: {json.dumps(payload)}\n\n".encode()
+            self._frames.append((self.last_id, frame))
+            self._cond.notify_all()
+            return self.last_id
+
+    def since(self, last_id, until=None):
+        """(id, frame) pairs after last_id (up to until), or None if the caller must resync.
+
+        None means some were already dropped, or last_id is ahead of this hub (ids
+        restart with the process, so a client from before a restart has one).
+        """
+        with self._cond:
+            if last_id > self.last_id:
+                return None
+            until = self.last_id if until is None else until
+            if last_id >= until:
+                return []
+            if not self._frames or self._frames[0][0] > last_id + 1:
+                return None
+            return [(event_id, frame) for event_id, frame in self._frames if last_id < event_id <= until]
+
+    def wait(self, last_id, timeout=None):
+        """Block until an event newer than last_id exists (or timeout); returns the latest id."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.last_id > last_id, timeout)
+            return self.last_id
+
+# Shared feed the controller publishes to and /api/stream reads from
+event_hub = EventHub()
@@ -0,0 +1,248 @@
+"""
+Short-horizon demand forecasting per approach, with a backtest harness.
+
+    python -m traffic_system.forecast backtest --db recorded.db --horizon 60
+
+Each approach gets an additive time-of-day profile (mean vehicle count per
+bin_minutes slot of the day) and a Holt level/trend model over its readings.
+Both are updated reading by reading in flat arrays, so keeping the forecaster
+current costs one pass over the rows that arrived since the last refresh; it
+never refits from scratch. The forecast h seconds after an approach's latest
+reading is its level plus trend * h, shifted by how the profile changes
+between the two times of day.
+"""
+import argparse
+import array
+import datetime
+import os
+import threading
+import time
+from .db import database_target, get_storage
+
+BIN_MINUTES = int(os.environ.get("FORECAST_BIN_MINUTES", 15))
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+def parse_timestamp(text):
+    """Seconds since the epoch for a 'YYYY-MM-DD HH:MM:SS' (UTC) timestamp, or None."""
+    try:
+        return (datetime.datetime.fromisoformat(text) - _EPOCH).total_seconds()
+    except (TypeError, ValueError):
+        return None
+
+class DemandForecaster:
+    """Per-approach time-of-day profile plus a Holt trend, updated incrementally.
+
+    observe() feeds one reading; refresh() feeds every traffic_data row (and,
+    the first time, every rollup) the forecaster has not seen yet. Readings
+    must arrive in time order per approach.
+    """
+
+    def __init__(self, alpha=0.5, beta=0.05, bin_minutes=BIN_MINUTES, max_horizon=900):
+        self.alpha = alpha  # level smoothing
+        self.beta = beta  # trend smoothing
+        self.bin_seconds = bin_minutes * 60
+        self.bins = 86400 // self.bin_seconds
+        self.max_horizon = max_horizon  # trends are not extrapolated further than this (seconds)
+        self._refresh_lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget every approach and where refresh() got to."""
+        self.path = None
+        self.last_id = 0  # highest traffic_data id already observed
+        self._rolled_id = 0  # traffic_data rows up to here are already in the minute rollups
+        self._index = {}  # (intersection_id, road_id) -> approach number
+        self._level = array.array('d')
+        self._trend = array.array('d')  # vehicles per second
+        self._seen_at = array.array('d')  # time of the approach's latest reading
+        self._profile_sum = array.array('d')  # approach * bins + bin
+        self._profile_n = array.array('d')
+
+    def __len__(self):
+        return len(self._index)
+
+    def _approach(self, key):
+        approach = self._index.get(key)
+        if approach is None:
+            approach = self._index[key] = len(self._level)
+            self._level.append(0.0)
+            self._trend.append(0.0)
+            self._seen_at.append(-1.0)
+            self._profile_sum.frombytes(bytes(8 * self.bins))
+            self._profile_n.frombytes(bytes(8 * self.bins))
+        return approach
+
+    def _bin(self, at):
+        return int(at % 86400) // self.bin_seconds
+
+    def add_profile(self, intersection_id, road_id, at, total, samples=1):
+        """Fold `samples` readings summing to `total`, taken around time `at`, into the profile."""
+        slot = self._approach((intersection_id, road_id)) * self.bins + self._bin(at)
+        self._profile_sum[slot] += total
+        self._profile_n[slot] += samples
+
+    def observe(self, intersection_id, road_id, vehicle_count, at, profile=True):
+        """Update the approach's Holt state (and profile) with one reading taken at `at`."""
+        approach = self._approach((intersection_id, road_id))
+        count = float(max(vehicle_count, 0))
+        if profile:
+            slot = approach * self.bins + self._bin(at)
+            self._profile_sum[slot] += count
+            self._profile_n[slot] += 1
+        seen_at = self._seen_at[approach]
+        if seen_at < 0:
+            self._level[approach] = count
+        else:
+            dt = at - seen_at
+            if dt <= 0:
+                # Same instant (or out of order): just pull the level towards it
+                self._level[approach] += self.alpha * (count - self._level[approach])
+                return
+            level, trend = self._level[approach], self._trend[approach]
+            new_level = self.alpha * count + (1 - self.alpha) * (level + trend * dt)
+            self._trend[approach] = self.beta * (new_level - level) / dt + (1 - self.beta) * trend
+            self._level[approach] = new_level
+        self._seen_at[approach] = at
+
+    def _profile(self, approach, at):
+        slot = approach * self.bins + self._bin(at)
+        n = self._profile_n[slot]
+        return self._profile_sum[slot] / n if n else None
+
+    def predict(self, intersection_id, road_id, horizon):
+        """Expected vehicle count `horizon` seconds after the approach's latest reading, or None."""
+        approach = self._index.get((intersection_id, road_id))
+        if approach is None or self._seen_at[approach] < 0:
+            return None
+        seen_at = self._seen_at[approach]
+        forecast = self._level[approach] + self._trend[approach] * min(horizon, self.max_horizon)
+        now, then = self._profile(approach, seen_at), self._profile(approach, seen_at + horizon)
+        if now is not None and then is not None:
+            forecast += then - now  # e.g. the evening peak building up
+        return forecast if forecast > 0 else 0.0
+
+    def refresh(self, batch_size=50000):
+        """Observe every traffic_data row committed since the last refresh; returns rows read.
+
+        The first refresh against a database also loads the minute rollups
+        into the profile, covering history whose raw rows have expired.
+        Concurrent callers (one per zone) take turns; the later ones find
+        nothing new.
+        """
+        with self._refresh_lock:
+            path = database_target()
+            if path != self.path:
+                self.reset()
+                self.path = path
+                self._load_rollups()
+            return self._read_new(batch_size)
+
+    def _read_new(self, batch_size):
+        read = 0
+        traffic_data = get_storage(self.path).traffic_data
+        high = traffic_data.watermark()  # rows past it may still be joined by lower ids
+        while True:
+            rows = traffic_data.since(self.last_id, batch_size, high)
+            for row_id, intersection_id, road_id, vehicle_count, timestamp in rows:
+                at = parse_timestamp(timestamp)
+                if at is not None and vehicle_count is not None and intersection_id is not None:
+                    # Rows the rollups already counted only move the trend
+                    self.observe(intersection_id, road_id, vehicle_count, at, profile=row_id > self._rolled_id)
+            if rows:
+                self.last_id = rows[-1][0]
+            read += len(rows)
+            if len(rows) < batch_size:
+                return read
+
+    def _load_rollups(self):
+        rollups = get_storage(self.path).rollups
+        with rollups.connection():
+            self._rolled_id = rollups.last_id()
+            for bucket, intersection_id, road_id, samples, total, _ in rollups.history("traffic_rollup_minute"):
+                at = parse_timestamp(bucket)
+                if at is not None and samples:
+                    self.add_profile(intersection_id, road_id, at, total, samples)
+
+def backtest(readings, horizon=60, forecaster=None):
+    """Score forecasts `horizon` seconds ahead against the readings that followed.
+
+    readings are (intersection_id, road_id, vehicle_count, timestamp) in time
+    order. Before each reading is observed, every pending forecast for its
+    approach whose target time has come is scored against it (alongside the
+    naive forecast: the count at prediction time); then a new forecast is
+    made from it. Returns error and latency figures.
+    """
+    forecaster = DemandForecaster() if forecaster is None else forecaster
+    pending = {}  # approach -> [(target time, forecast, naive), ...]
+    errors, naive_errors, squared = [], [], 0.0
+    fit_time = predict_time = 0.0
+    predictions = 0
+    for intersection_id, road_id, vehicle_count, timestamp in readings:
+        at = parse_timestamp(timestamp)
+        if at is None or vehicle_count is None:
+            continue
+        key = (intersection_id, road_id)
+        queue = pending.get(key)
+        while queue and queue[0][0] <= at:
+            _, forecast, naive = queue.pop(0)
+            errors.append(abs(forecast - vehicle_count))
+            naive_errors.append(abs(naive - vehicle_count))
+            squared += (forecast - vehicle_count) ** 2
+
+        started = time.perf_counter()
+        forecaster.observe(intersection_id, road_id, vehicle_count, at)
+        fitted = time.perf_counter()
+        forecast = forecaster.predict(intersection_id, road_id, horizon)
+        predict_time += time.perf_counter() - fitted
+        fit_time += fitted - started
+        predictions += 1
+        pending.setdefault(key, []).append((at + horizon, forecast, vehicle_count))
+
+    scored = len(errors)
+    return {
+        "readings": predictions,
+        "scored": scored,
+        "horizon_s": horizon,
+        "mae": round(sum(errors) / scored, 3) if scored else None,
+        "rmse": round((squared / scored) ** 0.5, 3) if scored else None,
+        "naive_mae": round(sum(naive_errors) / scored, 3) if scored else None,
+        "fit_us_per_reading": round(fit_time / predictions * 1e6, 2) if predictions else None,
+        "predict_us": round(predict_time / predictions * 1e6, 2) if predictions else None,
+        "approaches": len(forecaster),
+    }
+
+def recorded_readings(db_path):
+    """Every reading in a database's traffic_data, in time order."""
+    import sqlite3
+    conn = sqlite3.connect(db_path)
+    try:
+        yield from conn.execute("""
+            SELECT intersection_id, road_id, vehicle_count, timestamp FROM traffic_data
+            WHERE timestamp IS NOT NULL ORDER BY timestamp, id
+        """)
+    finally:
+        conn.close()
+
+# Shared by the controller when its forecast_weight is set
+forecaster = DemandForecaster()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Demand forecast backtest")
+    commands = parser.add_subparsers(dest="command", required=True)
+    test = commands.add_parser("backtest", help="score forecasts against a recorded traffic_data history")
+    test.add_argument("--db", default="traffic.db", help="database holding the recorded traffic_data")
+    test.add_argument("--horizon", type=float, default=60, help="seconds ahead to forecast")
+    test.add_argument("--alpha", type=float, default=0.5)
+    test.add_argument("--beta", type=float, default=0.05)
+    test.add_argument("--bin-minutes", type=int, default=BIN_MINUTES)
+    args = parser.parse_args(argv)
+
+    result = backtest(recorded_readings(args.db), args.horizon,
+                      DemandForecaster(args.alpha, args.beta, args.bin_minutes))
+    for key, value in result.items():
+        print(f"{key:>20}: {value}")
+    return result
+
+if __name__ == "__main__":
+    main()
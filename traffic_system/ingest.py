@@ -0,0 +1,189 @@
+import collections
+import datetime
+import json
+import os
+import threading
+import time
+from .db import get_storage
+from .density import DensityClassifier
+from .metrics import INGEST_COMMIT_SECONDS, INGEST_ROWS, timed
+
+QUEUE_SIZE = int(os.environ.get("INGEST_QUEUE_SIZE", 100000))
+
+class IngestionQueue:
+    """Bounded buffer of sensor readings written to traffic_data in group commits.
+
+    Producers (HTTP handlers) offer whole batches, which are accepted or
+    rejected atomically so callers can answer 429 when the queue is full.
+    One writer thread drains up to batch_size readings at a time, waiting at
+    most commit_interval for more to arrive, and inserts them with a single
+    executemany per transaction. Each reading passes through the density
+    classifier on the way in, so it is stored with its smoothed rate and
+    density_level. on_commit receives the set of intersections each commit
+    touched.
+    """
+
+    def __init__(self, capacity=QUEUE_SIZE, batch_size=5000, commit_interval=0.05, on_commit=None,
+                 classifier=None):
+        self.capacity = capacity
+        self.classifier = classifier or DensityClassifier()
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval
+        self.on_commit = on_commit
+        self.ingested = 0
+        self.rejected = 0
+        self.commits = 0
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._writing = False
+        self._thread = None
+        self._rate = 0.0  # rows/sec, exponentially smoothed
+        self._rate_at = time.monotonic()
+
+    def offer(self, readings):
+        """Queue a batch of (intersection_id, road_id, vehicle_count, timestamp) tuples.
+
+        Returns False, queueing nothing, if the batch does not fit.
+        """
+        with self._cond:
+            if len(self._queue) + len(readings) > self.capacity:
+                self.rejected += len(readings)
+                INGEST_ROWS.labels('rejected').inc(len(readings))
+                return False
+            self._queue.extend(readings)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+            return True
+
+    def flush(self, timeout=10.0):
+        """Block until everything queued so far has been committed."""
+        with self._cond:
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._queue and not self._writing, timeout)
+
+    def stats(self):
+        with self._cond:
+            idle = time.monotonic() - self._rate_at
+            return {
+                "queued": len(self._queue),
+                "capacity": self.capacity,
+                "ingested": self.ingested,
+                "rejected": self.rejected,
+                "commits": self.commits,
+                # Decay the smoothed rate while nothing is being written
+                "rows_per_sec": round(self._rate * 0.5 ** idle, 1),
+            }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue)
+                # Give a burst a moment to fill the batch before committing
+                deadline = time.monotonic() + self.commit_interval
+                while len(self._queue) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._cond.wait(remaining):
+                        break
+                count = min(len(self._queue), self.batch_size)
+                batch = [self._queue.popleft() for _ in range(count)]
+                self._writing = True
+            try:
+                self._write(batch)
+            except Exception as e:
+                print(f"Ingestion commit of {len(batch)} readings failed: {e}")
+            finally:
+                with self._cond:
+                    self._writing = False
+                    self._cond.notify_all()
+
+    def _write(self, batch):
+        started = time.monotonic()
+        rows = self.classifier.classify_batch(batch)
+        with timed(INGEST_COMMIT_SECONDS):
+            get_storage().traffic_data.add_many(rows)
+        now = time.monotonic()
+        with self._cond:
+            self.ingested += len(batch)
+            INGEST_ROWS.labels('ingested').inc(len(batch))
+            self.commits += 1
+            elapsed = max(now - self._rate_at, now - started, 1e-6)
+            weight = min(1.0, elapsed)  # roughly a one-second smoothing window
+            self._rate = (1 - weight) * self._rate + weight * (len(batch) / elapsed)
+            self._rate_at = now
+        if self.on_commit:
+            self.on_commit({reading[0] for reading in batch})
+
+def normalize_timestamp(value):
+    """A reading's ISO-8601 timestamp as UTC 'YYYY-MM-DD HH:MM:SS' (None stays None).
+
+    Accepts a 'T' or a space between date and time, fractional seconds, and
+    a 'Z' or +HH:MM offset; times without an offset are taken as UTC. Every
+    stored timestamp has the one form because traffic_latest, retention and
+    the rollups compare them as text. Raises ValueError for anything else.
+    """
+    if value is None or value == "":
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"timestamp must be an ISO-8601 string, got {value!r}")
+    text = value.strip()
+    if text[-1:] in ("Z", "z"):
+        text = text[:-1] + "+00:00"
+    try:
+        at = datetime.datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"timestamp {value!r} is not ISO-8601") from None
+    if at.tzinfo is not None:
+        at = at.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return at.strftime('%Y-%m-%d %H:%M:%S')
+
+def parse_reading(item):
+    """One {"intersection_id", "road_id", "vehicle_count"[, "timestamp"]} object as a reading tuple.
+
+    Raises ValueError if a field is missing or malformed.
+    """
+    try:
+        return (int(item["intersection_id"]), int(item["road_id"]), int(item["vehicle_count"]),
+                normalize_timestamp(item.get("timestamp")))
+    except KeyError as e:
+        raise ValueError(f"missing field {e}") from None
+    except (TypeError, AttributeError) as e:
+        raise ValueError(str(e)) from None
+
+def parse_readings(body, content_type):
+    """Decode a bulk upload into reading tuples.
+
+    Accepts NDJSON (one {"intersection_id", "road_id", "vehicle_count"[, "timestamp"]}
+    object per line) or CSV lines of intersection_id,road_id,vehicle_count[,timestamp]
+    with an optional header row. Timestamps go through normalize_timestamp.
+    Raises ValueError on malformed input.
+    """
+    text = body.decode()
+    readings = []
+    if 'csv' in (content_type or ''):
+        for line_no, line in enumerate(text.splitlines(), 1):
+            if not line.strip():
+                continue
+            fields = line.split(',')
+            if line_no == 1 and not fields[0].strip().isdigit():
+                continue  # header row
+            if len(fields) < 3:
+                raise ValueError(f"line {line_no}: expected intersection_id,road_id,vehicle_count")
+            try:
+                readings.append((int(fields[0]), int(fields[1]), int(fields[2]),
+                                 normalize_timestamp(fields[3].strip() if len(fields) > 3 else None)))
+            except ValueError as e:
+                raise ValueError(f"line {line_no}: {e}") from None
+    else:
+        for line_no, line in enumerate(text.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                readings.append(parse_reading(json.loads(line)))
+            except ValueError as e:  # json.JSONDecodeError included
+                raise ValueError(f"line {line_no}: {e}") from None
+    return readings
+
+# Shared queue behind POST /api/traffic/bulk
+ingest_queue = IngestionQueue()
@@ -0,0 +1,292 @@
+import bisect
+import collections
+import os
+import sys
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Instrumentation is on unless METRICS_ENABLED=0; when off, timers are a shared no-op
+enabled = os.environ.get("METRICS_ENABLED", "1") != "0"
+
+def set_enabled(value):
+    global enabled
+    enabled = bool(value)
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                             for name, value in pairs)
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values, **labels):
+        """The child metric for one combination of label values."""
+        key = values or tuple(labels[name] for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _samples(self):
+        with self._lock:
+            children = list(self._children.items())
+        if not self.labelnames and not children:
+            children = [((), self._new_child())]
+        for key, child in sorted(children, key=lambda item: item[0]):
+            yield from child.samples(self.name, self.labelnames, key)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{name}{labels} {value}" for name, labels, value in self._samples()]
+        return "\n".join(lines)
+
+class _CounterValue:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        if enabled:
+            with self._lock:
+                self.value += amount
+
+    def samples(self, name, labelnames, key):
+        yield name, _format_labels(labelnames, key), _format_value(self.value)
+
+class Counter(_Metric):
+    """Monotonic count, e.g. requests served or rows ingested."""
+    kind = "counter"
+    _new_child = _CounterValue
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def samples(self, name, labelnames, key):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        cumulative = 0
+        for bound, count in zip((*self.bounds, "+Inf"), counts):
+            cumulative += count
+            le = bound if bound == "+Inf" else _format_value(bound)
+            yield f"{name}_bucket", _format_labels(labelnames, key, (("le", le),)), str(cumulative)
+        yield f"{name}_sum", _format_labels(labelnames, key), repr(total)
+        yield f"{name}_count", _format_labels(labelnames, key), str(cumulative)
+
+class Histogram(_Metric):
+    """Distribution of observed values (usually seconds) in fixed buckets."""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+class Gauge(_Metric):
+    """Value read from a callback when metrics are rendered.
+
+    The callback returns a number, or a {label values tuple: number} dict
+    for a labelled gauge. Pass kind="counter" for totals some other object
+    already keeps (e.g. cache hits).
+    """
+
+    def __init__(self, name, documentation, callback, labelnames=(), kind="gauge"):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+        self.kind = kind
+
+    def _samples(self):
+        value = self.callback()
+        values = value if isinstance(value, dict) else {(): value}
+        for key, number in sorted(values.items()):
+            if number is not None:
+                yield self.name, _format_labels(self.labelnames, key), _format_value(number)
+
+class Registry:
+    """Every metric the process exports, rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, callback, labelnames=(), kind="gauge"):
+        return self._register(Gauge(name, documentation, callback, labelnames, kind))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        blocks = []
+        for metric in metrics:
+            try:
+                blocks.append(metric.render())
+            except Exception as e:  # a broken gauge callback must not take the endpoint down
+                blocks.append(f"# {metric.name} unavailable: {e}")
+        return "\n".join(blocks) + "\n"
+
+class _Timer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOOP = _NoopTimer()
+
+def timed(histogram, *label_values):
+    """Context manager observing the block's duration in histogram (a no-op when disabled)."""
+    if not enabled:
+        return _NOOP
+    return _Timer(histogram.labels(*label_values) if label_values else histogram.labels())
+
+class SamplingProfiler:
+    """Statistical profiler that can be switched on and off while the server runs.
+
+    A daemon thread samples every other thread's stack every `interval`
+    seconds and counts identical stacks. folded() returns them in the
+    collapsed "frame;frame;frame count" format flame graph tools read.
+    """
+
+    def __init__(self, max_depth=64):
+        self.max_depth = max_depth
+        self.interval = None
+        self.samples = 0
+        self._stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=0.01):
+        with self._lock:
+            self.interval = interval
+            if not self.running:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            self._stop.set()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=1)
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+
+    def folded(self):
+        with self._lock:
+            stacks = self._stacks.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+    def status(self):
+        return {"running": self.running, "interval": self.interval, "samples": self.samples,
+                "stacks": len(self._stacks)}
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                names = []
+                while frame is not None and len(names) < self.max_depth:
+                    code = frame.f_code
+                    names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stacks.append(";".join(reversed(names)))
+            with self._lock:
+                self._stacks.update(stacks)
+                self.samples += 1
+
+# Shared registry behind GET /api/metrics
+registry = Registry()
+profiler = SamplingProfiler()
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "traffic_http_request_seconds", "Time to handle an HTTP request", ("method", "route", "status"))
+DB_TRANSACTION_SECONDS = registry.histogram(
+    "traffic_db_transaction_seconds", "Time a pooled connection is held, from borrow to commit")
+DB_POOL_WAIT_SECONDS = registry.histogram(
+    "traffic_db_pool_wait_seconds", "Time spent waiting for a pooled connection")
+SIGNAL_CYCLE_SECONDS = registry.histogram(
+    "traffic_signal_cycle_seconds", "Time to plan and apply a signal cycle", ("scope",))
+TRAFFIC_DATA_SECONDS = registry.histogram(
+    "traffic_get_traffic_data_seconds", "Time to read the latest traffic data")
+SIGNALS_CHANGED = registry.counter(
+    "traffic_signals_changed_total", "Signals changed by the controller")
+CORRIDOR_PHASE_SECONDS = registry.histogram(
+    "traffic_corridor_phase_seconds", "Time to apply one green corridor phase")
+INGEST_COMMIT_SECONDS = registry.histogram(
+    "traffic_ingest_commit_seconds", "Time to write one bulk ingestion group commit")
+INGEST_ROWS = registry.counter(
+    "traffic_ingest_rows_total", "Bulk readings by outcome", ("outcome",))
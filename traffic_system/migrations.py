@@ -0,0 +1,184 @@
+"""
+Versioned schema migrations, tracked in SQLite's PRAGMA user_version.
+
+    python -m traffic_system.migrations [--db traffic.db]
+
+traffic_sys.sql is always the current schema: a new database is created from
+it (sample data included) and stamped with the latest version. A database
+from before versioning (user_version 0 with tables in it) or from an older
+version runs the MIGRATIONS it has not had yet, in order, each in its own
+transaction together with the version bump. Every migration tolerates finding
+its change already (partly) made, since unversioned databases may have been
+created from any revision of the schema. An up-to-date database costs one
+PRAGMA read.
+"""
+import argparse
+import os
+import sqlite3
+import time
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "traffic_sys.sql")
+
+def _latest_trigger(conn, columns):
+    """(Re)create the trigger that copies each new reading's columns into traffic_latest."""
+    conn.execute("DROP TRIGGER IF EXISTS traffic_data_latest")
+    conn.execute(f"""
+        CREATE TRIGGER traffic_data_latest AFTER INSERT ON traffic_data
+        BEGIN
+            INSERT INTO traffic_latest (intersection_id, road_id, reading_id, {", ".join(columns)})
+            VALUES (NEW.intersection_id, NEW.road_id, NEW.id, {", ".join("NEW." + c for c in columns)})
+            ON CONFLICT (intersection_id, road_id) DO UPDATE SET
+                reading_id = excluded.reading_id,
+                {", ".join(f"{c} = excluded.{c}" for c in columns)}
+            WHERE excluded.timestamp >= traffic_latest.timestamp;
+        END
+    """)
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+def _add_column(conn, table, column, declaration):
+    if column not in _columns(conn, table):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+def _latest_readings(conn):
+    """History indexes, and traffic_latest backfilled from traffic_data."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_traffic_data_approach_time "
+                 "ON traffic_data (intersection_id, road_id, timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_emergency_logs_status ON emergency_logs (status, created_at)")
+    if _columns(conn, "traffic_latest"):
+        return  # already kept current by its trigger
+    conn.execute("""
+        CREATE TABLE traffic_latest (
+            intersection_id INTEGER NOT NULL,
+            road_id INTEGER NOT NULL,
+            reading_id INTEGER,
+            vehicle_count INTEGER,
+            density_level TEXT,
+            timestamp TEXT,
+            PRIMARY KEY (intersection_id, road_id)
+        ) WITHOUT ROWID
+    """)
+    _latest_trigger(conn, ("vehicle_count", "density_level", "timestamp"))
+    # The newest reading per approach; ties on timestamp go to the later row
+    conn.execute("""
+        INSERT INTO traffic_latest (intersection_id, road_id, reading_id, vehicle_count, density_level, timestamp)
+        SELECT intersection_id, road_id, id, vehicle_count, density_level, timestamp FROM (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY intersection_id, road_id
+                                         ORDER BY timestamp DESC, id DESC) AS newest
+            FROM traffic_data WHERE intersection_id IS NOT NULL AND road_id IS NOT NULL
+        ) WHERE newest = 1
+    """)
+
+def _rollups(conn):
+    """Per-minute and per-hour rollup tables and the rollup cursor."""
+    for resolution in ("minute", "hour"):
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS traffic_rollup_{resolution} (
+                bucket TEXT NOT NULL,
+                intersection_id INTEGER NOT NULL,
+                road_id INTEGER NOT NULL,
+                samples INTEGER NOT NULL,
+                total_count INTEGER NOT NULL,
+                max_count INTEGER,
+                PRIMARY KEY (intersection_id, road_id, bucket)
+            ) WITHOUT ROWID
+        """)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_traffic_rollup_{resolution}_bucket "
+                     f"ON traffic_rollup_{resolution} (bucket)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS traffic_rollup_state (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO traffic_rollup_state (name, last_id) VALUES ('traffic_data', 0)")
+
+def _rates(conn):
+    """Smoothed rate stored with every reading and carried into traffic_latest."""
+    _add_column(conn, "traffic_data", "density_level", "TEXT")
+    _add_column(conn, "traffic_data", "rate", "REAL")
+    _add_column(conn, "traffic_latest", "rate", "REAL")
+    _latest_trigger(conn, ("vehicle_count", "density_level", "rate", "timestamp"))
+
+# Version n is reached by running MIGRATIONS[n - 1]
+MIGRATIONS = [
+    _latest_readings,
+    _rollups,
+    _rates,
+]
+LATEST_VERSION = len(MIGRATIONS)
+
+def _statements(script):
+    """Split an SQL script into complete statements (triggers included)."""
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            yield statement
+            statement = ""
+    if any(line.strip() and not line.strip().startswith("--") for line in statement.splitlines()):
+        yield statement  # unterminated; let SQLite report it
+
+def schema_version(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+def migrate(path=None, schema_path=SCHEMA_PATH):
+    """Create or upgrade the database at path; returns the versions applied (empty when current).
+
+    Runs under BEGIN IMMEDIATE, so several processes starting against the
+    same file apply each migration once: the others wait, then find the
+    version already bumped.
+    """
+    if path is None:
+        from .db import database_path
+        path = database_path()
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    try:
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= LATEST_VERSION:
+            return []  # the fast path: nothing to lock
+        applied = []
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if version >= LATEST_VERSION:
+                    conn.execute("COMMIT")
+                    return applied
+                if version == 0 and not conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone():
+                    with open(schema_path) as f:
+                        for statement in _statements(f.read()):
+                            conn.execute(statement)
+                    version = LATEST_VERSION
+                    applied.extend(range(1, LATEST_VERSION + 1))
+                else:
+                    version += 1
+                    MIGRATIONS[version - 1](conn)
+                    applied.append(version)
+                conn.execute(f"PRAGMA user_version = {version}")
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+    finally:
+        conn.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations")
+    parser.add_argument("--db", help="database file (default: TRAFFIC_DB_PATH or traffic.db)")
+    args = parser.parse_args(argv)
+    started = time.perf_counter()
+    applied = migrate(args.db)
+    took = (time.perf_counter() - started) * 1000
+    path = args.db or "the database"
+    print(f"{path}: schema version {LATEST_VERSION}"
+          + (f", applied {', '.join(map(str, applied))}" if applied else ", already current")
+          + f" ({took:.1f} ms)")
+    return applied
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import array
+import collections
+import math
+import sys
+import threading
+from .db import database_target, get_storage
+from .response_cache import response_cache
+
+EARTH_RADIUS_M = 6371000.0
+
+def haversine(a, b):
+    """Great-circle distance in metres between two (latitude, longitude) pairs."""
+    lat1, lon1 = map(math.radians, a)
+    lat2, lon2 = map(math.radians, b)
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(h))
+
+class Intersection:
+    """One intersection; its approaches are network slots offsets[index]..offsets[index + 1]."""
+    __slots__ = ("index", "intersection_id", "name", "latitude", "longitude")
+
+    def __init__(self, index, intersection_id, name, latitude, longitude):
+        self.index = index
+        self.intersection_id = intersection_id
+        self.name = name
+        self.latitude = latitude
+        self.longitude = longitude
+
+class RoadNetwork:
+    """Intersections, approaches and the road graph, held in flat arrays.
+
+    Intersections are numbered 0..n-1 in id order. Their approaches
+    (intersection, road, direction) are contiguous slots: intersection k
+    owns slots offsets[k]:offsets[k + 1], with the road in approach_road and
+    the direction in approach_direction (by_direction lists each
+    intersection's slots sorted by direction). The road graph is in CSR form:
+    intersection k's neighbours are adj_targets[adj_offsets[k]:adj_offsets[k + 1]]
+    with distances in metres in adj_weights. Intersections sharing a road
+    are chained in order along the road's main axis; chains maps each road
+    with two or more intersections to that ordered tuple of indices.
+
+    A network is immutable once built; RoadNetwork.load() builds a new one
+    and the shared NetworkCache swaps it in.
+    """
+
+    def __init__(self):
+        self.path = None
+        self.version = None
+        self.intersections = []
+        self.index = {}  # intersection_id -> index
+        self.latitude = array.array('d')
+        self.longitude = array.array('d')
+        self.offsets = array.array('i', [0])
+        self.approach_intersection = array.array('q')
+        self.approach_road = array.array('q')
+        self.approach_direction = []
+        self.by_direction = array.array('i')  # each intersection's slots, ordered by direction
+        self.slot = {}  # (intersection_id, road_id) -> approach slot
+        self.road_names = {}
+        self.adj_offsets = array.array('i', [0])
+        self.adj_targets = array.array('i')
+        self.adj_weights = array.array('d')
+        self.chains = {}  # road_id -> intersection indices in order along the road
+
+    @classmethod
+    def load(cls, path=None):
+        """Build a network from the intersections, roads and intersection_roads tables."""
+        network = cls()
+        network.path = path or database_target()
+        network.version = response_cache.version('topology')
+        storage = get_storage(network.path)
+        with storage.connection():
+            rows = storage.intersections.all()
+            network.road_names = storage.roads.names()
+            approaches = storage.approaches.all()
+
+        for index, (iid, name, lat, lon) in enumerate(rows):
+            network.intersections.append(Intersection(index, iid, name, lat, lon))
+            network.index[iid] = index
+            network.latitude.append(lat or 0.0)
+            network.longitude.append(lon or 0.0)
+
+        per_intersection = collections.defaultdict(list)
+        for iid, road_id, direction in approaches:
+            if iid in network.index:
+                per_intersection[network.index[iid]].append((road_id, direction))
+        for index, intersection in enumerate(network.intersections):
+            first = len(network.approach_road)
+            for road_id, direction in per_intersection[index]:
+                network.slot[(intersection.intersection_id, road_id)] = len(network.approach_road)
+                network.approach_intersection.append(intersection.intersection_id)
+                network.approach_road.append(road_id)
+                network.approach_direction.append(sys.intern(direction) if direction else direction)
+            network.offsets.append(len(network.approach_road))
+            network.by_direction.extend(sorted(range(first, len(network.approach_road)),
+                                               key=lambda slot: network.approach_direction[slot] or ""))
+
+        network._build_graph()
+        return network
+
+    def _build_graph(self):
+        lat, lon = self.latitude, self.longitude
+        road_members = collections.defaultdict(set)
+        for index in range(len(self.intersections)):
+            for slot in range(self.offsets[index], self.offsets[index + 1]):
+                road_members[self.approach_road[slot]].add(index)
+
+        neighbours = [{} for _ in self.intersections]
+        for road_id, members in road_members.items():
+            if len(members) < 2:
+                continue
+            members = list(members)
+            axis = lat if (max(lat[i] for i in members) - min(lat[i] for i in members) >=
+                           max(lon[i] for i in members) - min(lon[i] for i in members)) else lon
+            members.sort(key=lambda i: (axis[i], i))
+            self.chains[road_id] = tuple(members)
+            for a, b in zip(members, members[1:]):
+                weight = haversine((lat[a], lon[a]), (lat[b], lon[b]))
+                if weight < neighbours[a].get(b, math.inf):
+                    neighbours[a][b] = neighbours[b][a] = weight
+
+        for edges in neighbours:
+            for target in sorted(edges):
+                self.adj_targets.append(target)
+                self.adj_weights.append(edges[target])
+            self.adj_offsets.append(len(self.adj_targets))
+
+    def __len__(self):
+        return len(self.intersections)
+
+    def approaches(self, intersection_id):
+        """Slot range of an intersection's approaches (empty if unknown)."""
+        index = self.index.get(intersection_id)
+        return range(0) if index is None else range(self.offsets[index], self.offsets[index + 1])
+
+    def neighbours(self, index):
+        """(neighbour index, distance) pairs of intersection `index`."""
+        lo, hi = self.adj_offsets[index], self.adj_offsets[index + 1]
+        return zip(self.adj_targets[lo:hi], self.adj_weights[lo:hi])
+
+    def coords(self, index):
+        return self.latitude[index], self.longitude[index]
+
+    def intersection_dicts(self):
+        """Intersections with their roads, as GET /api/intersections serves them."""
+        result = []
+        for intersection in self.intersections:
+            slots = range(self.offsets[intersection.index], self.offsets[intersection.index + 1])
+            if not slots:
+                continue  # like the old inner join: intersections without roads are not listed
+            result.append({
+                "intersection_id": intersection.intersection_id,
+                "intersection_name": intersection.name,
+                "latitude": intersection.latitude,
+                "longitude": intersection.longitude,
+                "road_ids": [str(self.approach_road[s]) for s in slots],
+                "road_names": [self.road_names.get(self.approach_road[s]) for s in slots],
+                "directions": [self.approach_direction[s] for s in slots],
+            })
+        return result
+
+class NetworkCache:
+    """The current RoadNetwork, rebuilt when the database or the 'topology' version changes.
+
+    get() is a couple of attribute reads when nothing has changed; the
+    rebuild happens on the first call after a change and every caller
+    shares the result. Switching to another database bumps 'topology' too,
+    so responses cached on the old network are rebuilt with it; the
+    network's version is then the topology version it was built at.
+    """
+
+    def __init__(self):
+        self._network = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        network = self._network
+        if network is None or network.path != database_target() or \
+                network.version != response_cache.version('topology'):
+            with self._lock:
+                network = self._network
+                if network is not None and network.path != database_target():
+                    response_cache.invalidate('topology')
+                if network is None or network.path != database_target() or \
+                        network.version != response_cache.version('topology'):
+                    network = self._network = RoadNetwork.load()
+        return network
+
+    def reload(self):
+        """Rebuild now, with everything cached on the topology, e.g. after editing the tables."""
+        response_cache.invalidate('topology')
+        return self.get()
+
+# Shared by the controller, the route planner and the API
+road_network = NetworkCache()
@@ -0,0 +1,37 @@
+import array
+
+def split_cycle(demand, offsets, cycle_time, min_green=7, lost_time=4):
+    """Divide every intersection's cycle among its approaches in proportion to demand.
+
+    Webster-style split over a whole network in one pass: demand holds one
+    value per approach (vehicles queued), grouped by intersection, and
+    intersection k owns demand[offsets[k]:offsets[k + 1]]. Each approach loses
+    lost_time seconds (amber + all-red) from the cycle, gets at least
+    min_green, and shares what is left by its fraction of the intersection's
+    demand; with no demand the spare time is shared equally. Shares are
+    rounded with largest remainders so each intersection's greens plus lost
+    time add up to exactly cycle_time.
+
+    Returns an array('i') of green seconds aligned with demand.
+    """
+    cycle_time = int(cycle_time)
+    greens = array.array('i', bytes(4 * len(demand)))
+    for k in range(len(offsets) - 1):
+        lo, hi = offsets[k], offsets[k + 1]
+        n = hi - lo
+        if not n:
+            continue
+        effective = max(cycle_time - n * lost_time, n)  # never below 1 s per approach
+        floor = min(min_green, effective // n)
+        spare = effective - n * floor
+        flows = demand[lo:hi]
+        total = sum(flows)
+        shares = [spare * flow / total for flow in flows] if total > 0 else [spare / n] * n
+        whole = [int(share) for share in shares]
+        leftover = spare - sum(whole)
+        if leftover:
+            for i in sorted(range(n), key=lambda i: whole[i] - shares[i])[:leftover]:
+                whole[i] += 1
+        for i in range(n):
+            greens[lo + i] = floor + whole[i]
+    return greens
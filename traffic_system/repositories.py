@@ -0,0 +1,298 @@
+"""
+Repositories: one per table, holding the SQL the application runs.
+
+Each repository belongs to a Storage (see db.py) and borrows one of its
+pooled connections per call; called inside an outer `storage.connection()`
+block it joins that block's transaction instead. Statements use `?`
+placeholders and SQL that SQLite and PostgreSQL both accept, and take the
+rest from storage.dialect. Bulk operations go through one executemany per
+call.
+"""
+import json
+
+class Repository:
+    def __init__(self, storage):
+        self.storage = storage
+
+    @property
+    def dialect(self):
+        return self.storage.dialect
+
+    def connection(self):
+        return self.storage.connection()
+
+    def _scope(self, intersection_ids):
+        """(WHERE clause, params) limiting a query to some intersections (None: all of them)."""
+        if intersection_ids is None:
+            return "", ()
+        condition, param = self.dialect.in_ids("intersection_id", intersection_ids)
+        return f"WHERE {condition}", (param,)
+
+class IntersectionRepository(Repository):
+    """intersections"""
+
+    def all(self):
+        """(intersection_id, intersection_name, latitude, longitude) rows, by id."""
+        with self.connection() as conn:
+            return conn.execute("""
+                SELECT intersection_id, intersection_name, latitude, longitude
+                FROM intersections ORDER BY intersection_id
+            """).fetchall()
+
+    def ids(self):
+        with self.connection() as conn:
+            return [row[0] for row in conn.execute("SELECT intersection_id FROM intersections ORDER BY intersection_id")]
+
+    def ids_by_position(self):
+        """Intersection ids ordered by latitude, then longitude."""
+        with self.connection() as conn:
+            return [row[0] for row in conn.execute("""
+                SELECT intersection_id FROM intersections
+                ORDER BY COALESCE(latitude, 0), COALESCE(longitude, 0), intersection_id
+            """)]
+
+class RoadRepository(Repository):
+    """roads"""
+
+    def names(self):
+        """{road_id: road_name}"""
+        with self.connection() as conn:
+            return {row[0]: row[1] for row in conn.execute("SELECT road_id, road_name FROM roads")}
+
+class ApproachRepository(Repository):
+    """intersection_roads: which roads meet at each intersection, and from where."""
+
+    def all(self):
+        """(intersection_id, road_id, direction) rows, by intersection then insertion order."""
+        with self.connection() as conn:
+            return conn.execute("""
+                SELECT intersection_id, road_id, direction FROM intersection_roads
+                ORDER BY intersection_id, id
+            """).fetchall()
+
+class TrafficDataRepository(Repository):
+    """traffic_data: the raw sensor readings."""
+
+    def _insert_sql(self):
+        return f"""
+            INSERT INTO traffic_data (intersection_id, road_id, vehicle_count, density_level, rate, timestamp)
+            VALUES (?, ?, ?, ?, ?, COALESCE(?, {self.dialect.now}))
+        """
+
+    def add(self, intersection_id, road_id, vehicle_count, density_level=None, rate=None, timestamp=None):
+        """Insert one reading (timestamped now unless given); returns its id."""
+        with self.connection() as conn:
+            return self.dialect.insert(conn, self._insert_sql(),
+                                       (intersection_id, road_id, vehicle_count, density_level, rate, timestamp))
+
+    def add_many(self, rows):
+        """Insert (intersection_id, road_id, vehicle_count, density_level, rate, timestamp) rows in one batch."""
+        with self.connection() as conn:
+            conn.executemany(self._insert_sql(), rows)
+        return len(rows)
+
+    def since(self, last_id, limit, upto=None):
+        """Up to limit (id, intersection_id, road_id, vehicle_count, timestamp) rows with
+        last_id < id <= upto (no upper bound without upto), in id order."""
+        bound, params = ("AND id <= ?", (last_id, upto, limit)) if upto is not None else ("", (last_id, limit))
+        with self.connection() as conn:
+            return conn.execute(f"""
+                SELECT id, intersection_id, road_id, vehicle_count, timestamp FROM traffic_data
+                WHERE id > ? {bound} ORDER BY id LIMIT ?
+            """, params).fetchall()
+
+    def watermark(self):
+        """Highest id with every reading up to it committed and no lower one still to come.
+
+        Incremental readers (the rollups, the forecaster) stop here rather
+        than at whatever MAX(id) is visible: on a server backend a lower id
+        can commit after a higher one, and would otherwise be skipped.
+        """
+        with self.connection() as conn:
+            self.dialect.settle_writes(conn, "traffic_data")
+            return conn.execute("SELECT COALESCE(MAX(id), 0) FROM traffic_data").fetchone()[0]
+
+    def min_id(self, at_least=0):
+        """Lowest id >= at_least, or None if there is none."""
+        with self.connection() as conn:
+            return conn.execute("SELECT MIN(id) FROM traffic_data WHERE id >= ?", (at_least,)).fetchone()[0]
+
+    def count_between(self, low, high):
+        """Readings with low < id <= high."""
+        with self.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM traffic_data WHERE id > ? AND id <= ?",
+                                (low, high)).fetchone()[0]
+
+    def delete_before(self, low, high, cutoff):
+        """Delete readings with low <= id < high timestamped before cutoff; returns rows deleted."""
+        with self.connection() as conn:
+            return conn.execute("""
+                DELETE FROM traffic_data
+                WHERE id >= ? AND id < ? AND timestamp < ?
+            """, (low, high, cutoff)).rowcount
+
+class LatestReadingRepository(Repository):
+    """traffic_latest: the newest reading per approach, kept current by a trigger on traffic_data."""
+
+    def counts(self, intersection_ids=None):
+        """(intersection_id, road_id, vehicle_count) rows, one per approach."""
+        scope, params = self._scope(intersection_ids)
+        with self.connection() as conn:
+            return conn.execute(
+                f"SELECT intersection_id, road_id, vehicle_count FROM traffic_latest {scope}", params).fetchall()
+
+    def readings(self, intersection_ids=None):
+        """{(intersection_id, road_id): (vehicle_count, density_level, rate)}"""
+        scope, params = self._scope(intersection_ids)
+        with self.connection() as conn:
+            return {(row[0], row[1]): (row[2], row[3], row[4]) for row in conn.execute(
+                f"SELECT intersection_id, road_id, vehicle_count, density_level, rate FROM traffic_latest {scope}",
+                params)}
+
+class RollupRepository(Repository):
+    """traffic_rollup_minute / traffic_rollup_hour, and the traffic_rollup_state cursor between them and traffic_data."""
+
+    def last_id(self):
+        """Highest traffic_data id already folded into the rollups."""
+        with self.connection() as conn:
+            return conn.execute(
+                "SELECT COALESCE(MAX(last_id), 0) FROM traffic_rollup_state WHERE name = 'traffic_data'").fetchone()[0]
+
+    def advance(self, last_id):
+        with self.connection() as conn:
+            conn.execute("UPDATE traffic_rollup_state SET last_id = ? WHERE name = 'traffic_data'", (last_id,))
+
+    def fold(self, table, bucket_format, low, high):
+        """Add readings with low < id <= high into table, bucketed by bucket_format (strftime)."""
+        bucket = self.dialect.bucket(bucket_format, "timestamp")
+        with self.connection() as conn:
+            conn.execute(f"""
+                INSERT INTO {table} (bucket, intersection_id, road_id, samples, total_count, max_count)
+                SELECT {bucket}, intersection_id, road_id,
+                       COUNT(vehicle_count), COALESCE(SUM(vehicle_count), 0), MAX(vehicle_count)
+                FROM traffic_data
+                WHERE id > ? AND id <= ? AND {bucket} IS NOT NULL
+                    AND intersection_id IS NOT NULL AND road_id IS NOT NULL
+                GROUP BY 1, 2, 3
+                ON CONFLICT (intersection_id, road_id, bucket) DO UPDATE SET
+                    samples = {table}.samples + excluded.samples,
+                    total_count = {table}.total_count + excluded.total_count,
+                    max_count = {self.dialect.greatest}(COALESCE({table}.max_count, excluded.max_count),
+                                                        COALESCE(excluded.max_count, {table}.max_count))
+            """, (low, high))
+
+    def expire(self, table, cutoff, limit):
+        """Delete up to about limit rows of buckets before cutoff, whole buckets at a time; returns rows deleted."""
+        with self.connection() as conn:
+            last = conn.execute(f"""
+                SELECT MAX(bucket) FROM (
+                    SELECT bucket FROM {table} WHERE bucket < ? ORDER BY bucket LIMIT ?
+                ) oldest
+            """, (cutoff, limit)).fetchone()[0]
+            if last is None:
+                return 0
+            return conn.execute(f"DELETE FROM {table} WHERE bucket <= ?", (last,)).rowcount
+
+    def history(self, table, start=None, end=None, intersection_id=None, road_id=None):
+        """(bucket, intersection_id, road_id, samples, total_count, max_count) rows, by bucket."""
+        clauses, params = [], []
+        for clause, value in (("intersection_id = ?", intersection_id), ("road_id = ?", road_id),
+                              ("bucket >= ?", start), ("bucket < ?", end)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self.connection() as conn:
+            return conn.execute(f"""
+                SELECT bucket, intersection_id, road_id, samples, total_count, max_count
+                FROM {table} {where}
+                ORDER BY bucket, intersection_id, road_id
+            """, params).fetchall()
+
+class SignalStatusRepository(Repository):
+    """signal_status: the persisted colour and green time of every approach."""
+
+    def load(self):
+        """Every signal with its names and direction, updated_at as epoch seconds (updated_epoch)."""
+        with self.connection() as conn:
+            return conn.execute(f"""
+                SELECT ss.id, ss.intersection_id, ss.road_id, ss.signal_color, ss.green_time,
+                       {self.dialect.epoch('ss.updated_at')} AS updated_epoch,
+                       i.intersection_name, r.road_name, ir.direction
+                FROM signal_status ss
+                JOIN intersections i ON ss.intersection_id = i.intersection_id
+                JOIN roads r ON ss.road_id = r.road_id
+                JOIN intersection_roads ir ON ss.intersection_id = ir.intersection_id AND ss.road_id = ir.road_id
+                ORDER BY ss.intersection_id, ss.road_id
+            """).fetchall()
+
+    def update_many(self, rows):
+        """Write (signal_color, green_time, updated_at, intersection_id, road_id) rows in one batch."""
+        with self.connection() as conn:
+            conn.executemany("""
+                UPDATE signal_status
+                SET signal_color=?, green_time=?, updated_at=?
+                WHERE intersection_id=? AND road_id=?
+            """, rows)
+        return len(rows)
+
+class EmergencyRouteRepository(Repository):
+    """emergency_routes: predefined paths for emergency vehicles."""
+
+    def all(self):
+        """Every route as a dict, path_order decoded."""
+        with self.connection() as conn:
+            routes = [dict(row) for row in conn.execute("SELECT * FROM emergency_routes ORDER BY route_id")]
+        for route in routes:
+            route['path_order'] = json.loads(route['path_order'])
+        return routes
+
+    def paths(self):
+        """{(start_intersection_id, end_intersection_id): path}; the lowest route_id wins a pair."""
+        with self.connection() as conn:
+            return {(row[0], row[1]): json.loads(row[2]) for row in conn.execute("""
+                SELECT start_intersection_id, end_intersection_id, path_order
+                FROM emergency_routes ORDER BY route_id DESC
+            """)}
+
+class EmergencyLogRepository(Repository):
+    """emergency_logs"""
+
+    def open(self, emergency_type, start_intersection=None, end_intersection=None):
+        """Log an ACTIVE emergency, against the predefined route from start to end if there is one; returns its id."""
+        with self.connection() as conn:
+            log_id = None
+            if start_intersection is not None:
+                log_id = self.dialect.insert(conn, """
+                    INSERT INTO emergency_logs (route_id, emergency_type, status)
+                    SELECT route_id, ?, 'ACTIVE'
+                    FROM emergency_routes
+                    WHERE start_intersection_id = ? AND end_intersection_id = ?
+                    ORDER BY route_id LIMIT 1
+                """, (emergency_type, start_intersection, end_intersection))
+            if log_id is None:
+                # Dynamic routes are logged without a route_id
+                log_id = self.dialect.insert(conn, """
+                    INSERT INTO emergency_logs (emergency_type, status)
+                    VALUES (?, 'ACTIVE')
+                """, (emergency_type,))
+            return log_id
+
+    def clear(self, log_ids):
+        """Mark the given logs CLEARED (those still ACTIVE)."""
+        with self.connection() as conn:
+            conn.executemany(f"""
+                UPDATE emergency_logs
+                SET status='CLEARED', cleared_at={self.dialect.now}
+                WHERE id=? AND status='ACTIVE'
+            """, [(log_id,) for log_id in log_ids])
+
+    def active(self):
+        """The most recent ACTIVE emergency log as a dict, or None."""
+        with self.connection() as conn:
+            row = conn.execute("""
+                SELECT * FROM emergency_logs
+                WHERE status='ACTIVE'
+                ORDER BY created_at DESC, id DESC LIMIT 1
+            """).fetchone()
+        return dict(row) if row else None
@@ -0,0 +1,84 @@
+import collections
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+GZIP_MIN_BYTES = 512  # smaller bodies are not worth compressing
+
+class CachedResponse:
+    """One encoded JSON response plus its validator and gzip form."""
+
+    __slots__ = ("version", "body", "gzipped", "etag")
+
+    def __init__(self, version, body):
+        self.version = version
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=6) if len(body) >= GZIP_MIN_BYTES else None
+        self.etag = '"%s"' % hashlib.blake2b(body, digest_size=8).hexdigest()
+
+    @property
+    def size(self):
+        return len(self.body) + (len(self.gzipped) if self.gzipped else 0)
+
+class ResponseCache:
+    """Pre-encoded responses for read-only endpoints, keyed by endpoint.
+
+    Each entry remembers the data version it was built from; a request that
+    arrives with a newer version rebuilds it. Named topics ("topology", ...)
+    give writers a counter to bump when the tables behind an endpoint change.
+    Entries are evicted least-recently-used once max_bytes is exceeded.
+    """
+
+    def __init__(self, max_bytes=8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._topics = collections.Counter()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def version(self, topic):
+        """Current version of a topic (0 until someone invalidates it)."""
+        return self._topics[topic]
+
+    def invalidate(self, topic):
+        """Bump a topic so every endpoint keyed on it is rebuilt on next read."""
+        with self._lock:
+            self._topics[topic] += 1
+
+    def get(self, key, version, builder):
+        """Return the CachedResponse for key at version, calling builder() on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.version == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Build outside the lock so a slow query never stalls other endpoints
+        entry = CachedResponse(version, json.dumps(builder()).encode())
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[key] = entry
+            self._bytes += entry.size
+            self._evict()
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+
+# Shared by the HTTP handlers; writers call response_cache.invalidate(topic)
+response_cache = ResponseCache(int(os.environ.get("RESPONSE_CACHE_BYTES", 8 * 1024 * 1024)))
@@ -0,0 +1,142 @@
+import calendar
+import os
+import threading
+import time
+from .db import get_storage
+
+RAW_RETENTION_HOURS = float(os.environ.get("TRAFFIC_RAW_RETENTION_HOURS", 24))
+MINUTE_RETENTION_DAYS = float(os.environ.get("TRAFFIC_MINUTE_RETENTION_DAYS", 7))
+HOUR_RETENTION_DAYS = float(os.environ.get("TRAFFIC_HOUR_RETENTION_DAYS", 365))
+RETENTION_INTERVAL = float(os.environ.get("RETENTION_INTERVAL", 60))
+
+# resolution -> (rollup table, strftime bucket format)
+RESOLUTIONS = {
+    'minute': ('traffic_rollup_minute', '%Y-%m-%d %H:%M:00'),
+    'hour': ('traffic_rollup_hour', '%Y-%m-%d %H:00:00'),
+}
+
+def _before(now, seconds):
+    """The 'YYYY-MM-DD HH:MM:SS' (UTC) timestamp seconds before now ('now' or a timestamp in that form)."""
+    at = time.time() if now == 'now' else calendar.timegm(time.strptime(now, '%Y-%m-%d %H:%M:%S'))
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(at - seconds))
+
+class RetentionManager:
+    """Rolls traffic_data up into per-minute/per-hour aggregates and expires old rows.
+
+    Raw readings are folded into the rollup tables incrementally, in id order
+    up to the traffic_data watermark (so no reading can commit behind it),
+    with traffic_rollup_state remembering how far it got. Rolled-up raw rows
+    older than raw_retention_hours are then deleted, and rollup buckets past
+    their own retention are dropped. All work happens in transactions of at
+    most batch_size rows so ingestion is never locked out for long.
+    """
+
+    def __init__(self, raw_retention_hours=RAW_RETENTION_HOURS, minute_retention_days=MINUTE_RETENTION_DAYS,
+                 hour_retention_days=HOUR_RETENTION_DAYS, interval=RETENTION_INTERVAL, batch_size=5000):
+        self.raw_retention_hours = raw_retention_hours
+        self.minute_retention_days = minute_retention_days
+        self.hour_retention_days = hour_retention_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stop = threading.Event()
+        self._thread = None
+
+    def rollup(self):
+        """Fold every raw reading not yet rolled up into both rollup tables; returns rows read."""
+        storage = get_storage()
+        high = storage.traffic_data.watermark()
+        rolled = 0
+        while True:
+            with storage.connection():
+                low = storage.rollups.last_id()
+                if low >= high:
+                    return rolled
+                upto = min(low + self.batch_size, high)
+                for table, bucket in RESOLUTIONS.values():
+                    storage.rollups.fold(table, bucket, low, upto)
+                rolled += storage.traffic_data.count_between(low, upto)
+                storage.rollups.advance(upto)
+
+    def expire_raw(self, now='now'):
+        """Delete rolled-up raw readings older than the raw retention window; returns rows deleted.
+
+        Walks traffic_data in id (arrival) order one id window at a time and
+        stops at the first window with nothing left to expire.
+        """
+        storage = get_storage()
+        cutoff = _before(now, self.raw_retention_hours * 3600)
+        with storage.connection():
+            low = storage.traffic_data.min_id()
+            rolled = storage.rollups.last_id()
+        deleted = 0
+        while low is not None and low <= rolled:
+            upto = min(low + self.batch_size, rolled + 1)
+            count = storage.traffic_data.delete_before(low, upto, cutoff)
+            if not count:
+                break
+            deleted += count
+            low = storage.traffic_data.min_id(upto)
+        return deleted
+
+    def expire_rollups(self, now='now'):
+        """Drop rollup buckets past their retention; returns rows deleted."""
+        rollups = get_storage().rollups
+        deleted = 0
+        for resolution, days in (('minute', self.minute_retention_days), ('hour', self.hour_retention_days)):
+            table = RESOLUTIONS[resolution][0]
+            cutoff = _before(now, days * 86400)
+            # Up to batch_size rows per transaction, a range of whole buckets at a time
+            while True:
+                count = rollups.expire(table, cutoff, self.batch_size)
+                if not count:
+                    break
+                deleted += count
+        return deleted
+
+    def run_once(self, now='now'):
+        """One full maintenance pass; returns counts of rows rolled up and deleted."""
+        return {
+            "rolled_up": self.rollup(),
+            "raw_deleted": self.expire_raw(now),
+            "rollups_deleted": self.expire_rollups(now),
+        }
+
+    def start(self):
+        """Run maintenance every interval seconds on a daemon thread."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                started = time.monotonic()
+                result = self.run_once()
+                if result["raw_deleted"] or result["rollups_deleted"]:
+                    print(f"Retention pass in {time.monotonic() - started:.2f}s: {result}")
+            except Exception as e:
+                print(f"Retention pass failed: {e}")
+
+def get_traffic_history(resolution='hour', start=None, end=None, intersection_id=None, road_id=None):
+    """Aggregated vehicle counts per (bucket, intersection, road) from the rollup tables.
+
+    start/end bound the bucket timestamps (inclusive start, exclusive end) in
+    the 'YYYY-MM-DD HH:MM:SS' form SQLite uses. Readings arriving since the
+    last retention pass are not included yet.
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"resolution must be one of {', '.join(RESOLUTIONS)}")
+    rows = get_storage().rollups.history(RESOLUTIONS[resolution][0], start, end, intersection_id, road_id)
+    return [{"bucket": bucket, "intersection_id": iid, "road_id": rid, "samples": samples,
+             "mean_count": round(total / samples, 2) if samples else None, "max_count": max_count}
+            for bucket, iid, rid, samples, total, max_count in rows]
+
+# Shared maintenance worker started by the server
+retention = RetentionManager()
@@ -0,0 +1,89 @@
+import collections
+import heapq
+import math
+import threading
+from .db import get_storage
+from .network import haversine, road_network
+
+class RoutePlanner:
+    """Emergency route lookup over the shared RoadNetwork.
+
+    A* runs directly over the network's CSR adjacency arrays, with
+    haversine distance to the goal as the heuristic. Predefined
+    emergency_routes win when they exist. Computed paths are kept in an LRU
+    cache, and everything is rebuilt when the network is (i.e. when the
+    response cache's 'topology' topic is invalidated).
+    """
+
+    def __init__(self, cache_size=1024):
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._network = None
+        self._predefined = {}
+        self._paths = collections.OrderedDict()
+
+    def load(self, network=None):
+        """(Re)load the route index against the current network."""
+        network = network or road_network.get()
+        predefined = get_storage().emergency_routes.paths()  # lowest route_id wins, like the old linear scan
+
+        with self._lock:
+            self._predefined = predefined
+            self._paths.clear()
+            self._network = network
+
+    def route(self, start, end):
+        """Intersection ids from start to end, or None if they are not connected."""
+        network = road_network.get()
+        if self._network is not network:
+            self.load(network)
+        key = (start, end)
+        with self._lock:
+            if key in self._predefined:
+                return list(self._predefined[key])
+            if key in self._paths:
+                self._paths.move_to_end(key)
+                path = self._paths[key]
+                return list(path) if path is not None else None
+
+        path = self._astar(network, start, end)
+        with self._lock:
+            self._paths[key] = path
+            if len(self._paths) > self.cache_size:
+                self._paths.popitem(last=False)
+        return list(path) if path is not None else None
+
+    @staticmethod
+    def _astar(network, start, end):
+        source, target = network.index.get(start), network.index.get(end)
+        if source is None or target is None:
+            return None
+        lat, lon = network.latitude, network.longitude
+        offsets, targets, weights = network.adj_offsets, network.adj_targets, network.adj_weights
+        goal = (lat[target], lon[target])
+        best = {source: 0.0}
+        came_from = {}
+        frontier = [(haversine((lat[source], lon[source]), goal), 0.0, source)]
+        while frontier:
+            _, cost, node = heapq.heappop(frontier)
+            if node == target:
+                path = [node]
+                while node in came_from:
+                    node = came_from[node]
+                    path.append(node)
+                ids = network.intersections
+                return [ids[i].intersection_id for i in reversed(path)]
+            if cost > best[node]:
+                continue
+            for edge in range(offsets[node], offsets[node + 1]):
+                neighbour = targets[edge]
+                candidate = cost + weights[edge]
+                if candidate < best.get(neighbour, math.inf):
+                    best[neighbour] = candidate
+                    came_from[neighbour] = node
+                    heapq.heappush(frontier, (candidate + haversine((lat[neighbour], lon[neighbour]), goal),
+                                              candidate, neighbour))
+        return None
+
+# Shared planner used by the emergency handler
+planner = RoutePlanner()
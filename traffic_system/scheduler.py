@@ -1,26 +1,278 @@
+import heapq
+import itertools
 import threading
 import time
-from .traffic_controller import start_traffic_controller
+from concurrent.futures import ThreadPoolExecutor
 
-# Critical Section Lock
-lock = threading.Lock()
+class IntersectionLocks:
+    """Striped per-intersection locks.
 
-def wait(seconds):
-    """Simulate waiting / sleep time"""
-    time.sleep(seconds)
+    Intersection ids hash onto a fixed set of locks, so work on different
+    intersections (a zone's cycle, a corridor phase) runs concurrently while
+    two writers of the same intersection take turns. hold() always acquires
+    stripes in ascending order, so holding several at once cannot deadlock.
+    """
+
+    def __init__(self, stripes=64):
+        self._locks = [threading.RLock() for _ in range(stripes)]
+
+    def _stripes(self, intersection_ids):
+        if intersection_ids is None:
+            return range(len(self._locks))  # the whole city
+        return sorted({iid % len(self._locks) for iid in intersection_ids})
+
+    def hold(self, intersection_ids=None):
+        """Context manager holding the locks of the given intersections (None: all of them)."""
+        return _Held([self._locks[stripe] for stripe in self._stripes(intersection_ids)])
+
+class _Held:
+    __slots__ = ("locks",)
+
+    def __init__(self, locks):
+        self.locks = locks
+
+    def __enter__(self):
+        for lock in self.locks:
+            lock.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        for lock in reversed(self.locks):
+            lock.release()
+        return False
 
-def critical_section(func, *args, **kwargs):
+# Shared by the controller's cycles and the corridor engine
+intersection_locks = IntersectionLocks()
+
+def check_cycle_time(cycle_time):
+    """cycle_time itself if it is a usable period (a positive, finite number of seconds); else ValueError."""
+    if isinstance(cycle_time, bool) or not isinstance(cycle_time, (int, float)) \
+            or not 0 < cycle_time < float('inf'):
+        raise ValueError(f"cycle_time must be a positive number of seconds, got {cycle_time!r}")
+    return cycle_time
+
+class Zone:
+    """A group of intersections cycled together on its own period."""
+
+    def __init__(self, name, intersection_ids, cycle_time):
+        self.name = name
+        self.intersection_ids = None if intersection_ids is None else sorted(set(intersection_ids))
+        self.cycle_time = cycle_time
+        self.paused = False
+        self.running = False
+        self.due = None
+        self.generation = 0  # bumped on reschedule so stale heap entries are ignored
+        self.runs = 0
+        self.skipped = 0  # deadlines missed because the previous run overran
+        self.paused_skips = 0  # deadlines passed while paused
+        self.last_duration = None
+        self.max_duration = 0.0
+        self.last_lateness = None  # seconds between the deadline and the run actually starting
+        self.max_lateness = 0.0
+
+    def to_dict(self):
+        return {
+            "zone": self.name,
+            "intersections": len(self.intersection_ids) if self.intersection_ids is not None else None,
+            "cycle_time": self.cycle_time,
+            "paused": self.paused,
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "paused_skips": self.paused_skips,
+            "last_duration": self.last_duration,
+            "max_duration": round(self.max_duration, 4),
+            "last_lateness": self.last_lateness,
+            "max_lateness": round(self.max_lateness, 4),
+        }
+
+class CycleScheduler:
+    """Runs each zone's signal cycle on fixed monotonic deadlines.
+
+    One dispatcher thread sleeps until the earliest deadline and hands the
+    zone to a small worker pool, so a slow zone never delays another. The
+    next deadline is always the previous one plus cycle_time, so the period
+    does not drift with the cycle's own duration; if a run is still going
+    (or the dispatcher fell behind) the missed deadlines are skipped and
+    counted rather than run back to back. Pausing keeps the thread and the
+    cadence alive and only suppresses the runs.
+
+    task(intersection_ids, cycle_time) does the work; intersection_ids is
+    None for a zone covering the rest of the city.
     """
-    Simulate entering critical section with locking
+
+    def __init__(self, task, workers=4, clock=time.monotonic):
+        self.task = task
+        self.clock = clock
+        self.workers = workers
+        self._zones = {}
+        self._heap = []  # (due, seq, zone name, generation)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._executor = None
+        self._stopping = False
+
+    def add_zone(self, name, intersection_ids, cycle_time, start_now=True):
+        """Add or replace a zone; it first runs now (or one cycle_time from now)."""
+        check_cycle_time(cycle_time)
+        with self._cond:
+            zone = Zone(name, intersection_ids, cycle_time)
+            old = self._zones.get(name)
+            if old is not None:
+                zone.generation = old.generation + 1
+                zone.paused = old.paused
+            self._zones[name] = zone
+            self._schedule(zone, self.clock() + (0 if start_now else cycle_time))
+        return zone
+
+    def remove_zone(self, name):
+        with self._cond:
+            zone = self._zones.pop(name, None)
+            if zone is not None:
+                zone.generation += 1
+            self._cond.notify()
+
+    def set_cycle_time(self, name, cycle_time):
+        """Change a zone's period; the new cadence starts from its next deadline."""
+        check_cycle_time(cycle_time)
+        with self._cond:
+            self._zones[name].cycle_time = cycle_time
+
+    def zones(self):
+        with self._cond:
+            return dict(self._zones)
+
+    def pause(self, name=None):
+        """Stop running one zone (or all); deadlines keep ticking while paused."""
+        with self._cond:
+            for zone in self._select(name):
+                zone.paused = True
+
+    def resume(self, name=None, run_now=True):
+        """Resume one zone (or all), by default running it straight away."""
+        with self._cond:
+            for zone in self._select(name):
+                if zone.paused:
+                    zone.paused = False
+                    if run_now:
+                        zone.generation += 1
+                        self._schedule(zone, self.clock())
+
+    def start(self):
+        with self._cond:
+            self._stopping = False
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="signal-cycle")
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="cycle-scheduler", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self, wait=True):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+            thread, executor = self._thread, self._executor
+            self._thread = self._executor = None
+        if thread is not None and wait:
+            thread.join(timeout=5)
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def stats(self):
+        with self._cond:
+            return [zone.to_dict() for zone in self._zones.values()]
+
+    def _select(self, name):
+        return list(self._zones.values()) if name is None else [self._zones[name]]
+
+    def _schedule(self, zone, due):
+        zone.due = due
+        heapq.heappush(self._heap, (due, next(self._seq), zone.name, zone.generation))
+        self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopping:
+                        return
+                    if self._heap:
+                        due, _, name, generation = self._heap[0]
+                        zone = self._zones.get(name)
+                        if zone is None or zone.generation != generation:
+                            heapq.heappop(self._heap)  # removed or rescheduled since
+                            continue
+                        delay = due - self.clock()
+                        if delay <= 0:
+                            heapq.heappop(self._heap)
+                            break
+                        self._cond.wait(delay)
+                    else:
+                        self._cond.wait()
+
+                now = self.clock()
+                # Next deadline on the original grid; deadlines already behind us are skipped
+                missed = int((now - due) // zone.cycle_time)
+                self._schedule(zone, due + (missed + 1) * zone.cycle_time)
+                if zone.paused:
+                    zone.paused_skips += 1 + missed
+                    continue
+                if zone.running:
+                    zone.skipped += 1 + missed
+                    continue
+                zone.skipped += missed
+                zone.running = True
+                executor = self._executor
+            try:
+                executor.submit(self._execute, zone, due, now)
+            except RuntimeError:
+                return  # stopped while dispatching
+
+    def _execute(self, zone, due, started):
+        lateness = started - due
+        try:
+            began = self.clock()
+            self.task(zone.intersection_ids, zone.cycle_time)
+            duration = self.clock() - began
+        except Exception as e:
+            duration = None
+            print(f"Signal cycle for zone {zone.name} failed: {e}")
+        with self._cond:
+            zone.running = False
+            zone.runs += 1
+            zone.last_lateness = round(lateness, 4)
+            zone.max_lateness = max(zone.max_lateness, lateness)
+            if duration is not None:
+                zone.last_duration = round(duration, 4)
+                zone.max_duration = max(zone.max_duration, duration)
+
+def wait(seconds):
+    """Sleep until `seconds` from now on the monotonic clock, resuming after spurious early wake-ups."""
+    deadline = time.monotonic() + seconds
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        time.sleep(remaining)
+
+def critical_section(func, *args, intersections=None, **kwargs):
+    """Run func while holding the locks of the given intersections (None: every intersection).
+
+    Kept for the old module-level helper's callers; new code should use
+    intersection_locks.hold() around just the intersections it touches.
     """
-    with lock:
-        result = func(*args, **kwargs)
-    return result
+    with intersection_locks.hold(intersections):
+        return func(*args, **kwargs)
 
 def start_scheduler():
     """Start the traffic scheduling system."""
-    controller = start_traffic_controller()
-    return controller
+    from .traffic_controller import start_traffic_controller
+    return start_traffic_controller()
 
 def stop_scheduler():
     """Stop the traffic scheduling system."""
@@ -0,0 +1,188 @@
+import collections
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from .db import database_path, get_storage
+from .scheduler import intersection_locks
+
+SHARDS = int(os.environ.get("CONTROLLER_SHARDS", 1))
+
+def partition(shards):
+    """Split intersections into `shards` spatially contiguous zones.
+
+    Intersections are ordered by latitude, then longitude, and cut into
+    equal-sized bands, so a route tends to stay within one or two zones.
+    Returns a list of intersection-id lists, one per zone.
+    """
+    ids = get_storage().intersections.ids_by_position()
+    shards = max(1, min(shards, len(ids)))
+    size, extra = divmod(len(ids), shards)
+    zones, start = [], 0
+    for shard in range(shards):
+        end = start + size + (shard < extra)
+        zones.append(ids[start:end])
+        start = end
+    return zones
+
+def _shard_worker(shard, zone, db_path, cycle_time, debounce_time, commands, results):
+    """Worker process: plan one zone every cycle_time, and its dirty intersections on demand.
+
+    Reads only; plans are sent to the coordinator as (shard, updates, seconds).
+    Commands: ('dirty', ids), ('hold', ids), ('release', ids), ('stop', None).
+    """
+    os.environ["TRAFFIC_DB_PATH"] = db_path
+    from .traffic_controller import TrafficController
+    planner = TrafficController()
+    planner.cycle_time = cycle_time
+    zone = set(zone)
+    held = collections.Counter()
+    dirty = set()
+    dirty_due = None
+    next_cycle = time.monotonic()
+
+    def plan(ids):
+        ids = [iid for iid in ids if not held[iid]]
+        if ids:
+            started = time.perf_counter()
+            updates = planner.plan_signals(ids)
+            results.put((shard, updates, time.perf_counter() - started))
+
+    while True:
+        now = time.monotonic()
+        if now >= next_cycle:
+            plan(zone)
+            dirty.clear()
+            dirty_due = None
+            # Schedule from the previous deadline so cycles do not drift; skip any we overran
+            next_cycle += cycle_time * max(1, int((now - next_cycle) // cycle_time) + 1)
+        elif dirty_due is not None and now >= dirty_due:
+            plan(dirty)
+            dirty.clear()
+            dirty_due = None
+
+        wake = next_cycle if dirty_due is None else min(next_cycle, dirty_due)
+        try:
+            command, ids = commands.get(timeout=max(0.0, wake - time.monotonic()))
+        except queue.Empty:
+            continue
+        if command == 'stop':
+            return
+        if command == 'dirty':
+            dirty.update(iid for iid in ids if iid in zone)
+            if dirty and dirty_due is None:
+                dirty_due = time.monotonic() + debounce_time
+        elif command == 'hold':
+            held.update(ids)
+        elif command == 'release':
+            held.subtract(ids)
+
+class ShardPool:
+    """Runs the signal cycle as one worker process per zone.
+
+    Each worker plans its own zone on its own schedule and connection, so
+    signal computation spreads across cores and a slow zone only delays
+    itself. The coordinator (this object, in the server process) stays the
+    single writer: a receiver thread applies each plan to the controller's
+    signal store, skipping intersections held by an emergency corridor.
+    Dirty marks and corridor holds are routed to the workers owning the
+    intersections, so a corridor crossing zones holds each part in its own
+    shard while the rest of the city keeps cycling.
+    """
+
+    def __init__(self, controller, shards=SHARDS):
+        self.controller = controller
+        self.shards = shards
+        self.zones = []
+        self.owner = {}  # intersection_id -> shard
+        self.stats = []  # per shard: {"plans", "last_plan_s", "last_plan_at"}
+        self._held = collections.Counter()
+        self._lock = threading.Lock()
+        self._processes = []
+        self._commands = []
+        self._results = None
+        self._receiver = None
+
+    def start(self):
+        context = multiprocessing.get_context("spawn")  # the server process is full of threads
+        self.zones = partition(self.shards)
+        self.owner = {iid: shard for shard, zone in enumerate(self.zones) for iid in zone}
+        self.stats = [{"intersections": len(zone), "plans": 0, "last_plan_s": None, "last_plan_at": None}
+                      for zone in self.zones]
+        self._results = context.Queue()
+        for shard, zone in enumerate(self.zones):
+            commands = context.Queue()
+            process = context.Process(
+                target=_shard_worker, name=f"signal-shard-{shard}", daemon=True,
+                args=(shard, zone, database_path(), self.controller.cycle_time,
+                      self.controller.debounce_time, commands, self._results))
+            process.start()
+            self._commands.append(commands)
+            self._processes.append(process)
+        self._receiver = threading.Thread(target=self._receive, name="shard-receiver", daemon=True)
+        self._receiver.start()
+        return self
+
+    def mark_dirty(self, intersection_ids):
+        self._route('dirty', intersection_ids)
+
+    def hold(self, intersection_ids):
+        """Stop cycling these intersections (e.g. along a corridor) until released."""
+        with self._lock:
+            self._held.update(intersection_ids)
+        self._route('hold', intersection_ids)
+
+    def release(self, intersection_ids):
+        with self._lock:
+            self._held.subtract(intersection_ids)
+            self._held = +self._held
+        self._route('release', intersection_ids)
+        self._route('dirty', intersection_ids)  # replan them now rather than at the next cycle
+
+    def stop(self):
+        for commands in self._commands:
+            commands.put(('stop', None))
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        if self._results is not None:
+            self._results.put(None)
+            self._receiver.join(timeout=5)
+        self._processes, self._commands = [], []
+
+    def _route(self, command, intersection_ids):
+        by_shard = collections.defaultdict(list)
+        for iid in intersection_ids:
+            shard = self.owner.get(iid)
+            if shard is not None:
+                by_shard[shard].append(iid)
+        for shard, ids in by_shard.items():
+            self._commands[shard].put((command, ids))
+
+    def _receive(self):
+        while True:
+            message = self._results.get()
+            if message is None:
+                return
+            shard, updates, seconds = message
+            with self._lock:
+                stats = self.stats[shard]
+                stats["plans"] += 1
+                stats["last_plan_s"] = round(seconds, 4)
+                stats["last_plan_at"] = time.time()
+            try:
+                with intersection_locks.hold({u[0] for u in updates}):
+                    # A plan made before a hold arrived must not override the corridor. Read under
+                    # the locks, as update_signal_logic does: a corridor claims before it takes them
+                    claimed = self.controller.corridors.claimed
+                    with self._lock:
+                        updates = [u for u in updates if u[0] not in claimed and not self._held[u[0]]]
+                    self.controller.signals.apply(updates)
+            except Exception as e:
+                print(f"Applying shard {shard} plan failed: {e}")
+            try:
+                self.controller.refresh_offsets()  # zone plans cannot see whole arterials
+            except Exception as e:
+                print(f"Refreshing green-wave offsets failed: {e}")
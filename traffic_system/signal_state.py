@@ -0,0 +1,191 @@
+import array
+import threading
+import time
+from .db import database_target, get_storage
+
+COLORS = ('RED', 'YELLOW', 'GREEN')
+COLOR_CODES = {color: code for code, color in enumerate(COLORS)}
+
+def _format_timestamp(ts):
+    # Same format SQLite's CURRENT_TIMESTAMP produces (UTC)
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(ts))
+
+class SignalStateStore:
+    """Authoritative in-memory copy of signal_status with write-behind persistence.
+
+    Each (intersection, road) signal owns one slot in a set of parallel arrays
+    (colour code, green time, last change). Reads are served from memory; every
+    change marks its slot dirty and a background writer flushes dirty slots to
+    signal_status in one executemany every flush_interval seconds.
+    """
+
+    def __init__(self, flush_interval=0.5):
+        self.flush_interval = flush_interval
+        self.version = 0  # bumped on every change, for cheap "has anything moved" checks
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._slots = {}  # (intersection_id, road_id) -> slot
+        self._by_intersection = {}  # intersection_id -> [slot, ...]
+        self._keys = []
+        self._meta = []  # per slot: (id, intersection_name, road_name, direction)
+        self._colors = bytearray()
+        self._green_times = array.array('i')
+        self._updated_at = array.array('d')
+        self._dirty = set()
+        self._writer = None
+        self._stop = threading.Event()  # set by close() to end the write-behind thread
+        self.listeners = []  # called with a list of changed signals, in change order
+        self.path = None  # database the state was loaded from and flushes to
+
+    def load(self):
+        """(Re)load every signal from the database, discarding unflushed changes."""
+        self.path = database_target()
+        rows = get_storage(self.path).signal_status.load()
+
+        now = time.time()  # for rows without a parseable updated_at
+        with self._lock:
+            self._slots, self._by_intersection, self._keys, self._meta = {}, {}, [], []
+            self._colors = bytearray(len(rows))
+            self._green_times = array.array('i', bytes(4 * len(rows)))
+            self._updated_at = array.array('d', bytes(8 * len(rows)))
+            for slot, row in enumerate(rows):
+                key = (row['intersection_id'], row['road_id'])
+                self._slots[key] = slot
+                self._by_intersection.setdefault(key[0], []).append(slot)
+                self._keys.append(key)
+                self._meta.append((row['id'], row['intersection_name'], row['road_name'], row['direction']))
+                self._colors[slot] = COLOR_CODES.get(row['signal_color'], 0)
+                self._green_times[slot] = row['green_time'] or 0
+                self._updated_at[slot] = row['updated_epoch'] if row['updated_epoch'] is not None else now
+            self._dirty.clear()
+            self._loaded = True
+            self.version += 1
+
+    def ensure_loaded(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self.load()
+
+    def get(self, intersection_id, road_id):
+        """Return (colour, green_time) for one signal, or None if it does not exist."""
+        self.ensure_loaded()
+        with self._lock:
+            slot = self._slots.get((intersection_id, road_id))
+            if slot is None:
+                return None
+            return COLORS[self._colors[slot]], self._green_times[slot]
+
+    def colors(self, intersection_id):
+        """Set of colours currently shown at an intersection."""
+        self.ensure_loaded()
+        with self._lock:
+            return {COLORS[self._colors[slot]] for slot in self._by_intersection.get(intersection_id, ())}
+
+    def apply(self, updates):
+        """Apply (intersection_id, road_id, colour, green_time) updates; returns how many changed."""
+        self.ensure_loaded()
+        now = time.time()
+        with self._lock:
+            changed = []
+            for intersection_id, road_id, color, green_time in updates:
+                slot = self._slots.get((intersection_id, road_id))
+                if slot is not None and self._set_slot(slot, COLOR_CODES[color], green_time, now):
+                    changed.append(slot)
+            self._after_change(changed)
+        return len(changed)
+
+    def set_intersection(self, intersection_id, color, green_time):
+        """Set every approach of one intersection; returns how many signals changed."""
+        self.ensure_loaded()
+        now = time.time()
+        with self._lock:
+            changed = [slot for slot in self._by_intersection.get(intersection_id, ())
+                       if self._set_slot(slot, COLOR_CODES[color], green_time, now)]
+            self._after_change(changed)
+        return len(changed)
+
+    def set_all(self, color, green_time):
+        """Set every signal in the city; returns how many changed."""
+        self.ensure_loaded()
+        now = time.time()
+        with self._lock:
+            changed = [slot for slot in range(len(self._keys))
+                       if self._set_slot(slot, COLOR_CODES[color], green_time, now)]
+            self._after_change(changed)
+        return len(changed)
+
+    def snapshot(self):
+        """All signals as dicts shaped like a signal_status row joined with its names."""
+        self.ensure_loaded()
+        with self._lock:
+            return [{
+                "id": meta[0],
+                "intersection_id": key[0],
+                "road_id": key[1],
+                "signal_color": COLORS[self._colors[slot]],
+                "green_time": self._green_times[slot],
+                "updated_at": _format_timestamp(self._updated_at[slot]),
+                "intersection_name": meta[1],
+                "road_name": meta[2],
+                "direction": meta[3],
+            } for slot, (key, meta) in enumerate(zip(self._keys, self._meta))]
+
+    def flush(self):
+        """Write every dirty signal to signal_status now; returns the number of rows written."""
+        with self._lock:
+            if not self._dirty:
+                return 0
+            slots, self._dirty = sorted(self._dirty), set()
+            rows = [(COLORS[self._colors[s]], self._green_times[s], _format_timestamp(self._updated_at[s]),
+                     self._keys[s][0], self._keys[s][1]) for s in slots]
+        try:
+            get_storage(self.path).signal_status.update_many(rows)
+        except Exception:
+            with self._lock:
+                self._dirty.update(slots)  # retry on the next flush
+            raise
+        return len(rows)
+
+    def _set_slot(self, slot, code, green_time, now):
+        green_time = int(green_time)
+        if self._colors[slot] == code and self._green_times[slot] == green_time:
+            return False
+        self._colors[slot] = code
+        self._green_times[slot] = green_time
+        self._updated_at[slot] = now
+        self._dirty.add(slot)
+        return True
+
+    def _after_change(self, changed):
+        if not changed:
+            return
+        self.version += 1
+        if self.listeners:
+            deltas = [{
+                "intersection_id": self._keys[slot][0],
+                "road_id": self._keys[slot][1],
+                "signal_color": COLORS[self._colors[slot]],
+                "green_time": self._green_times[slot],
+            } for slot in changed]
+            for listener in self.listeners:
+                listener(deltas)
+        if self._writer is None or not self._writer.is_alive():
+            self._stop.clear()
+            self._writer = threading.Thread(target=self._write_behind, name="signal-writer", daemon=True)
+            self._writer.start()
+
+    def close(self):
+        """Stop the write-behind thread and flush what it had left; a later change restarts it."""
+        self._stop.set()
+        writer = self._writer
+        if writer is not None and writer is not threading.current_thread():
+            writer.join(timeout=5)
+        return self.flush()
+
+    def _write_behind(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Signal state flush failed: {e}")
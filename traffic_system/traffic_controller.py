@@ -1,18 +1,71 @@
-from .db import get_connection
-import time
+from .db import get_storage
+from .corridor import CorridorEngine
+from .signal_state import SignalStateStore
+from .events import event_hub
+from .phase_split import split_cycle
+from .metrics import SIGNAL_CYCLE_SECONDS, SIGNALS_CHANGED, TRAFFIC_DATA_SECONDS, timed
+from .scheduler import CycleScheduler, check_cycle_time, intersection_locks
+from .network import road_network
+from .coordination import CoordinationEngine
+from .controller_state import INITIAL_STATE, CommandQueue, EmergencyHandle
+import array
+import json
+import os
 import threading
+import time
 
 class TrafficController:
     def __init__(self):
         self.cycle_time = 60  # seconds for full cycle
         self.green_time_per_direction = 15  # seconds green per direction
-        self.is_emergency_active = False
-        self.emergency_route = None
-        self.scheduler_thread = None
-        self.emergency_thread = None
+        self.min_green_time = 7  # seconds every approach gets per cycle, however quiet
+        self.lost_time_per_phase = 4  # amber + all-red seconds lost at each phase change
+        # Emergency state: readers take the immutable snapshot in self.state, and
+        # only the command thread replaces it
+        self._state = INITIAL_STATE
+        self.commands = CommandQueue()
+        self.corridor_green_time = 20  # seconds each corridor intersection stays green
+        self.emergency_hold_time = 120  # seconds before a finished corridor auto-clears
+        self.events = event_hub  # feed behind /api/stream
+        self.signals = SignalStateStore()  # live signal colours; reads never touch the database
+        self.signals.listeners.append(lambda deltas: self.events.publish('signals', deltas))
+        self.corridors = CorridorEngine(self.signals, on_finish=self._on_corridor_finished,
+                                        on_claim=self._on_corridor_claim, on_release=self._on_corridor_release)
+        self.debounce_time = 0.25  # seconds to coalesce traffic updates before recomputing
+        self._dirty = set()
+        self._dirty_lock = threading.Lock()
+        self._flush_timer = None
+        self._closed = False  # set by close(); no more debounced recomputes are started
+        self.shard_count = int(os.environ.get("CONTROLLER_SHARDS", 1))  # >1 runs cycles in worker processes
+        self.shards = None  # ShardPool while sharded scheduling is running
+        self.scheduler = CycleScheduler(self._run_zone_cycle)
+        # Zones with their own cycle length, e.g. {"downtown": {"intersections": [1, 2], "cycle_time": 90}};
+        # every other intersection runs in the "city" zone on cycle_time
+        self.zone_config = json.loads(os.environ.get("SIGNAL_ZONES") or "{}")
+        # Demand is blended with the forecast for mid-cycle by this weight (0 = current counts only)
+        self.forecast_weight = float(os.environ.get("FORECAST_WEIGHT", 0))
+        self.forecaster = None  # DemandForecaster; the shared one unless set
+        # Advisory green-wave offsets along arterials, refreshed by full-city plans
+        # and, at most once per cycle_time, after zone and shard plans
+        self.coordination = CoordinationEngine()
+        self.green_wave = os.environ.get("GREEN_WAVE", "1") != "0"
+        self._offsets_due = 0.0  # monotonic time the offsets are next refreshed from zone plans
+
+    @property
+    def state(self):
+        """Current ControllerState snapshot; never blocks."""
+        return self._state
+
+    @property
+    def is_emergency_active(self):
+        return self._state.emergency_active
+
+    @property
+    def emergency_route(self):
+        return self._state.emergency_route
 
     def calculate_green_time(self, vehicle_count):
-        """Calculate green time based on traffic density."""
+        """Legacy single-road green time; the cycle itself now uses split_cycle."""
         if vehicle_count <= 5:
             return 10
         elif vehicle_count <= 15:
@@ -21,171 +74,361 @@ class TrafficController:
             return 30
 
     def get_traffic_data(self):
-        """Get current traffic data for all intersections."""
-        conn = get_connection()
-        cur = conn.cursor(dictionary=True)
-
-        cur.execute("""
-            SELECT i.intersection_id, i.intersection_name,
-                   ir.road_id, r.road_name, ir.direction,
-                   COALESCE(td.vehicle_count, 0) as vehicle_count,
-                   COALESCE(td.density_level, 'LOW') as density_level
-            FROM intersections i
-            JOIN intersection_roads ir ON i.intersection_id = ir.intersection_id
-            JOIN roads r ON ir.road_id = r.road_id
-            LEFT JOIN traffic_data td ON i.intersection_id = td.intersection_id
-                AND ir.road_id = td.road_id
-            ORDER BY i.intersection_id, ir.direction
-        """)
-
-        traffic_data = cur.fetchall()
-        conn.close()
-        return traffic_data
-
-    def update_signal_logic(self):
-        """Update signals based on traffic priority (normal operation)."""
-        if self.is_emergency_active:
-            return  # Don't update during emergency
-
-        traffic_data = self.get_traffic_data()
-
-        # Group by intersection
-        intersections = {}
-        for row in traffic_data:
-            iid = row['intersection_id']
-            if iid not in intersections:
-                intersections[iid] = []
-            intersections[iid].append(row)
-
-        conn = get_connection()
-        cur = conn.cursor()
-
-        # For each intersection, prioritize direction with most traffic
-        for intersection_id, roads in intersections.items():
-            if not roads:
+        """Get the latest reading for every approach of every intersection."""
+        with timed(TRAFFIC_DATA_SECONDS):
+            network = road_network.get()
+            latest = self._latest_readings(None)
+            data = []
+            for intersection in network.intersections:
+                iid = intersection.intersection_id
+                for slot in range(network.offsets[intersection.index], network.offsets[intersection.index + 1]):
+                    road_id = network.approach_road[slot]
+                    count, density, rate = latest.get((iid, road_id), (0, 'LOW', None))
+                    data.append({
+                        "intersection_id": iid,
+                        "intersection_name": intersection.name,
+                        "road_id": road_id,
+                        "road_name": network.road_names.get(road_id),
+                        "direction": network.approach_direction[slot],
+                        "vehicle_count": count if count is not None else 0,
+                        "density_level": density or 'LOW',
+                        "rate": rate,
+                    })
+        data.sort(key=lambda row: (row["intersection_id"], row["direction"] or ""))
+        return data
+
+    @staticmethod
+    def _latest_readings(intersection_ids):
+        """{(intersection_id, road_id): (vehicle_count, density_level, rate)} from traffic_latest."""
+        return get_storage().latest.readings(intersection_ids)
+
+    def update_signal_logic(self, intersection_ids=None, cycle_time=None):
+        """Update signals based on traffic demand (normal operation).
+
+        The plan from plan_signals is applied to the in-memory signal store,
+        which persists only the signals that changed on its write-behind
+        flush. Pass intersection_ids to recompute just those intersections.
+        Planning takes no locks; only applying the plan holds the locks of
+        the intersections it covers, so a corridor phase on one of them
+        cannot interleave and corridors elsewhere never wait on a plan.
+        Intersections claimed by an emergency corridor (checked under those
+        locks) are left alone; the rest of the city keeps cycling. Returns
+        the number of signals changed.
+        """
+        with timed(SIGNAL_CYCLE_SECONDS, 'full' if intersection_ids is None else 'partial'):
+            updates = self.plan_signals(intersection_ids, cycle_time)
+            with intersection_locks.hold({update[0] for update in updates}):
+                # Read under the locks: a corridor claims before it takes them to set its colours
+                claimed = self.corridors.claimed
+                if claimed:
+                    updates = [update for update in updates if update[0] not in claimed]
+                changed = self.signals.apply(updates)
+        SIGNALS_CHANGED.inc(changed)
+        return changed
+
+    def plan_signals(self, intersection_ids=None, cycle_time=None):
+        """Compute (intersection_id, road_id, colour, green_time) for every approach.
+
+        The approaches come from the shared RoadNetwork, so the only query is
+        for the latest vehicle counts (from traffic_latest). The counts fill
+        one demand array laid out in network slot order, the cycle is split
+        across all approaches in proportion to demand by split_cycle, and
+        each intersection's busiest approach is shown GREEN and the rest RED
+        with their allotted green time. With forecast_weight set, each
+        approach's count is first blended with its forecast for the middle
+        of the coming cycle. A full-city plan also brings the advisory
+        green-wave offsets in self.coordination up to date with the demand
+        (see signal_offsets); they do not change the plan. Reads only;
+        nothing is applied.
+        """
+        network = road_network.get()
+        by_direction = network.by_direction
+        # For the whole city, demand is laid out exactly like the network's approach slots
+        demand = array.array('i', bytes(4 * len(network.approach_road))) if intersection_ids is None else {}
+        self._read_demand(network, demand, intersection_ids)
+
+        if intersection_ids is None:
+            slots, offsets = range(len(demand)), network.offsets
+        else:
+            slots, offsets = [], [0]
+            for iid in sorted(set(intersection_ids)):
+                approaches = network.approaches(iid)
+                if approaches:
+                    slots.extend(approaches)
+                    offsets.append(len(slots))
+            demand = array.array('i', [demand.get(slot, 0) for slot in slots])
+        if self.forecast_weight > 0:
+            self._blend_forecast(network, demand, slots, (cycle_time or self.cycle_time) / 2)
+        if intersection_ids is None and self.green_wave:
+            self.coordination.update(network, demand, cycle_time or self.cycle_time)
+            self._offsets_due = time.monotonic() + self.cycle_time
+        greens = split_cycle(demand, offsets, cycle_time or self.cycle_time,
+                             self.min_green_time, self.lost_time_per_phase)
+
+        # Each intersection's busiest approach gets the GREEN phase (ties: first direction alphabetically)
+        colors = ['RED'] * len(slots)
+        for k in range(len(offsets) - 1):
+            lo, hi = offsets[k], offsets[k + 1]
+            if lo == hi:
                 continue
+            base = slots[lo]  # demand index lo holds network slot base
+            key = demand.__getitem__ if base == lo else (lambda slot: demand[lo + slot - base])
+            busiest = max(by_direction[base:base + hi - lo], key=key)
+            colors[lo + busiest - base] = 'GREEN'
+        if intersection_ids is None:
+            return list(zip(network.approach_intersection, network.approach_road, colors, greens))
+        return list(zip([network.approach_intersection[slot] for slot in slots],
+                        [network.approach_road[slot] for slot in slots], colors, greens))
+
+    @staticmethod
+    def _read_demand(network, demand, intersection_ids):
+        """Store each approach's latest vehicle count at demand[slot] (positive counts only)."""
+        slot_of = network.slot
+        for iid, road_id, count in get_storage().latest.counts(intersection_ids):
+            slot = slot_of.get((iid, road_id))
+            if slot is not None and count and count > 0:
+                demand[slot] = count
+
+    def _blend_forecast(self, network, demand, slots, horizon):
+        """Mix each slot's demand with its forecast `horizon` seconds ahead, in place."""
+        if self.forecaster is None:
+            from .forecast import forecaster
+            self.forecaster = forecaster
+        self.forecaster.refresh()
+        weight, predict = self.forecast_weight, self.forecaster.predict
+        intersections, roads = network.approach_intersection, network.approach_road
+        for i, slot in enumerate(slots):
+            forecast = predict(intersections[slot], roads[slot], horizon)
+            if forecast is not None:
+                demand[i] = round((1 - weight) * demand[i] + weight * forecast)
+
+    def refresh_offsets(self, force=False):
+        """Update the green-wave offsets from the whole city's latest counts.
+
+        Full-city plans keep the offsets current as they go. Zone cycles and
+        the shard coordinator only see part of the city, so they call this
+        afterwards; it reads the counts at most once per cycle_time unless
+        forced. Returns the number of arterials solved.
+        """
+        now = time.monotonic()
+        if not self.green_wave or (not force and now < self._offsets_due):
+            return 0
+        self._offsets_due = now + self.cycle_time
+        network = road_network.get()
+        demand = array.array('i', bytes(4 * len(network.approach_road)))
+        self._read_demand(network, demand, None)
+        return self.coordination.update(network, demand, self.cycle_time)
+
+    def signal_offsets(self):
+        """Green-wave offsets as last refreshed, for the API.
+
+        Advisory only: the live plan holds one colour and green time per
+        approach per cycle and has no phase start to shift, so the offsets
+        are published for controllers that run their own phase timing (and
+        drive the simulator's greenwave run) rather than applied here.
+        """
+        coordination = self.coordination
+        offsets = coordination.offsets
+        return {
+            "cycle_time": coordination.cycle_time,
+            "offsets": [{"intersection_id": iid, "offset": offset, "road_id": road_id}
+                        for iid, (offset, road_id) in sorted(offsets.items())],
+            "waves": coordination.waves(),
+        }
+
+    def mark_dirty(self, intersection_id):
+        """Queue an intersection for recomputation after a new reading.
+
+        Marks arriving within debounce_time of each other are coalesced into one
+        update_signal_logic call covering just the dirty intersections, which
+        runs on a timer thread rather than the caller's.
+        """
+        self.mark_dirty_many((intersection_id,))
+
+    def mark_dirty_many(self, intersection_ids):
+        """mark_dirty for a batch of intersections (e.g. one bulk ingestion commit)."""
+        if self.shards:
+            self.shards.mark_dirty(intersection_ids)  # each owning shard debounces its own
+            return
+        with self._dirty_lock:
+            if self._closed:
+                return
+            self._dirty.update(intersection_ids)
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.debounce_time, self.flush_dirty)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def flush_dirty(self):
+        """Recompute every intersection marked dirty since the last flush."""
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, set()
+            self._flush_timer = None
+        if not dirty:
+            return 0
+        try:
+            return self.update_signal_logic(dirty)
+        except Exception as e:
+            print(f"Recomputing {len(dirty)} dirty intersections failed: {e}")
+            return 0
+
+    def create_green_corridor(self, route_path, emergency_type, log_id=None):
+        """Start a green corridor along the route and return its id immediately.
+
+        The corridor engine walks the route in the background, greening each
+        intersection for corridor_green_time seconds and committing every phase
+        on its own, then releases the corridor after emergency_hold_time.
+        """
+        return self.start_emergency(route_path, emergency_type, log_id).corridor_id
+
+    def start_emergency(self, route_path, emergency_type, log_id=None):
+        """create_green_corridor, returning the emergency's EmergencyHandle."""
+        if not route_path:
+            raise ValueError("Cannot create a green corridor for an empty route")
+
+        if log_id is None:
+            log_id = get_storage().emergency_logs.open(emergency_type)
+
+        return self.commands.call(self._start_emergency, list(route_path), emergency_type, log_id)
+
+    def _start_emergency(self, route_path, emergency_type, log_id):
+        # Runs on the command thread
+        handle = EmergencyHandle(self.corridors.next_id(), route_path, emergency_type, log_id,
+                                 self.corridors.priority(emergency_type))
+        # Publish the emergency before its first phase can run, so no cycle overrides it
+        self._state = self._state.replace(self._state.emergencies + (handle,))
+        self.corridors.start(route_path, emergency_type, log_id=log_id, green_time=self.corridor_green_time,
+                             hold_time=self.emergency_hold_time, corridor_id=handle.corridor_id)
+        self.events.publish('emergency', {"corridor_id": handle.corridor_id, "status": "ACTIVE",
+                                          "emergency_type": emergency_type, "route_path": route_path})
+        return handle
+
+    def _on_corridor_claim(self, intersection_ids):
+        if self.shards:
+            self.shards.hold(intersection_ids)
+
+    def _on_corridor_release(self, intersection_ids):
+        """A corridor has let go of these intersections: put them straight back on their plan."""
+        if self.shards:
+            self.shards.release(intersection_ids)
+        else:
+            self.mark_dirty_many(intersection_ids)
 
-            # Sort roads by vehicle count (descending)
-            roads_sorted = sorted(roads, key=lambda x: x['vehicle_count'], reverse=True)
-
-            # Set all to RED first
-            cur.execute("""
-                UPDATE signal_status
-                SET signal_color='RED', green_time=0
-                WHERE intersection_id=?
-            """, (intersection_id,))
-
-            # Give GREEN to highest traffic direction
-            if roads_sorted:
-                top_road = roads_sorted[0]
-                green_time = self.calculate_green_time(top_road['vehicle_count'])
-                cur.execute("""
-                    UPDATE signal_status
-                    SET signal_color='GREEN', green_time=?
-                    WHERE intersection_id=? AND road_id=?
-                """, (green_time, intersection_id, top_road['road_id']))
-
-        conn.commit()
-        conn.close()
-
-    def create_green_corridor(self, route_path, emergency_type):
-        """Create a green corridor along the specified route."""
-        self.is_emergency_active = True
-        self.emergency_route = route_path
-
-        conn = get_connection()
-        cur = conn.cursor()
-
-        # Log the emergency
-        cur.execute("""
-            INSERT INTO emergency_logs (route_id, emergency_type, status)
-            VALUES (?, ?, 'ACTIVE')
-        """, (None, emergency_type))  # route_id can be NULL for dynamic routes
-
-        # Set corridor timing - each intersection gets green for 20 seconds
-        corridor_green_time = 20
-
-        # Clear all signals to RED first
-        cur.execute("UPDATE signal_status SET signal_color='RED', green_time=0")
-
-        # Set green corridor along the path
-        for i, intersection_id in enumerate(route_path):
-            # For each intersection in path, set the appropriate direction to GREEN
-            # This is simplified - in reality, we'd need to know which direction the vehicle is coming from
-            # For now, we'll set all directions at each intersection to GREEN briefly
-
-            cur.execute("""
-                UPDATE signal_status
-                SET signal_color='GREEN', green_time=?
-                WHERE intersection_id=?
-            """, (corridor_green_time, intersection_id))
-
-            if i < len(route_path) - 1:  # Not the last intersection
-                time.sleep(corridor_green_time)  # Wait for vehicle to pass through
-
-                # Reset this intersection back to RED after vehicle passes
-                cur.execute("""
-                    UPDATE signal_status
-                    SET signal_color='RED', green_time=0
-                    WHERE intersection_id=?
-                """, (intersection_id,))
-
-        conn.commit()
-        conn.close()
-
-        # Start monitoring for corridor completion
-        self.emergency_thread = threading.Thread(target=self.monitor_emergency_completion)
-        self.emergency_thread.start()
-
-    def monitor_emergency_completion(self):
-        """Monitor and complete emergency after corridor is used."""
-        # In a real system, this would use GPS tracking or manual clearance
-        # For demo, we'll wait a fixed time then clear
-        time.sleep(120)  # 2 minutes for demo
-
-        self.clear_emergency()
-
-    def clear_emergency(self):
-        """Clear emergency and resume normal operation."""
-        self.is_emergency_active = False
-        self.emergency_route = None
-
-        conn = get_connection()
-        cur = conn.cursor()
-
-        # Update emergency log
-        cur.execute("""
-            UPDATE emergency_logs
-            SET status='CLEARED', cleared_at=NOW()
-            WHERE status='ACTIVE'
-            ORDER BY created_at DESC LIMIT 1
-        """)
-
-        conn.commit()
-        conn.close()
-
-        # Resume normal scheduling
-        self.start_scheduler()
+    def _on_corridor_finished(self, corridor):
+        """Called on the engine thread once a corridor's hold time has expired."""
+        self.commands.submit(self._release_corridors, [corridor])
 
-    def start_scheduler(self):
-        """Start the normal traffic scheduling cycle."""
-        if self.scheduler_thread and self.scheduler_thread.is_alive():
-            return  # Already running
+    def clear_emergency(self, corridor_id=None):
+        """Cancel one corridor (or all of them), handing its intersections back to normal scheduling.
+
+        Returns the number of corridors cancelled.
+        """
+        return self.commands.call(self._clear_emergency, corridor_id)
 
-        self.scheduler_thread = threading.Thread(target=self._scheduler_loop, daemon=True)
-        self.scheduler_thread.start()
+    def _clear_emergency(self, corridor_id):
+        if corridor_id is None:
+            cleared = self.corridors.cancel_all()
+        else:
+            cleared = [self.corridors.cancel(corridor_id)]
+        cleared = [c for c in cleared if c is not None]
+        self._release_corridors(cleared)
+        return len(cleared)
+
+    def _release_corridors(self, corridors):
+        # Runs on the command thread
+        state = self._state
+        handles = [h for h in (state.emergency(c.corridor_id) for c in corridors) if h is not None]
+        if not handles:
+            return
+        for handle in handles:
+            self.events.publish('emergency', {"corridor_id": handle.corridor_id, "status": "CLEARED",
+                                              "emergency_type": handle.emergency_type,
+                                              "route_path": list(handle.route_path)})
+        log_ids = [h.log_id for h in handles if h.log_id is not None]
+        if log_ids:
+            get_storage().emergency_logs.clear(log_ids)
+
+        self._state = state.replace(h for h in state.emergencies if h not in handles)
+        for handle in handles:
+            handle._clear()
 
-    def _scheduler_loop(self):
-        """Main scheduler loop for normal traffic management."""
-        while not self.is_emergency_active:
-            self.update_signal_logic()
-            time.sleep(self.cycle_time)
+    def start_scheduler(self):
+        """Start (or resume) the normal traffic scheduling cycle.
+
+        Zones run on the deadline-based CycleScheduler, and calling this
+        again after pause() resumes it. With shard_count > 1 the cycle runs
+        in a ShardPool of worker processes instead. Either way it keeps
+        running through emergencies, skipping the intersections corridors
+        have claimed.
+        """
+        if self.shard_count > 1:
+            if self.shards is None:
+                from .sharding import ShardPool
+                self.shards = ShardPool(self, self.shard_count).start()
+                if self.corridors.claimed:
+                    self.shards.hold(self.corridors.claimed)
+            return
+        if not self.scheduler.zones():
+            self.configure_zones()
+        self.scheduler.start()
+        self.scheduler.resume()
+
+    def configure_zones(self, zones=None):
+        """(Re)build the scheduler's zones from zone_config (or the given config).
+
+        Each configured zone cycles its intersections on its own cycle_time;
+        a "city" zone on self.cycle_time covers everything else. Raises
+        ValueError for a cycle_time that is not positive, before any zone changes.
+        """
+        config = self.zone_config if zones is None else zones
+        planned = []
+        for name, zone in config.items():
+            try:
+                cycle_time = check_cycle_time(zone.get("cycle_time", self.cycle_time))
+            except ValueError as e:
+                raise ValueError(f"zone {name!r}: {e}") from None
+            planned.append((name, [int(iid) for iid in zone["intersections"]], cycle_time))
+        check_cycle_time(self.cycle_time)
+        self.zone_config = config
+        for name in self.scheduler.zones():
+            self.scheduler.remove_zone(name)
+        zoned = set()
+        for name, ids, cycle_time in planned:
+            zoned.update(ids)
+            self.scheduler.add_zone(name, ids, cycle_time)
+        rest = None
+        if zoned:
+            rest = [iid for iid in get_storage().intersections.ids() if iid not in zoned]
+        if rest is None or rest:
+            self.scheduler.add_zone("city", rest, self.cycle_time)
+
+    def _run_zone_cycle(self, intersection_ids, cycle_time):
+        self.update_signal_logic(intersection_ids, cycle_time)
+        if intersection_ids is not None:
+            self.refresh_offsets()  # a zone plan does not update them itself
 
     def stop_scheduler(self):
         """Stop the scheduler."""
-        self.is_emergency_active = True  # This will stop the loop
-        if self.scheduler_thread:
-            self.scheduler_thread.join(timeout=5)
+        self.scheduler.stop()
+        if self.shards:
+            self.shards.stop()
+            self.shards = None
+        self.signals.flush()
+
+    def close(self):
+        """Stop all background work: the debounce timer, the scheduler and the signal writer.
+
+        Dirty marks arriving afterwards (e.g. from a corridor releasing its
+        intersections) are ignored. Unflushed signal changes are written out.
+        """
+        with self._dirty_lock:
+            self._closed = True
+            timer, self._flush_timer = self._flush_timer, None
+            self._dirty.clear()
+        if timer is not None:
+            timer.cancel()
+        self.stop_scheduler()
+        self.signals.close()
 
 # Global controller instance
 controller = TrafficController()